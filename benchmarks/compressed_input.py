@@ -0,0 +1,61 @@
+import argparse
+import bz2
+import gzip
+import io
+import lzma
+import time
+import zipfile
+from collections.abc import Callable
+from pathlib import Path
+
+from otds import OTDS
+from otds.source import DEFAULT_BUFFER_SIZE
+
+def zip_compress(data: bytes) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("otds.xml", data)
+    return buf.getvalue()
+
+def codecs() -> dict[str, Callable[[bytes], bytes]]:
+    found: dict[str, Callable[[bytes], bytes]] = {
+        "xml": lambda data: data,
+        "gzip": gzip.compress,
+        "bz2": bz2.compress,
+        "xz": lzma.compress,
+        "zip": zip_compress,
+    }
+    try:
+        import zstandard
+    except ImportError:
+        pass
+    else:
+        found["zstd"] = zstandard.ZstdCompressor().compress
+    return found
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure OTDS.parse throughput for each supported compression.")
+    parser.add_argument("file", type=Path, help="uncompressed OTDS file")
+    parser.add_argument("--buffer-size", type=int, default=DEFAULT_BUFFER_SIZE)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tmp", type=Path, default=Path("."), help="directory for the compressed copies")
+    args = parser.parse_args()
+
+    data = args.file.read_bytes()
+    print(f"{args.file}: {len(data) / 1e6:.1f} MB, buffer size {args.buffer_size}")
+    for name, compress in codecs().items():
+        path = args.tmp / f"bench-{args.file.stem}.{name}"
+        path.write_bytes(compress(data))
+        try:
+            best = float("inf")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                OTDS().parse(path, args.buffer_size)
+                best = min(best, time.perf_counter() - start)
+            ratio = len(data) / path.stat().st_size
+            print(f"{name:>5}: {best:.3f}s, {len(data) / 1e6 / best:.1f} MB/s of XML, ratio {ratio:.1f}")
+        finally:
+            path.unlink()
+
+if __name__ == "__main__":
+    main()
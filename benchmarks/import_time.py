@@ -0,0 +1,48 @@
+import argparse
+import re
+import subprocess
+import sys
+
+ENTRY_POINTS = ("otds", "otds.codec", "otds.search", "otds.snapshot", "otds.main")
+# Only the parser needs lxml, snapshot readers and query code must start without it.
+PARSER_ONLY = ("lxml.etree",)
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+def import_time(module: str) -> tuple[int, set[str]]:
+    # Microseconds to import module in a fresh interpreter and the modules it imported.
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True).stderr
+    total = 0
+    imported = set()
+    for match in _LINE.finditer(stderr):
+        imported.add(match.group(4))
+        # Everything the import triggers is nested below the otds package entries at the top level.
+        if not match.group(3) and match.group(4).split(".")[0] == "otds":
+            total += int(match.group(2))
+    return (total, imported)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Import time of the otds entry points, measured with python -X importtime.")
+    parser.add_argument("modules", nargs="*", default=ENTRY_POINTS)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if sys.flags.dont_write_bytecode:
+        print("warning: bytecode is not cached (PYTHONDONTWRITEBYTECODE), times include compiling", file=sys.stderr)
+    failed = []
+    for module in args.modules:
+        # The first run may compile and cache bytecode, the best of the others is reported.
+        import_time(module)
+        runs = [import_time(module) for _ in range(args.repeat)]
+        best = min(total for total, _imported in runs)
+        imported = runs[0][1]
+        heavy = sorted(imported.intersection(PARSER_ONLY))
+        print(f"{module:15s} {best / 1000:7.1f} ms {len(imported):4d} modules {' '.join(heavy)}")
+        if heavy and module != "otds.main":
+            failed.append(module)
+    if failed:
+        sys.exit(f"{', '.join(failed)} import the parser dependencies")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import datetime
+import random
+import sys
+import time
+from pathlib import Path
+
+from otds import snapshot
+from otds.executor import QueryExecutor
+from otds.index import MAX_ORDINAL, accommodation_periods
+from otds.search import SearchPipeline, SearchRequest
+
+PARTIES = ((30, 30), (40, 38, 8), (35,), (45, 43, 15, 12))
+
+def requests(first: int, last: int, count: int, seed: int) -> list[SearchRequest]:
+    rng = random.Random(seed)
+    result = []
+    for _ in range(count):
+        check_in = datetime.date.fromordinal(rng.randint(first, last))
+        until = check_in + datetime.timedelta(days=rng.choice((0, 0, 3, 7)))
+        result.append(SearchRequest(check_in, until, rng.choice((3, 7, 7, 14)), rng.choice(PARTIES), check_in - datetime.timedelta(days=60)))
+    return result
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Search throughput over one shared model by number of query threads.")
+    parser.add_argument("paths", type=Path, nargs="+", help="snapshot and/or OTDS files, applied in order")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    otds = snapshot.load_paths(args.paths)
+    periods = [p for accom in otds.accommodations.values() for p in accommodation_periods(accom) if p[1] < MAX_ORDINAL]
+    if not periods:
+        parser.error("the catalogue has no dated offers")
+    batch = requests(min(p[0] for p in periods), max(p[1] for p in periods), args.requests, args.seed)
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(f"{len(otds.accommodations)} accommodations, {len(batch)} requests, GIL {'enabled' if gil else 'disabled'}")
+
+    expected = None
+    baseline = None
+    for threads in args.threads:
+        # A fresh pipeline per run, so every run fills the caches the same way.
+        with QueryExecutor(otds, threads, SearchPipeline(otds)) as executor:
+            start = time.perf_counter()
+            results = executor.search_batch(batch, args.limit)
+            elapsed = time.perf_counter() - start
+        offers = [r.offers for r in results]
+        if expected is None:
+            expected = offers
+        elif offers != expected:
+            sys.exit(f"{threads} threads: results differ from {args.threads[0]} thread(s)")
+        baseline = baseline or elapsed
+        print(f"{threads:3d} threads: {len(batch) / elapsed:8.0f} searches/s, speedup {baseline / elapsed:5.2f}")
+
+if __name__ == "__main__":
+    main()
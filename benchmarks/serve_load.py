@@ -0,0 +1,45 @@
+import argparse
+import datetime
+import random
+import statistics
+import threading
+import time
+from pathlib import Path
+
+from otds.client import Client
+
+def worker(path: Path, count: int, keys: list[str], latencies: list[float]) -> None:
+    today = datetime.date.today()
+    with Client(path) as client:
+        for _ in range(count):
+            start = time.perf_counter()
+            if random.random() < 0.5:
+                client.accommodation(random.choice(keys))
+            else:
+                client.dates(today + datetime.timedelta(days=random.randrange(365)), nights=7)
+            latencies.append(time.perf_counter() - start)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test a running `python -m otds serve`.")
+    parser.add_argument("--socket", type=Path, default=Path("otds.sock"))
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=1000, help="requests per client")
+    args = parser.parse_args()
+
+    with Client(args.socket) as client:
+        keys = list(client.accommodation_keys())
+    latencies: list[float] = []
+    threads = [threading.Thread(target=worker, args=(args.socket, args.requests, keys, latencies)) for _ in range(args.clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"{len(latencies)} requests in {elapsed:.2f}s: {len(latencies) / elapsed:.0f} req/s")
+    print(f"p50 {statistics.median(latencies) * 1000:.2f}ms, p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f}ms")
+
+if __name__ == "__main__":
+    main()
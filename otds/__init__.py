@@ -1,4 +1,17 @@
-from .main import OTDS
+# typing alone would take longer to import than the rest of `import otds`.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from typing import Any
+
+    from .main import OTDS
 
 __version__ = "0.0.1a5"
 __all__ = ("OTDS",)
+
+# The model and its parser are loaded on first use, so `import otds` and the modules that do not
+# need them, e.g. the codec and the client, start fast.
+def __getattr__(name: str) -> "Any":
+    if name == "OTDS":
+        from .main import OTDS
+        return OTDS
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,147 @@
+import argparse
+import itertools
+import logging
+import os
+import sys
+import time
+from collections import deque
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .export import DEFAULT_BATCH_SIZE
+from .source import DEFAULT_BUFFER_SIZE
+
+if TYPE_CHECKING:
+    from lxml import etree
+
+# Exit codes follow sysexits.h so that schedulers can tell which failures are worth retrying.
+EXIT_INVALID = 65  # EX_DATAERR: the file is malformed or does not validate.
+EXIT_UNSUPPORTED = 69  # EX_UNAVAILABLE: the file uses a feature this version cannot parse.
+EXIT_RETRY = 75  # EX_TEMPFAIL: reading or writing failed, the same files can be retried.
+
+def _exit_code(exc: Exception) -> int:
+    from lxml import etree
+
+    from .main import ValidationError
+    from .source import DecompressionError
+
+    if isinstance(exc, NotImplementedError):
+        return EXIT_UNSUPPORTED
+    # Checked before OSError: a damaged compressed file is not worth retrying.
+    if isinstance(exc, (ValidationError, etree.XMLSyntaxError, DecompressionError)):
+        return EXIT_INVALID
+    if isinstance(exc, OSError):
+        return EXIT_RETRY
+    return 1
+
+def _load(path: Path, buffer_size: int) -> tuple["etree._Element", int, int, float]:
+    from .main import SCHEMA_PATH, validate
+
+    start = time.perf_counter()
+    root = validate(path, SCHEMA_PATH, buffer_size).getroot()
+    elements = sum(1 for _ in root.iter())
+    return (root, elements, path.stat().st_size, time.perf_counter() - start)
+
+def _rates(elements: int, size: int, elapsed: float) -> str:
+    elapsed = max(elapsed, 1e-9)
+    return f"{elements:,} elements, {size / 1e6:.1f} MB in {elapsed:.2f}s ({elements / elapsed:,.0f} elements/s, {size / 1e6 / elapsed:.1f} MB/s)"
+
+def export(args: argparse.Namespace) -> int:
+    from .export import export as export_tables
+    from .snapshot import load_paths
+
+    try:
+        counts = export_tables(load_paths(args.files), args.output, args.format, args.batch_size)
+    except Exception as exc:
+        print(f"{type(exc).__name__}: {exc}", file=sys.stderr)
+        return _exit_code(exc)
+    for name, count in counts.items():
+        print(f"{name}: {count:,} rows", file=sys.stderr)
+    return 0
+
+def ingest(args: argparse.Namespace) -> int:
+    from . import convert, snapshot
+    from .main import OTDS
+
+    started = time.perf_counter()
+    total_elements = total_size = 0
+    path = args.base
+    try:
+        otds = snapshot.load(args.base) if args.base else OTDS()
+        # Files are read and validated in parallel, but applied strictly in the given order.
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            # At most one file per worker is read ahead, and futures are popped as they are applied,
+            # so only that many parsed trees are held at once.
+            pending = iter(args.files)
+            futures = deque(executor.submit(_load, p, args.buffer_size) for p in itertools.islice(pending, args.workers))
+            try:
+                for i, path in enumerate(args.files, 1):
+                    future = futures.popleft()
+                    for p in itertools.islice(pending, 1):
+                        futures.append(executor.submit(_load, p, args.buffer_size))
+                    root, elements, size, elapsed = future.result()
+                    apply_start = time.perf_counter()
+                    otds.parse_otds(root)
+                    elapsed += time.perf_counter() - apply_start
+                    total_elements += elements
+                    total_size += size
+                    print(f"[{i}/{len(args.files)}] {path}: {_rates(elements, size, elapsed)}", file=sys.stderr)
+            finally:
+                for future in futures:
+                    future.cancel()
+        path = args.output
+        snapshot.dump(otds, args.output)
+    except Exception as exc:
+        print(f"{path}: {type(exc).__name__}: {exc}", file=sys.stderr)
+        return _exit_code(exc)
+    print(f"Wrote {args.output}: {_rates(total_elements, total_size, time.perf_counter() - started)}", file=sys.stderr)
+    caches = ", ".join(f"{name} {s.hit_rate:.1%} of {s.hits + s.misses:,}" for name, s in convert.stats().items())
+    print(f"Converter cache hits: {caches}", file=sys.stderr)
+    return 0
+
+def serve(args: argparse.Namespace) -> int:
+    from .server import QueryServer
+
+    server = QueryServer(args.socket, args.files, workers=args.workers)
+    server.install_signal_handlers()
+    logging.getLogger(__name__).info("Serving %s", args.socket)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m otds")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    commands = parser.add_subparsers(required=True)
+
+    export_parser = commands.add_parser("export", help="write the catalogue as columnar tables (requires pyarrow)")
+    export_parser.add_argument("files", nargs="+", type=Path, help="OTDS files or a snapshot followed by OTDS files, applied in order")
+    export_parser.add_argument("-o", "--output", type=Path, required=True, help="directory for the table files")
+    export_parser.add_argument("--format", choices=("parquet", "arrow"), default="parquet")
+    export_parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="rows per record batch")
+    export_parser.set_defaults(func=export)
+
+    ingest_parser = commands.add_parser("ingest", help="parse OTDS files and write the result as a snapshot")
+    ingest_parser.add_argument("files", nargs="+", type=Path, help="OTDS files, optionally compressed, applied in order")
+    ingest_parser.add_argument("-o", "--output", type=Path, required=True, help="snapshot to write")
+    ingest_parser.add_argument("--base", type=Path, help="snapshot to apply the files to")
+    ingest_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ingest_parser.add_argument("--buffer-size", type=int, default=DEFAULT_BUFFER_SIZE, help="read size for compressed input, in bytes")
+    ingest_parser.set_defaults(func=ingest)
+
+    serve_parser = commands.add_parser("serve", help="serve lookups on a loaded catalogue over a Unix socket")
+    serve_parser.add_argument("files", nargs="+", type=Path, help="OTDS files or a snapshot followed by OTDS files, applied in order")
+    serve_parser.add_argument("--socket", type=Path, default=Path("otds.sock"))
+    serve_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    serve_parser.set_defaults(func=serve)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format="%(asctime)s %(levelname)s %(message)s")
+    return args.func(args)  # type: ignore[no-any-return]
+
+if __name__ == "__main__":
+    sys.exit(main())
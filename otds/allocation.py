@@ -0,0 +1,106 @@
+import datetime
+from array import array
+from collections.abc import Iterable, Sequence
+from typing import TYPE_CHECKING, Literal, NamedTuple
+
+from . import enums as e
+from . import typedefs as t
+
+if TYPE_CHECKING:
+    from .main import OTDS
+
+class DayProgram(NamedTuple):
+    accommodations: tuple[t.Name, ...]
+    outbound: t.Name | None
+    inbound: t.Name | None
+
+# The days of level 0 run from the check-in to the check-out of the product, which is all the
+# offsets of a program express. Other levels allocate addons on top and do not move them.
+_DAY_REFERENCES = {e.DayAllocationPart.Start: e.DayReference.CheckIn, e.DayAllocationPart.End: e.DayReference.CheckOut}
+
+def compile_day_program(product: t.Product) -> DayProgram:
+    for part, (level, source, day_ref, shift) in product.get("day_allocation", ()):
+        if level != 0:
+            continue
+        if source != "Product":
+            raise NotImplementedError()
+        # A start at the check-out or an end at the check-in, or a bound moved to fit a component
+        # of fixed duration (Shift Auto) or chosen by the user (Shift External).
+        if day_ref is not _DAY_REFERENCES[part] or shift is not e.Shift.none:
+            raise NotImplementedError(f"DayAllocation{part.value} DayReference={day_ref.value} Shift={shift.value}")
+
+    # Per level 0 entry its DayAllocationIndex, the component and for a SellingAccom its name.
+    level0: list[tuple[int, t.Component, t.Name | None]] = []
+    for comp in product["components"]:
+        if comp[0] is e.Component.Accommodation:
+            level0.extend((index, comp, name) for name, index in comp[1])
+        elif comp[0] is e.Component.OnewayFlight:
+            if comp[1][2] == 0:
+                level0.append((comp[1][1], comp, None))
+        elif comp[0] is e.Component.CombiComponent:
+            level0.append((comp[1][2], comp, None))
+
+    accoms: list[t.Name] = []
+    outbound = inbound = None
+    for _index, comp, accom in sorted(level0, key=lambda c: c[0]):
+        if comp[0] is e.Component.Accommodation:
+            assert accom is not None
+            accoms.append(accom)
+        elif comp[0] is e.Component.OnewayFlight:
+            if accoms:
+                inbound = inbound or comp[1][0]
+            else:
+                outbound = comp[1][0]
+        elif comp[0] is e.Component.CombiComponent:
+            # A combined return flight wraps the components allocated after it.
+            for role, name, _level in comp[1][3]:
+                if role is e.Role.Outbound:
+                    outbound = name
+                elif role is e.Role.Inbound:
+                    inbound = name
+    return DayProgram(tuple(accoms), outbound, inbound)
+
+def _correction(flight: t.Oneway, field: Literal["check_in_offset", "check_out_offset"]) -> int:
+    for correction in flight.get("neighbour_component_correction", {}).values():
+        if field in correction:
+            offset, component = correction[field]
+            if component in (None, e.ComponentAttribute.Accommodation):
+                return int(offset)
+    return 0
+
+class DayAllocationSolver:
+    def __init__(self, otds: "OTDS") -> None:
+        self._otds = otds
+        self._programs: dict[t.Key, DayProgram] = {}
+        self._offsets: dict[tuple[t.Key | None, t.Key | None], tuple[int, int]] = {}
+
+    def program(self, product_key: t.Key) -> DayProgram:
+        program = self._programs.get(product_key)
+        if program is None:
+            _product_type, product = self._otds.products[product_key]
+            program = self._programs[product_key] = compile_day_program(product)
+        return program
+
+    # (check-in, check-out) offsets of the accommodation relative to the departure
+    # dates of the outbound and inbound flight, or to the requested travel period.
+    def offsets(self, outbound: t.Key | None, inbound: t.Key | None) -> tuple[int, int]:
+        key = (outbound, inbound)
+        offsets = self._offsets.get(key)
+        if offsets is None:
+            check_in = check_out = 0
+            if outbound is not None:
+                flight = self._otds.flights[outbound]
+                check_in = flight.get("check_out_date_offset", 0) + _correction(flight, "check_out_offset")
+            if inbound is not None:
+                check_out = _correction(self._otds.flights[inbound], "check_in_offset")
+            offsets = self._offsets[key] = (check_in, check_out)
+        return offsets
+
+    def solve_ordinals(self, product_key: t.Key, outbound: t.Key | None, starts: Sequence[int], inbound: t.Key | None, ends: Sequence[int]) -> tuple["array[int]", "array[int]"]:
+        program = self.program(product_key)
+        check_in, check_out = self.offsets(outbound if program.outbound else None, inbound if program.inbound else None)
+        return (array("l", [d + check_in for d in starts]), array("l", [d + check_out for d in ends]))
+
+    def solve(self, product_key: t.Key, outbound: t.Key | None, starts: Iterable[datetime.date], inbound: t.Key | None, ends: Iterable[datetime.date]) -> tuple[list[datetime.date], list[datetime.date]]:
+        check_in, check_out = self.solve_ordinals(product_key, outbound, [d.toordinal() for d in starts], inbound, [d.toordinal() for d in ends])
+        return ([datetime.date.fromordinal(d) for d in check_in], [datetime.date.fromordinal(d) for d in check_out])
@@ -0,0 +1,160 @@
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from collections.abc import Callable, Hashable, Iterable
+from typing import TYPE_CHECKING, Generic, NamedTuple, TypeVar
+
+from . import typedefs as t
+from .index import MAX_ORDINAL, accommodation_periods
+from .search import SearchPipeline, SearchRequest, SearchResult
+
+if TYPE_CHECKING:
+    from .main import OTDS, Changes
+
+_K = TypeVar("_K", bound=Hashable)
+_V = TypeVar("_V")
+
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_TTL = 300.0  # seconds
+
+class CacheStats(NamedTuple):
+    hits: int
+    misses: int
+    size: int
+    expired: int
+    evicted: int
+    invalidated: int
+
+class _Entry(NamedTuple, Generic[_V]):
+    value: _V
+    expires: float
+    # What the value was computed from: accommodations and the ordinal window of the query,
+    # and whether flights took part.
+    accommodations: frozenset[t.Key]
+    window: tuple[int, int]
+    flights: bool
+
+# LRU cache of query results, bounded in size and age. Entries know what they depend on, so
+# a parsed delta only evicts the ones it may have changed.
+class ResultCache(Generic[_K, _V]):
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float | None = DEFAULT_TTL,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._clock = clock
+        self._entries: OrderedDict[_K, _Entry[_V]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = self._misses = self._expired = self._evicted = self._invalidated = 0
+        # Counts invalidations. A value computed before one may be stale, put() drops it.
+        self._generation = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, key: _K) -> _V | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            if entry.expires < self._clock():
+                del self._entries[key]
+                self._expired += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry.value
+
+    def put(self, key: _K, value: _V, accommodations: frozenset[t.Key], window: tuple[int, int], flights: bool = False,
+            generation: int | None = None) -> bool:
+        # With the generation read before the value was computed, the value is only stored if no
+        # invalidation ran since. Returns whether it was stored.
+        expires = self._clock() + self._ttl if self._ttl is not None else float("inf")
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return False
+            self._entries[key] = _Entry(value, expires, accommodations, window, flights)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self._evicted += 1
+        return True
+
+    def invalidate(self, otds: "OTDS", changes: "Changes") -> int:
+        # An entry is stale if it used a changed accommodation, or if the accommodation can now
+        # be booked within its window and would have been selected.
+        if changes.all_accommodations:
+            return self.clear()
+        periods = [p for key in changes.accommodations if key in otds.accommodations
+                   for p in accommodation_periods(otds.accommodations[key])]
+        with self._lock:
+            self._generation += 1
+            stale = [key for key, entry in self._entries.items()
+                     if (changes.flights and entry.flights)
+                     or not entry.accommodations.isdisjoint(changes.accommodations)
+                     or any(start <= entry.window[1] and end >= entry.window[0] for start, end in periods)]
+            for key in stale:
+                del self._entries[key]
+            self._invalidated += len(stale)
+        return len(stale)
+
+    def clear(self) -> int:
+        with self._lock:
+            self._generation += 1
+            count = len(self._entries)
+            self._entries.clear()
+            self._invalidated += count
+        return count
+
+    def stats(self) -> CacheStats:
+        return CacheStats(self._hits, self._misses, len(self._entries), self._expired, self._evicted, self._invalidated)
+
+def normalise(request: SearchRequest) -> SearchRequest:
+    # Equal searches get equal keys: oldest first as bookings list travellers, airports as a sorted set.
+    until = request.check_in_until
+    return SearchRequest(
+        request.check_in_from, None if until == request.check_in_from else until, int(request.nights),
+        tuple(sorted((int(a) for a in request.ages), reverse=True)), request.booking_date,
+        tuple(sorted(set(request.airports))))
+
+class CachedSearch:
+    # A SearchPipeline behind a ResultCache, kept current with the deltas parsed into its model.
+    def __init__(self, otds: "OTDS", pipeline: SearchPipeline | None = None, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 ttl: float | None = DEFAULT_TTL) -> None:
+        self._otds = otds
+        self._pipeline = pipeline or SearchPipeline(otds)
+        self.cache: ResultCache[tuple[SearchRequest, int | None], SearchResult] = ResultCache(max_entries, ttl)
+        # The listener only holds a weak reference, the model must not keep its caches alive.
+        ref = weakref.ref(self)
+
+        def changed(changes: "Changes") -> None:
+            cached = ref()
+            if cached is not None:
+                cached._pipeline.invalidate(changes)
+                cached.cache.invalidate(cached._otds, changes)
+
+        self._unsubscribe = otds.on_change(changed)
+
+    def close(self) -> None:
+        self._unsubscribe()
+
+    def search(self, request: SearchRequest, limit: int | None = None) -> SearchResult:
+        request = normalise(request)
+        result = self.cache.get((request, limit))
+        if result is None:
+            # A delta applied while searching must not leave its stale result in the cache.
+            generation = self.cache.generation
+            result = self._pipeline.search(request, limit)
+            start = request.check_in_from.toordinal()
+            end = min((request.check_in_until or request.check_in_from).toordinal() + request.nights, MAX_ORDINAL)
+            self.cache.put((request, limit), result, result.accommodations, (start, end), bool(request.airports), generation)
+        return result
+
+    def search_batch(self, requests: Iterable[SearchRequest], limit: int | None = None) -> list[SearchResult]:
+        return [self.search(request, limit) for request in requests]
@@ -0,0 +1,72 @@
+import datetime
+import socket
+import threading
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any
+
+from . import codec
+from .server import read_frame, write_frame
+
+class ServerError(Exception):
+    pass
+
+class Client:
+    def __init__(self, path: Path | str, timeout: float | None = None) -> None:
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        self._sock.connect(str(path))
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "Client":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._sock.close()
+
+    def call(self, op: str, *args: object) -> Any:
+        with self._lock:
+            write_frame(self._sock, codec.dumps((op, args)))
+            payload = read_frame(self._sock)
+        if payload is None:
+            raise ConnectionError("Server closed the connection")
+        ok, value = codec.loads(payload)
+        if not ok:
+            raise ServerError(value)
+        return value
+
+    def ping(self) -> Any:
+        return self.call("ping")
+
+    def stats(self) -> Any:
+        return self.call("stats")
+
+    def accommodation(self, key: str) -> Any:
+        return self.call("accommodation", key)
+
+    def accommodation_keys(self) -> Any:
+        return self.call("accommodation_keys")
+
+    def availabilities(self, key: str) -> Any:
+        return self.call("availabilities", key)
+
+    def dates(self, check_in_from: datetime.date, check_in_until: datetime.date | None = None, nights: int = 0) -> Any:
+        return self.call("dates", check_in_from, check_in_until, nights)
+
+    def price_items(self, check_in_from: datetime.date, check_in_until: datetime.date | None = None, nights: int = 0) -> Any:
+        return self.call("price_items", check_in_from, check_in_until, nights)
+
+    def flight(self, key: str) -> Any:
+        return self.call("flight", key)
+
+    def departures(self, origins: Iterable[str], destinations: Iterable[str], start: datetime.date, end: datetime.date | None = None) -> Any:
+        return self.call("departures", tuple(origins), tuple(destinations), start, end)
+
+    def search(self, requests: Iterable[tuple[object, ...]], limit: int | None = None) -> Any:
+        return self.call("search", tuple(tuple(r) for r in requests), limit)
+
+    def reload(self) -> Any:
+        return self.call("reload")
@@ -0,0 +1,273 @@
+import datetime
+import functools
+import struct
+import sys
+from collections.abc import Callable
+from decimal import Decimal
+from enum import Enum
+from types import MappingProxyType as MPT
+from typing import Any
+
+# Compact tagged binary encoding of the parsed model. Strings (keys, tokens, enum
+# names) are written once per message and then referenced by their position. Enum members are
+# written as their integer code in otds.codes, _ENUM (by value) is still read.
+_NONE, _TRUE, _FALSE, _INT, _FLOAT, _STR, _STR_REF, _BYTES = range(8)
+_DECIMAL, _DATE, _TIME, _TIMEDELTA, _TUPLE, _LIST, _DICT, _MAPPING, _FROZENSET, _ENUM, _ENUM_CODE = range(8, 19)
+
+_FLOAT_STRUCT = struct.Struct(">d")
+
+class Encoder:
+    def __init__(self) -> None:
+        self._buf = bytearray()
+        self._strings: dict[str, int] = {}
+        # otds.codes, imported with the first enum.
+        self._code: Callable[[Enum], int]
+        self._dispatch: dict[type, Callable[[Any], None]] = {
+            type(None): self._none,
+            bool: self._bool,
+            int: self._int,
+            float: self._float,
+            str: self._str,
+            bytes: self._bytes,
+            Decimal: self._decimal,
+            datetime.date: self._date,
+            datetime.time: self._time,
+            datetime.timedelta: self._timedelta,
+            tuple: self._tuple,
+            list: self._list,
+            dict: self._dict,
+            MPT: self._mapping,
+            frozenset: self._frozenset,
+        }
+
+    def encode(self, obj: object) -> bytes:
+        self._write(obj)
+        data = bytes(self._buf)
+        self._buf.clear()
+        self._strings.clear()
+        return data
+
+    def _varint(self, value: int) -> None:
+        buf = self._buf
+        while value > 0x7F:
+            buf.append((value & 0x7F) | 0x80)
+            value >>= 7
+        buf.append(value)
+
+    def _write(self, obj: object) -> None:
+        handler = self._dispatch.get(type(obj))
+        if handler is not None:
+            handler(obj)
+        elif isinstance(obj, Enum):
+            # Later members of the class are dispatched by type.
+            from .codes import code
+
+            self._code = code
+            self._dispatch[type(obj)] = self._enum
+            self._enum(obj)
+        elif isinstance(obj, tuple):
+            self._tuple(obj)
+        else:
+            raise TypeError(f"Cannot encode {type(obj).__name__}")
+
+    def _enum(self, obj: Enum) -> None:
+        self._buf.append(_ENUM_CODE)
+        self._str(type(obj).__name__)
+        self._varint(self._code(obj))
+
+    def _none(self, obj: None) -> None:
+        self._buf.append(_NONE)
+
+    def _bool(self, obj: bool) -> None:
+        self._buf.append(_TRUE if obj else _FALSE)
+
+    def _zigzag(self, value: int) -> None:
+        self._varint(value << 1 if value >= 0 else (-value << 1) - 1)
+
+    def _int(self, obj: int) -> None:
+        self._buf.append(_INT)
+        self._zigzag(obj)
+
+    def _float(self, obj: float) -> None:
+        self._buf.append(_FLOAT)
+        self._buf += _FLOAT_STRUCT.pack(obj)
+
+    def _str(self, obj: str) -> None:
+        ref = self._strings.get(obj)
+        if ref is not None:
+            self._buf.append(_STR_REF)
+            self._varint(ref)
+            return
+        self._strings[obj] = len(self._strings)
+        data = obj.encode()
+        self._buf.append(_STR)
+        self._varint(len(data))
+        self._buf += data
+
+    def _bytes(self, obj: bytes) -> None:
+        self._buf.append(_BYTES)
+        self._varint(len(obj))
+        self._buf += obj
+
+    def _decimal(self, obj: Decimal) -> None:
+        self._buf.append(_DECIMAL)
+        self._str(str(obj))
+
+    def _date(self, obj: datetime.date) -> None:
+        self._buf.append(_DATE)
+        self._varint(obj.toordinal())
+
+    def _time(self, obj: datetime.time) -> None:
+        self._buf.append(_TIME)
+        self._str(obj.isoformat())
+
+    def _timedelta(self, obj: datetime.timedelta) -> None:
+        self._buf.append(_TIMEDELTA)
+        self._zigzag(obj.days)
+        self._varint(obj.seconds)
+        self._varint(obj.microseconds)
+
+    def _items(self, tag: int, obj: tuple[object, ...] | list[object] | frozenset[object]) -> None:
+        self._buf.append(tag)
+        self._varint(len(obj))
+        for item in obj:
+            self._write(item)
+
+    def _tuple(self, obj: tuple[object, ...]) -> None:
+        self._items(_TUPLE, obj)
+
+    def _list(self, obj: list[object]) -> None:
+        self._items(_LIST, obj)
+
+    def _frozenset(self, obj: frozenset[object]) -> None:
+        self._items(_FROZENSET, obj)
+
+    def _pairs(self, tag: int, obj: dict[object, object] | MPT[object, object]) -> None:
+        self._buf.append(tag)
+        self._varint(len(obj))
+        for k, v in obj.items():
+            self._write(k)
+            self._write(v)
+
+    def _dict(self, obj: dict[object, object]) -> None:
+        self._pairs(_DICT, obj)
+
+    def _mapping(self, obj: MPT[object, object]) -> None:
+        self._pairs(_MAPPING, obj)
+
+@functools.cache
+def _enum(name: str) -> type[Enum]:
+    # The enums are only loaded to decode a message that has one, e.g. not for search results.
+    from . import enums as e
+
+    cls = getattr(e, name, None)
+    if not isinstance(cls, type) or not issubclass(cls, Enum):
+        raise ValueError("Unknown enum")
+    return cls
+
+@functools.cache
+def _enum_members(name: str) -> tuple[Enum, ...]:
+    from .codes import members
+
+    return members(_enum(name))
+
+class Decoder:
+    def __init__(self, data: bytes | memoryview) -> None:
+        self._data = memoryview(data)
+        self._pos = 0
+        self._strings: list[str] = []
+
+    def decode(self) -> Any:
+        value = self._read()
+        if self._pos != len(self._data):
+            raise ValueError("Trailing data after encoded value")
+        return value
+
+    def _varint(self) -> int:
+        data = self._data
+        result = shift = 0
+        while True:
+            byte = data[self._pos]
+            self._pos += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+    def _int(self) -> int:
+        value = self._varint()
+        return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+    def _str(self) -> str:
+        tag = self._data[self._pos]
+        self._pos += 1
+        if tag == _STR_REF:
+            return self._strings[self._varint()]
+        if tag != _STR:
+            raise ValueError(f"Expected string, got tag {tag}")
+        size = self._varint()
+        value = sys.intern(str(self._data[self._pos:self._pos + size], "utf-8"))
+        self._pos += size
+        self._strings.append(value)
+        return value
+
+    def _read(self) -> Any:
+        tag = self._data[self._pos]
+        if tag == _STR or tag == _STR_REF:
+            return self._str()
+        self._pos += 1
+        if tag == _NONE:
+            return None
+        if tag == _TRUE:
+            return True
+        if tag == _FALSE:
+            return False
+        if tag == _INT:
+            return self._int()
+        if tag == _TUPLE:
+            return tuple([self._read() for _ in range(self._varint())])
+        if tag == _MAPPING or tag == _DICT:
+            size = self._varint()
+            items = {}
+            for _ in range(size):
+                k = self._read()
+                items[k] = self._read()
+            return MPT(items) if tag == _MAPPING else items
+        if tag == _ENUM_CODE:
+            return _enum_members(self._str())[self._varint()]
+        if tag == _ENUM:
+            cls = _enum(self._str())
+            return cls(self._str())
+        if tag == _LIST:
+            return [self._read() for _ in range(self._varint())]
+        if tag == _FROZENSET:
+            return frozenset([self._read() for _ in range(self._varint())])
+        if tag == _DECIMAL:
+            return Decimal(self._str())
+        if tag == _DATE:
+            return datetime.date.fromordinal(self._varint())
+        if tag == _TIME:
+            return datetime.time.fromisoformat(self._str())
+        if tag == _TIMEDELTA:
+            days = self._int()
+            return datetime.timedelta(days=days, seconds=self._varint(), microseconds=self._varint())
+        if tag == _FLOAT:
+            value = _FLOAT_STRUCT.unpack_from(self._data, self._pos)[0]
+            self._pos += 8
+            return value
+        if tag == _BYTES:
+            size = self._varint()
+            value = bytes(self._data[self._pos:self._pos + size])
+            self._pos += size
+            return value
+        raise ValueError(f"Unknown tag {tag}")
+
+def dumps(obj: object) -> bytes:
+    return Encoder().encode(obj)
+
+def loads(data: bytes | memoryview) -> Any:
+    # Truncated or damaged data fails as a ValueError, whatever the decoder tripped over.
+    try:
+        return Decoder(data).decode()
+    except (IndexError, KeyError, TypeError, ArithmeticError, struct.error) as exc:
+        raise ValueError(f"Damaged encoding: {exc!r}") from exc
@@ -0,0 +1,37 @@
+from collections.abc import Iterable
+from enum import Enum
+from typing import TypeVar
+
+from . import enums as e
+
+_E = TypeVar("_E", bound=Enum)
+
+# Integer codes of the members of the enums of otds.enums: the position of a member in its class.
+# Codes are dense from 0, so members are found by indexing and sets of members fit a bitmask,
+# e.g. the unit facilities of a unit or the weekdays of a condition. Codes follow the order of
+# the members in otds.enums; reordering them changes stored codes and the snapshot format.
+ENUMS: tuple[type[Enum], ...] = tuple(
+    v for v in vars(e).values() if isinstance(v, type) and issubclass(v, Enum) and v.__module__ == e.__name__)
+
+# Keyed by the id of the member: hashing a member calls Enum.__hash__, an id is hashed in C.
+_CODES: dict[int, int] = {id(member): i for cls in ENUMS for i, member in enumerate(cls)}
+_MEMBERS: dict[type[Enum], tuple[Enum, ...]] = {cls: tuple(cls) for cls in ENUMS}
+
+def code(member: Enum) -> int:
+    return _CODES[id(member)]
+
+def members(cls: type[_E]) -> tuple[_E, ...]:
+    return _MEMBERS[cls]  # type: ignore[return-value]
+
+def member(cls: type[_E], value: int) -> _E:
+    return members(cls)[value]
+
+def mask(found: Iterable[Enum]) -> int:
+    result = 0
+    for m in found:
+        result |= 1 << _CODES[id(m)]
+    return result
+
+def unmask(cls: type[_E], value: int) -> tuple[_E, ...]:
+    # Members in definition order.
+    return tuple(m for i, m in enumerate(members(cls)) if value >> i & 1)
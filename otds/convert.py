@@ -0,0 +1,53 @@
+import datetime
+import sys
+from decimal import Decimal
+from enum import Enum
+from functools import lru_cache
+from typing import NamedTuple, TypeVar, cast
+
+_E = TypeVar("_E", bound=Enum)
+
+# Memoising converters for the scalar values of the parse hot path. Catalogues repeat a few
+# thousand distinct dates, prices and tokens millions of times; all results are immutable.
+CACHE_SIZE = 4096
+
+# Keys, tokens and airport codes are interned instead, so every OTDS instance of the process,
+# one per supplier in a Federation, shares a single copy of each.
+def text(value: str | bytes) -> str:
+    # lxml-stubs type attribute values as str | bytes, lxml returns str.
+    assert isinstance(value, str)
+    return sys.intern(value)
+
+date = lru_cache(maxsize=CACHE_SIZE)(datetime.date.fromisoformat)
+time = lru_cache(maxsize=CACHE_SIZE)(datetime.time.fromisoformat)
+decimal = lru_cache(maxsize=CACHE_SIZE)(Decimal)
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _member(cls: type[Enum], value: object) -> Enum:
+    return cls(value)
+
+def enum(cls: type[_E], value: object) -> _E:
+    return cast(_E, _member(cls, value))
+
+class CacheStats(NamedTuple):
+    hits: int
+    misses: int
+    size: int
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+_CONVERTERS = {"date": date, "time": time, "decimal": decimal, "enum": _member}
+
+def stats() -> dict[str, CacheStats]:
+    found = {}
+    for name, f in _CONVERTERS.items():
+        info = f.cache_info()
+        found[name] = CacheStats(info.hits, info.misses, info.currsize)
+    return found
+
+def clear() -> None:
+    for f in _CONVERTERS.values():
+        f.cache_clear()
@@ -0,0 +1,361 @@
+import datetime
+from collections.abc import Callable, Iterable, Sequence
+from decimal import Decimal
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+from . import enums as e
+from . import typedefs as t
+
+if TYPE_CHECKING:
+    from .profile import Profiler
+
+_CENT = Decimal("0.01")
+
+# Set by otds.profile.Profiler while it records.
+_profiler: "Profiler | None" = None
+
+def active_profiler() -> "Profiler | None":
+    return _profiler
+
+def set_profiler(profiler: "Profiler | None") -> None:
+    global _profiler
+    _profiler = profiler
+
+class Travel(NamedTuple):
+    check_in: datetime.date
+    nights: int
+    ages: tuple[int, ...]
+    booking_date: datetime.date
+    airports: frozenset[str] = frozenset()
+
+    @property
+    def check_out(self) -> datetime.date:
+        return self.check_in + datetime.timedelta(days=self.nights)
+
+    @property
+    def stay(self) -> tuple[datetime.date, ...]:
+        return tuple(self.check_in + datetime.timedelta(days=i) for i in range(self.nights))
+
+# First day and number of consecutive days a Date or Weekdays condition tests: the check-in or
+# check-out day, the day being priced, or every day of the stay (the check-in day without nights).
+def _span(day_type: e.DayType, travel: Travel, day: datetime.date | None) -> tuple[datetime.date, int]:
+    if day_type is e.DayType.CheckIn:
+        return (travel.check_in, 1)
+    if day_type is e.DayType.CheckOut:
+        return (travel.check_out, 1)
+    if day is not None:
+        return (day, 1)
+    return (travel.check_in, max(travel.nights, 1))
+
+def _dates_hold(dates: t.DateCondition, first: datetime.date, count: int) -> bool:
+    if "min" in dates and first < dates["min"]:
+        return False
+    if "max" in dates and first + datetime.timedelta(days=count - 1) > dates["max"]:
+        return False
+    if "dates" not in dates:
+        return True
+    start, bits = dates["days"]
+    offset = first.toordinal() - start
+    run = (1 << count) - 1
+    return offset >= 0 and bits >> offset & run == run
+
+def _weekdays_hold(mask: int, first: datetime.date, count: int) -> bool:
+    # The weekdays of count days from first, folded into one week.
+    days = ((1 << min(count, 7)) - 1) << first.weekday()
+    days = (days | days >> 7) & 0x7F
+    return mask & days == days
+
+def _in_range(value: int, conds: t.AgeCondition | t.BookingOffsetCondition) -> bool:
+    return conds.get("min", value) <= value <= conds.get("max", value)
+
+def _day_index(conds: tuple[tuple[e.DayIndex, int], ...], repeat: int | None, travel: Travel, day: datetime.date) -> bool:
+    index = (day - travel.check_in).days + 1
+    if repeat:
+        index = (index - 1) % repeat + 1
+    last = repeat or travel.nights
+    indices = set()
+    first, until = 1, last
+    for kind, value in conds:
+        # Negative values count from the last day.
+        value = value if value > 0 else last + 1 + value
+        if kind is e.DayIndex.Indices:
+            indices.add(value)
+        elif kind is e.DayIndex.From:
+            first = max(first, value)
+        else:
+            until = min(until, value)
+    return (not indices or index in indices) and first <= index <= until
+
+def _day_impact(impact: t.DayImpact, travel: Travel, day: datetime.date) -> bool:
+    if impact[0] is e.DayImpact.Date:
+        day_type, _source, dates = impact[1]
+        return _dates_hold(dates, *_span(day_type, travel, day))
+    if impact[0] is e.DayImpact.Weekdays:
+        _source, day_type, _weekdays, mask = impact[1]
+        return _weekdays_hold(mask, *_span(day_type, travel, day))
+    # Stored as (Source, ((DayIndex, value), ...), Repeat) by OTDS.parse_day_index_condition.
+    _source, conds, repeat = impact[1]  # type: ignore[misc]
+    return _day_index(conds, repeat, travel, day)
+
+def _person_impact(impact: t.PersonImpact, travel: Travel, person: int) -> bool:
+    if impact[0] is e.PersonImpact.Age:
+        return _in_range(travel.ages[person], impact[1][1])
+    if impact[0] is e.PersonImpact.Index:
+        index = impact[1][1]
+        position = person + 1
+        if "indices" in index and position not in index["indices"]:
+            return False
+        return index.get("from_", position) <= position <= index.get("until", position)
+    # The request carries no genders.
+    return True
+
+def _duration(conds: t.DurationCondition, nights: int) -> bool:
+    # Durations lose their unit when parsed, they are taken as nights.
+    length = datetime.timedelta(days=nights)
+    if "min" in conds and length < conds["min"]:
+        return False
+    if "max" in conds and length > conds["max"]:
+        return False
+    if "multiples" in conds and nights % conds["multiples"]:
+        return False
+    return "durations" not in conds or nights in conds["durations"]
+
+def _person_group(persons: tuple[t.OccupancyConditionPerson, ...], ages: tuple[int, ...]) -> bool:
+    return all(sum(1 for age in ages if age >= p.get("min_age", 0)) >= p.get("min_count", 1) for p in persons)
+
+# Whether a condition holds for a travel, or for one day and one person of it when pricing.
+# Impact conditions without a day or person hold when any day or person matches. Tags, Keys,
+# MatchEqual and Impact conditions refer to other components of a package and never narrow
+# a search on their own, they hold.
+def matches(cond: t.ConditionGroup, travel: Travel, day: datetime.date | None = None, person: int | None = None) -> bool:
+    if _profiler is not None:
+        return _profiler.condition(_matches, cond, travel, day, person)
+    return _matches(cond, travel, day, person)
+
+def _matches(cond: t.ConditionGroup, travel: Travel, day: datetime.date | None, person: int | None) -> bool:
+    matcher = _MATCHERS.get(id(cond[0]))
+    return True if matcher is None else matcher(cond[1], travel, day, person)
+
+def _match_and(conds: tuple[t.ConditionGroup, ...], travel: Travel, day: datetime.date | None, person: int | None) -> bool:
+    return all(matches(c, travel, day, person) for c in conds)
+
+def _match_or(conds: tuple[t.ConditionGroup, ...], travel: Travel, day: datetime.date | None, person: int | None) -> bool:
+    return any(matches(c, travel, day, person) for c in conds)
+
+def _match_not(cond: t.ConditionGroup, travel: Travel, day: datetime.date | None, person: int | None) -> bool:
+    return not matches(cond, travel, day, person)
+
+def _match_imply(conds: tuple[t.ConditionGroup, t.ConditionGroup], travel: Travel, day: datetime.date | None, person: int | None) -> bool:
+    return not matches(conds[0], travel, day, person) or matches(conds[1], travel, day, person)
+
+def _match_date(value: tuple[e.DayType, t.SourceAttribute, t.DateCondition], travel: Travel, day: datetime.date | None, person: int | None) -> bool:
+    day_type, _source, dates = value
+    return _dates_hold(dates, *_span(day_type, travel, day))
+
+def _match_weekdays(value: t.WeekdayCondition, travel: Travel, day: datetime.date | None, person: int | None) -> bool:
+    _source, day_type, _weekdays, mask = value
+    return _weekdays_hold(mask, *_span(day_type, travel, day))
+
+def _match_day_impact(impact: t.DayImpact, travel: Travel, day: datetime.date | None, person: int | None) -> bool:
+    days = (day,) if day is not None else travel.stay or (travel.check_in,)
+    return any(_day_impact(impact, travel, d) for d in days)
+
+def _match_person_impact(impact: t.PersonImpact, travel: Travel, day: datetime.date | None, person: int | None) -> bool:
+    persons = (person,) if person is not None else range(len(travel.ages))
+    return any(_person_impact(impact, travel, p) for p in persons)
+
+def _match_booking_date(value: tuple[t.SourceAttribute, t.BookingDateCondition], travel: Travel, day: datetime.date | None,
+                        person: int | None) -> bool:
+    booking = value[1]
+    return booking.get("min", travel.booking_date) <= travel.booking_date <= booking.get("max", travel.booking_date)
+
+def _match_booking_date_offset(value: tuple[t.SourceAttribute, t.BookingOffsetCondition], travel: Travel, day: datetime.date | None,
+                               person: int | None) -> bool:
+    return _in_range((travel.check_in - travel.booking_date).days, value[1])
+
+def _match_duration(value: tuple[t.SourceAttribute, t.DurationCondition], travel: Travel, day: datetime.date | None, person: int | None) -> bool:
+    return _duration(value[1], travel.nights)
+
+def _match_person_count(value: tuple[t.SourceAttribute, t.PersonCount], travel: Travel, day: datetime.date | None, person: int | None) -> bool:
+    return len(travel.ages) >= value[1].get("min", 0)
+
+def _match_person_group(value: tuple[t.SourceAttribute, tuple[t.OccupancyConditionPerson, ...]], travel: Travel, day: datetime.date | None,
+                        person: int | None) -> bool:
+    return _person_group(value[1], travel.ages)
+
+def _match_airports(value: tuple[t.SourceAttribute, e.AirportType, tuple[str, ...]], travel: Travel, day: datetime.date | None,
+                    person: int | None) -> bool:
+    _source, airport_type, airports = value
+    if airport_type is not e.AirportType.Departure or not travel.airports:
+        return True
+    return not travel.airports.isdisjoint(airports)
+
+# Condition kind to the function evaluating its value. Keyed by the id of the member: members are
+# singletons and hashing one calls Enum.__hash__, an id is hashed in C. Kinds without one hold.
+_MATCHERS: dict[int, Callable[[Any, Travel, datetime.date | None, int | None], bool]] = {
+    id(e.Condition.And): _match_and,
+    id(e.Condition.Or): _match_or,
+    id(e.Condition.Not): _match_not,
+    id(e.Condition.Imply): _match_imply,
+    id(e.Condition.Date): _match_date,
+    id(e.Condition.Weekdays): _match_weekdays,
+    id(e.Condition.DayImpact): _match_day_impact,
+    id(e.Condition.PersonImpact): _match_person_impact,
+    id(e.Condition.BookingDate): _match_booking_date,
+    id(e.Condition.BookingDateOffset): _match_booking_date_offset,
+    id(e.Condition.Duration): _match_duration,
+    id(e.Condition.PersonCount): _match_person_count,
+    id(e.Condition.PersonGroup): _match_person_group,
+    id(e.Condition.Airports): _match_airports,
+}
+
+# Offset from the check-in and number of the days a Date or Weekdays condition tests, as _span.
+def _window(day_type: e.DayType, nights: int) -> tuple[int, int]:
+    if day_type is e.DayType.CheckIn:
+        return (0, 1)
+    if day_type is e.DayType.CheckOut:
+        return (nights, 1)
+    return (0, max(nights, 1))
+
+def _date_bits(dates: t.DateCondition, first: int, length: int) -> int:
+    # Bit i for the day of ordinal first + i, i < length, that the dates allow.
+    lo = max(dates["min"].toordinal() - first, 0) if "min" in dates else 0
+    hi = min(dates["max"].toordinal() - first + 1, length) if "max" in dates else length
+    if hi <= lo:
+        return 0
+    bits = ((1 << (hi - lo)) - 1) << lo
+    if "dates" in dates:
+        start, days = dates["days"]
+        shift = start - first
+        bits &= days << shift if shift >= 0 else days >> -shift
+    return bits
+
+def _weekday_bits(mask: int, first: int, length: int) -> int:
+    # The mask turned to start on the weekday of the first day, then repeated over length days.
+    weekday = (first - 1) % 7
+    bits = (mask >> weekday | mask << (7 - weekday)) & 0x7F
+    filled = 7
+    while filled < length:
+        bits |= bits << filled
+        filled *= 2
+    return bits & ((1 << length) - 1)
+
+def _runs(bits: int, count: int) -> int:
+    # Bit i set where bits i to i + count - 1 all are.
+    span = 1
+    while span < count:
+        step = min(span, count - span)
+        bits &= bits >> step
+        span += step
+    return bits
+
+def _check_ins(cond: t.ConditionGroup, first: int, days: int, nights: int) -> int | None:
+    every = (1 << days) - 1
+    if cond[0] is e.Condition.And or cond[0] is e.Condition.Or:
+        bits = every if cond[0] is e.Condition.And else 0
+        for c in cond[1]:
+            found = _check_ins(c, first, days, nights)
+            if found is None:
+                return None
+            bits = bits & found if cond[0] is e.Condition.And else bits | found
+        return bits
+    if cond[0] is e.Condition.Not:
+        inner = _check_ins(cond[1], first, days, nights)
+        return None if inner is None else every & ~inner
+    if cond[0] is e.Condition.Imply:
+        condition = _check_ins(cond[1][0], first, days, nights)
+        then = _check_ins(cond[1][1], first, days, nights)
+        return None if condition is None or then is None else every & (~condition | then)
+    if cond[0] is e.Condition.Date:
+        day_type, _source, dates = cond[1]
+        offset, count = _window(day_type, nights)
+        return _runs(_date_bits(dates, first + offset, days + count - 1), count)
+    if cond[0] is e.Condition.Weekdays:
+        _source, day_type, _weekdays, mask = cond[1]
+        offset, count = _window(day_type, nights)
+        return _runs(_weekday_bits(mask, first + offset, days + count - 1), count)
+    # Kinds without a matcher always hold, the others depend on more than the dates.
+    return None if id(cond[0]) in _MATCHERS else every
+
+# The check-in days first + i, i < days, on which every condition holds for a stay of nights, as
+# bit i of the result: what matches() without day and person finds, for all days at once with
+# bit operations on whole integers. None if a condition depends on more than the dates of the stay
+# (only And, Or, Not, Imply, Date, Weekdays and the kinds that always hold are compiled), and while
+# a profiler records every evaluation.
+def check_ins(conds: Iterable[t.ConditionGroup], first: datetime.date, days: int, nights: int) -> int | None:
+    if _profiler is not None:
+        return None
+    found = (1 << days) - 1
+    for cond in conds:
+        bits = _check_ins(cond, first.toordinal(), days, nights)
+        if bits is None:
+            return None
+        found &= bits
+    return found
+
+def _counted(person: t.OccupancyPerson, ages: tuple[int, ...]) -> tuple[list[int], bool]:
+    matching = [i for i, age in enumerate(ages) if person.get("min_age", 0) <= age <= person.get("max_age", age)]
+    if "count" in person:
+        return (matching, len(matching) == person["count"])
+    return (matching, person.get("min_count", 0) <= len(matching) <= person.get("max_count", len(matching)))
+
+# A party fits when every Person entry holds, every person is covered by one and no Exclude
+# combination holds in full.
+def occupancy_fits(occupancy: tuple[t.Occupancy, ...], ages: tuple[int, ...]) -> bool:
+    covered = [False] * len(ages)
+    for occ in occupancy:
+        if occ[0] is e.Occupancy.Person:
+            matching, fits = _counted(occ[1], ages)
+            if not fits:
+                return False
+            for i in matching:
+                covered[i] = True
+        elif all(_counted(p, ages)[1] for p in occ[1]):
+            return False
+    return all(covered)
+
+def _basis(conds: tuple[t.AbsoluteCondition, ...], travel: Travel) -> tuple[Sequence[datetime.date | None], Sequence[int | None]]:
+    days: Sequence[datetime.date | None] = (None,)
+    persons: Sequence[int | None] = (None,)
+    for cond in conds:
+        if cond[0] is e.Absolute.DayBase:
+            count = cond[1][1]
+            days = travel.stay if count is e.X.x else (travel.check_in,) * count
+        elif cond[0] is e.Absolute.PersonBase:
+            count = cond[1]
+            persons = range(len(travel.ages)) if count is e.X.x else (None,) * count
+    return (days, persons)
+
+def absolute_amount(item: t.PriceItem, travel: Travel) -> Decimal | None:
+    value, conds = item["absolute"]
+    days, persons = _basis(conds, travel)
+    cond = item.get("condition")
+    if cond is None:
+        times = len(days) * len(persons)
+    else:
+        times = sum(1 for d in days for p in persons if matches(cond, travel, d, p))
+    return value * times if times else None
+
+# Totals the Absolute price items of one offer, then applies the Percent items to the classes
+# they name, or to everything priced so far. None if no Absolute item applied at all.
+def price(items: Sequence[tuple[t.Token, t.PriceItem]], travel: Travel) -> Decimal | None:
+    by_class: dict[t.Token, Decimal] = {}
+    for cls, item in items:
+        if "absolute" in item:
+            amount = absolute_amount(item, travel) if _profiler is None else _profiler.price_item(absolute_amount, cls, item, travel)
+            if amount is not None:
+                by_class[cls] = by_class.get(cls, Decimal(0)) + amount
+    if not by_class:
+        return None
+    total = sum(by_class.values(), Decimal(0))
+    for cls, item in items:
+        if "percent" not in item:
+            continue
+        cond = item.get("condition")
+        if cond is not None and not matches(cond, travel):
+            continue
+        value, conds = item["percent"]
+        apply_to: set[str] = {c for _kind, classes in conds for c in classes}
+        base = sum((v for c, v in by_class.items() if not apply_to or c in apply_to), Decimal(0))
+        total += (base * value / 100).quantize(_CENT)
+    return total
@@ -0,0 +1,52 @@
+import os
+from collections.abc import Callable, Iterable
+from concurrent.futures import Future, ThreadPoolExecutor
+from types import TracebackType
+from typing import TYPE_CHECKING, TypeVar
+
+from .cache import CachedSearch
+from .search import SearchPipeline, SearchRequest, SearchResult
+
+if TYPE_CHECKING:
+    from .main import OTDS
+
+_T = TypeVar("_T")
+
+# Runs read queries on a pool of threads over one shared model, the way to use all cores of a
+# free-threaded interpreter without a process per core. Every query is given the version of the
+# model that was published when it was submitted, deltas parsed meanwhile do not affect it.
+# The read API of the model, the indexes, the evaluators and SearchPipeline hold no state that
+# queries change, apart from caches that only grow and are replaced as a whole on a delta.
+class QueryExecutor:
+    def __init__(self, otds: "OTDS", workers: int | None = None, search: SearchPipeline | CachedSearch | None = None) -> None:
+        self._otds = otds
+        self._unsubscribe: Callable[[], None] | None = None
+        if search is None:
+            pipeline = SearchPipeline(otds)
+            self._unsubscribe = otds.on_change(pipeline.invalidate)
+            search = pipeline
+        self._search = search
+        self._executor = ThreadPoolExecutor(max_workers=workers or os.cpu_count(), thread_name_prefix="otds-query")
+
+    def __enter__(self) -> "QueryExecutor":
+        return self
+
+    def __exit__(self, exc_type: type[BaseException] | None, exc: BaseException | None, tb: TracebackType | None) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._executor.shutdown()
+        if self._unsubscribe is not None:
+            self._unsubscribe()
+            self._unsubscribe = None
+
+    def submit(self, query: Callable[["OTDS"], _T]) -> "Future[_T]":
+        return self._executor.submit(query, self._otds.pin())
+
+    def search(self, request: SearchRequest, limit: int | None = None) -> "Future[SearchResult]":
+        return self._executor.submit(self._search.search, request, limit)
+
+    def search_batch(self, requests: Iterable[SearchRequest], limit: int | None = None) -> list[SearchResult]:
+        # Requests run in parallel, results come back in request order.
+        futures = [self.search(request, limit) for request in requests]
+        return [future.result() for future in futures]
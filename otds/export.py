@@ -0,0 +1,228 @@
+import datetime
+import json
+from collections.abc import Iterable, Iterator, Mapping
+from decimal import Decimal
+from enum import Enum
+from pathlib import Path
+from types import MappingProxyType as MPT
+from typing import Any, Literal
+
+from . import typedefs as t
+from .index import MAX_ORDINAL, MIN_ORDINAL, condition_period
+from .main import OTDS
+
+# Columns of each exported table. Rows refer to their parents through ids built from the
+# Key path ("H1/S1/B1"), "/" never occurs in a Key.
+TABLES = MPT({
+    "accommodations": (
+        ("id", "string"), ("name", "string"), ("type", "string"), ("official_category", "float64"),
+        ("city", "string"), ("country", "string"), ("latitude", "float64"), ("longitude", "float64"),
+        ("giata", "string"), ("airports", "list<string>"),
+    ),
+    "properties": (
+        ("owner_type", "string"), ("owner_id", "string"), ("properties_key", "string"), ("position", "int64"),
+        ("name", "string"), ("type", "string"), ("board_type", "string"), ("board_name", "string"),
+        ("unit_name", "string"), ("unit_types", "list<string>"), ("condition", "string"),
+    ),
+    "selling_accoms": (
+        ("id", "string"), ("accommodation_id", "string"), ("selling_key", "string"),
+    ),
+    "boards": (
+        ("id", "string"), ("selling_id", "string"), ("accommodation_id", "string"), ("board_key", "string"),
+    ),
+    "units": (
+        ("id", "string"), ("selling_id", "string"), ("accommodation_id", "string"), ("unit_key", "string"),
+        ("selling_units", "list<string>"),
+    ),
+    "availability_days": (
+        ("owner_type", "string"), ("owner_id", "string"), ("availabilities_key", "string"),
+        ("availability_key", "string"), ("date", "date32"), ("state", "string"), ("count", "int64"),
+        ("check_in", "string"), ("check_out", "string"),
+    ),
+    "price_items": (
+        ("owner_type", "string"), ("owner_id", "string"), ("price_items_key", "string"), ("class", "string"),
+        ("position", "int64"), ("absolute", "decimal"), ("percent", "decimal"), ("period_start", "date32"),
+        ("period_end", "date32"), ("condition", "string"), ("combinatorics", "string"),
+    ),
+    "flights": (
+        ("id", "string"), ("departure", "string"), ("arrival", "string"), ("check_out_date_offset", "int64"),
+    ),
+    "booking_classes": (
+        ("id", "string"), ("flight_id", "string"), ("booking_class_key", "string"),
+    ),
+})
+
+Format = Literal["parquet", "arrow"]
+Row = tuple[str, tuple[object, ...]]
+
+DEFAULT_BATCH_SIZE = 65536
+
+def _plain(obj: object) -> object:
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, datetime.timedelta):
+        return obj.total_seconds()
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, Mapping):
+        if all(isinstance(k, str) for k in obj):
+            return {k: _plain(v) for k, v in obj.items()}
+        return [[_plain(k), _plain(v)] for k, v in obj.items()]
+    if isinstance(obj, (tuple, list, frozenset)):
+        return [_plain(v) for v in obj]
+    return obj
+
+def to_json(obj: object) -> str | None:
+    return None if obj is None else json.dumps(_plain(obj), separators=(",", ":"))
+
+def _value(obj: Enum | None) -> str | None:
+    return None if obj is None else str(obj.value)
+
+def _check(state: Enum | Literal[False] | None) -> str | None:
+    # False stands for NoCheckIn/NoCheckOut, None for no restriction.
+    return "No" if state is False else _value(state)
+
+def _category(category: t.AccommodationCategory | None) -> float | None:
+    return None if category is None else category[0] + category[1] / 10
+
+def _first(properties: Mapping[t.Key, tuple[t.Property, ...]]) -> t.Property:
+    # First value of every field over all property groups, enough for a summary row.
+    found: dict[str, object] = {}
+    for groups in properties.values():
+        for group in groups:
+            for field, value in group.items():
+                found.setdefault(field, value)
+    return found  # type: ignore[return-value]
+
+def _properties(owner_type: str, owner_id: str, properties: Mapping[t.Key, tuple[t.Property, ...]]) -> Iterator[Row]:
+    for key, groups in properties.items():
+        for i, p in enumerate(groups):
+            unit_types = [u.value for u in p["unit_types"]] if "unit_types" in p else None
+            yield ("properties", (owner_type, owner_id, key, i, p.get("name"), _value(p.get("type")), _value(p.get("board_type")),
+                                  p.get("board_name"), p.get("unit_name"), unit_types, to_json(p.get("condition"))))
+
+def _price_items(owner_type: str, owner_id: str, price_items: Mapping[t.Key, Mapping[t.Token, tuple[t.PriceItem, ...]]]) -> Iterator[Row]:
+    for key, classes in price_items.items():
+        for cls, items in classes.items():
+            for i, item in enumerate(items):
+                start, end = condition_period(item.get("condition"))
+                yield ("price_items", (
+                    owner_type, owner_id, key, cls, i,
+                    item["absolute"][0] if "absolute" in item else None,
+                    item["percent"][0] if "percent" in item else None,
+                    None if start == MIN_ORDINAL else datetime.date.fromordinal(start),
+                    None if end == MAX_ORDINAL else datetime.date.fromordinal(end),
+                    to_json(item.get("condition")), to_json(item.get("combinatorics"))))
+
+def _availability_days(owner_type: str, owner_id: str, availabilities: Mapping[t.Key, t.Availabilities]) -> Iterator[Row]:
+    for avails_key, (_cond, availability) in availabilities.items():
+        for avail_key, (start, end, (default, _extra), states) in availability.items():
+            by_offset = {offset: (state, check_in, check_out) for offset, state, check_in, check_out in states.values()}
+            for offset in range((end - start).days + 1):
+                state, check_in, check_out = by_offset.get(t.Offset(offset), (default, None, None))
+                count = state[1] if len(state) > 1 else None
+                yield ("availability_days", (
+                    owner_type, owner_id, avails_key, avail_key, start + datetime.timedelta(days=offset),
+                    state[0].value, count, _check(check_in), _check(check_out)))
+
+def accommodation_rows(key: t.Key, accom: t.Accommodation) -> Iterator[Row]:
+    summary = _first(accom.get("properties", {}))
+    address = summary.get("address", {})
+    geocode = address.get("geo", {}).get("geocode")
+    giata = summary.get("info", {}).get("giata")
+    yield ("accommodations", (
+        key, summary.get("name"), _value(summary.get("type")), _category(summary.get("official_category")),
+        address.get("city"), address.get("country"),
+        geocode["latitude"] if geocode else None, geocode["longitude"] if geocode else None,
+        giata[1] if giata else None, list(accom.get("airports", ()))))
+    yield from _properties("accommodation", key, accom.get("properties", {}))
+    yield from _availability_days("accommodation", key, accom.get("availabilities", {}))
+    for sell_key, sell in accom["selling"].items():
+        sell_id = f"{key}/{sell_key}"
+        yield ("selling_accoms", (sell_id, key, sell_key))
+        yield from _price_items("selling_accom", sell_id, sell.get("price_items", {}))
+        for board_key, board in sell.get("board", {}).items():
+            board_id = f"{sell_id}/{board_key}"
+            yield ("boards", (board_id, sell_id, key, board_key))
+            yield from _properties("board", board_id, board.get("properties", {}))
+            yield from _price_items("board", board_id, board.get("price_items", {}))
+        for unit_key, unit in sell.get("unit", {}).items():
+            unit_id = f"{sell_id}/{unit_key}"
+            yield ("units", (unit_id, sell_id, key, unit_key, list(unit["selling_units"])))
+            yield from _properties("unit", unit_id, unit.get("properties", {}))
+
+def flight_rows(key: t.Key, flight: t.Oneway) -> Iterator[Row]:
+    yield ("flights", (key, flight["departure"], flight["arrival"], flight.get("check_out_date_offset")))
+    yield from _properties("flight", key, flight.get("properties", {}))
+    yield from _price_items("flight", key, flight.get("price_items", {}))
+    for class_key, booking_class in flight["booking_class"].items():
+        class_id = f"{key}/{class_key}"
+        yield ("booking_classes", (class_id, key, class_key))
+        yield from _properties("booking_class", class_id, booking_class.get("properties", {}))
+        yield from _price_items("booking_class", class_id, booking_class.get("price_items", {}))
+        yield from _availability_days("booking_class", class_id, booking_class.get("availabilities", {}))
+
+def rows(otds: OTDS) -> Iterator[Row]:
+    # Generated one accommodation or flight at a time, nothing is materialised up front.
+    yield from _price_items("accommodations", "", otds.accommodations_price_items)
+    for key, accom in otds.accommodations.items():
+        yield from accommodation_rows(key, accom)
+    for key, flight in otds.flights.items():
+        yield from flight_rows(key, flight)
+
+def _arrow_type(pa: Any, name: str) -> Any:
+    if name == "list<string>":
+        return pa.list_(pa.string())
+    if name == "decimal":
+        return pa.decimal128(38, 10)
+    return getattr(pa, name)()
+
+class _TableWriter:
+    def __init__(self, pa: Any, path: Path, name: str, fmt: Format) -> None:
+        self._pa = pa
+        self._schema = pa.schema([(col, _arrow_type(pa, kind)) for col, kind in TABLES[name]])
+        self._columns: list[list[object]] = [[] for _ in TABLES[name]]
+        self.rows = 0
+        if fmt == "parquet":
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(path, self._schema)
+        else:
+            self._writer = pa.ipc.new_file(path, self._schema)
+
+    def append(self, row: tuple[object, ...]) -> int:
+        for column, value in zip(self._columns, row):
+            column.append(value)
+        return len(self._columns[0])
+
+    def flush(self) -> None:
+        if self._columns[0]:
+            batch = self._pa.record_batch(self._columns, schema=self._schema)
+            self._writer.write_batch(batch)
+            self.rows += batch.num_rows
+            self._columns = [[] for _ in self._columns]
+
+    def close(self) -> None:
+        self.flush()
+        self._writer.close()
+
+def export(otds: OTDS, directory: Path, fmt: Format = "parquet", batch_size: int = DEFAULT_BATCH_SIZE,
+           tables: Iterable[str] = TABLES) -> dict[str, int]:
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise NotImplementedError("Exporting requires the pyarrow package") from None
+
+    suffix = ".parquet" if fmt == "parquet" else ".arrow"
+    directory.mkdir(parents=True, exist_ok=True)
+    writers = {name: _TableWriter(pa, directory / f"{name}{suffix}", name, fmt) for name in tables}
+    try:
+        for name, row in rows(otds):
+            writer = writers.get(name)
+            if writer is not None and writer.append(row) >= batch_size:
+                writer.flush()
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return {name: writer.rows for name, writer in writers.items()}
@@ -0,0 +1,138 @@
+import datetime
+import heapq
+import itertools
+import threading
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import MappingProxyType as MPT
+from typing import NamedTuple
+
+from . import snapshot
+from . import typedefs as t
+from .index import IntervalIndex, accommodation_periods
+from .main import OTDS
+from .search import Offer, SearchPipeline, SearchRequest
+
+# Suppliers are loaded into partitions of their own, so Keys of different tour operators never
+# collide and one supplier can be reloaded alone. Partitions live in one process and share the
+# interned keys and tokens, the enum members and the memoised dates and prices of convert, and
+# one date and GIATA index over all of them, keyed by SupplierKey.
+class SupplierKey(NamedTuple):
+    supplier: str
+    key: t.Key
+
+class SupplierOffer(NamedTuple):
+    supplier: str
+    offer: Offer
+
+# Search caches and a flight index of its own are built by the pipeline when first needed.
+class Partition(NamedTuple):
+    otds: OTDS
+    search: SearchPipeline
+    generation: int
+
+def giata_id(accom: t.Accommodation) -> str | None:
+    for groups in accom.get("properties", {}).values():
+        for group in groups:
+            if "info" in group and "giata" in group["info"]:
+                return group["info"]["giata"][1]
+    return None
+
+def load_partition(paths: Sequence[Path], generation: int = 0) -> Partition:
+    otds = snapshot.load_paths(paths)
+    return Partition(otds, SearchPipeline(otds), generation)
+
+# Bookable periods and GIATA ids of the accommodations of every partition, built again as a whole
+# when a partition is swapped, together with the partitions it was built from.
+class FederatedIndex:
+    def __init__(self, partitions: Mapping[str, Partition]) -> None:
+        self.partitions = MPT(dict(partitions))
+        periods: list[tuple[int, int, SupplierKey]] = []
+        giata: dict[str, list[SupplierKey]] = {}
+        for name, partition in self.partitions.items():
+            for key, accom in partition.otds.accommodations.items():
+                supplier_key = SupplierKey(name, key)
+                periods.extend((start, end, supplier_key) for start, end in accommodation_periods(accom))
+                found = giata_id(accom)
+                if found is not None:
+                    giata.setdefault(found, []).append(supplier_key)
+        self.dates = IntervalIndex(periods)
+        self.giata = MPT({k: tuple(v) for k, v in giata.items()})
+
+    def query(self, check_in_from: datetime.date, check_in_until: datetime.date | None = None, nights: int = 0) -> frozenset[SupplierKey]:
+        start = check_in_from.toordinal()
+        return frozenset(self.dates.overlap(start, (check_in_until or check_in_from).toordinal() + nights))
+
+class Federation:
+    def __init__(self, workers: int = 4) -> None:
+        self._workers = workers
+        self._paths: dict[str, tuple[Path, ...]] = {}
+        # Replaced, never changed in place: readers keep a consistent view during a reload.
+        self._index = FederatedIndex({})
+        self._lock = threading.Lock()
+
+    @property
+    def partitions(self) -> MPT[str, Partition]:
+        return self._index.partitions
+
+    @property
+    def index(self) -> FederatedIndex:
+        return self._index
+
+    def load(self, suppliers: Mapping[str, Sequence[Path]]) -> dict[str, Partition]:
+        # Suppliers are parsed in parallel, each from a snapshot and/or OTDS files applied in order.
+        # Nothing is swapped in unless every supplier loaded.
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            futures = {name: executor.submit(load_partition, tuple(paths), self._generation(name) + 1)
+                       for name, paths in suppliers.items()}
+            loaded = {name: future.result() for name, future in futures.items()}
+        with self._lock:
+            self._paths.update((name, tuple(paths)) for name, paths in suppliers.items())
+            self._index = FederatedIndex({**self._index.partitions, **loaded})
+        return loaded
+
+    def reload(self, supplier: str, paths: Sequence[Path] | None = None) -> Partition:
+        return self.load({supplier: self._paths[supplier] if paths is None else paths})[supplier]
+
+    def remove(self, supplier: str) -> None:
+        with self._lock:
+            self._paths.pop(supplier, None)
+            self._index = FederatedIndex({k: v for k, v in self._index.partitions.items() if k != supplier})
+
+    def _generation(self, supplier: str) -> int:
+        partition = self._index.partitions.get(supplier)
+        return -1 if partition is None else partition.generation
+
+    def accommodation(self, key: SupplierKey) -> t.Accommodation | None:
+        partition = self._index.partitions.get(key.supplier)
+        return None if partition is None else partition.otds.accommodations.get(key.key)
+
+    def accommodations(self) -> Iterator[tuple[SupplierKey, t.Accommodation]]:
+        for name, partition in self._index.partitions.items():
+            for key, accom in partition.otds.accommodations.items():
+                yield (SupplierKey(name, key), accom)
+
+    def by_giata(self, giata: str) -> tuple[SupplierKey, ...]:
+        return self._index.giata.get(giata, ())
+
+    def giata_groups(self, min_suppliers: int = 2) -> dict[str, tuple[SupplierKey, ...]]:
+        # Hotels offered by at least min_suppliers suppliers.
+        return {giata: keys for giata, keys in self._index.giata.items() if len({k.supplier for k in keys}) >= min_suppliers}
+
+    def dates(self, check_in_from: datetime.date, check_in_until: datetime.date | None = None, nights: int = 0) -> frozenset[SupplierKey]:
+        return self._index.query(check_in_from, check_in_until, nights)
+
+    def search(self, request: SearchRequest, limit: int | None = None, suppliers: Iterable[str] | None = None) -> list[SupplierOffer]:
+        # The shared date index finds the candidates of every supplier, each partition searches its
+        # own cheapest first and merging keeps the cheapest overall.
+        index = self._index
+        names = index.partitions.keys() if suppliers is None else suppliers
+        considered: dict[str, set[t.Key]] = {name: set() for name in names}
+        for supplier_key in index.query(request.check_in_from, request.check_in_until, request.nights):
+            if supplier_key.supplier in considered:
+                considered[supplier_key.supplier].add(supplier_key.key)
+        results = [[SupplierOffer(name, offer) for offer in index.partitions[name].search.search(request, limit, frozenset(keys)).offers]
+                   for name, keys in considered.items()]
+        merged = heapq.merge(*results, key=lambda o: o.offer.price)
+        return list(itertools.islice(merged, limit))
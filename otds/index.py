@@ -0,0 +1,295 @@
+import datetime
+import itertools
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable, Iterator, Mapping
+from typing import TYPE_CHECKING, Generic, NamedTuple, TypeVar
+
+from . import enums as e
+from . import typedefs as t
+
+if TYPE_CHECKING:
+    from .main import OTDS
+
+_T = TypeVar("_T")
+
+# Bounds of the periods that are open at one end, as date ordinals.
+MIN_ORDINAL = datetime.date.min.toordinal()
+MAX_ORDINAL = datetime.date.max.toordinal()
+
+class AvailabilityRef(NamedTuple):
+    accommodation: t.Key
+    availabilities: t.Key
+    availability: t.Key
+
+class PriceItemRef(NamedTuple):
+    # () for the Accommodations level, (accommodation, selling) or (accommodation, selling, board).
+    path: tuple[t.Key, ...]
+    key: t.Key
+    cls: t.Token
+    position: int
+
+class Departure(NamedTuple):
+    flight: t.Key
+    booking_class: t.Key
+    date: datetime.date
+    arrival_date: datetime.date
+
+class DateQuery(NamedTuple):
+    accommodations: frozenset[t.Key]
+    availabilities: tuple[AvailabilityRef, ...]
+    price_items: tuple[PriceItemRef, ...]
+
+# Static interval tree over sorted arrays of inclusive day ordinals. The tree is implicit:
+# the root of a slice [lo, hi) is its midpoint and _max_end holds the largest end in that slice.
+class IntervalIndex(Generic[_T]):
+    def __init__(self, items: Iterable[tuple[int, int, _T]] = ()) -> None:
+        ordered = sorted(items, key=lambda i: (i[0], i[1]))
+        self._starts = [i[0] for i in ordered]
+        self._ends = [i[1] for i in ordered]
+        self._values = [i[2] for i in ordered]
+        self._max_end = list(self._ends)
+        self._build(0, len(ordered))
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def _build(self, lo: int, hi: int) -> int:
+        if lo >= hi:
+            return MIN_ORDINAL - 1
+        mid = (lo + hi) // 2
+        self._max_end[mid] = max(self._ends[mid], self._build(lo, mid), self._build(mid + 1, hi))
+        return self._max_end[mid]
+
+    def overlap(self, start: int, end: int) -> Iterator[_T]:
+        stack = [(0, len(self._values))]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if self._max_end[mid] < start:
+                continue
+            stack.append((lo, mid))
+            if self._starts[mid] <= end:
+                if self._ends[mid] >= start:
+                    yield self._values[mid]
+                stack.append((mid + 1, hi))
+
+# Widest (start, end) ordinal period a condition can match by the dates of this component.
+def condition_period(cond: t.ConditionGroup | None) -> tuple[int, int]:
+    if cond is None:
+        return (MIN_ORDINAL, MAX_ORDINAL)
+    if cond[0] is e.Condition.Date:
+        _day_type, source, dates = cond[1]
+        if source != "ThisComponent":
+            return (MIN_ORDINAL, MAX_ORDINAL)
+        start = dates["min"].toordinal() if "min" in dates else MIN_ORDINAL
+        end = dates["max"].toordinal() if "max" in dates else MAX_ORDINAL
+        if "dates" in dates:
+            start = max(start, min(dates["dates"]).toordinal())
+            end = min(end, max(dates["dates"]).toordinal())
+        return (start, end)
+    if cond[0] is e.Condition.And:
+        periods = [condition_period(c) for c in cond[1]]
+        return (max((p[0] for p in periods), default=MIN_ORDINAL), min((p[1] for p in periods), default=MAX_ORDINAL))
+    if cond[0] is e.Condition.Or:
+        periods = [condition_period(c) for c in cond[1]]
+        return (min((p[0] for p in periods), default=MIN_ORDINAL), max((p[1] for p in periods), default=MAX_ORDINAL))
+    return (MIN_ORDINAL, MAX_ORDINAL)
+
+def _price_item_periods(path: tuple[t.Key, ...], price_items: Mapping[t.Key, Mapping[t.Token, tuple[t.PriceItem, ...]]]) -> Iterator[tuple[int, int, PriceItemRef]]:
+    for key, classes in price_items.items():
+        for cls, items in classes.items():
+            for i, item in enumerate(items):
+                start, end = condition_period(item.get("condition"))
+                if start <= end:
+                    yield (start, end, PriceItemRef(path, key, cls, i))
+
+# Ordinal periods in which an accommodation can be booked, unbounded without availabilities.
+def accommodation_periods(accom: t.Accommodation) -> list[tuple[int, int]]:
+    if "availabilities" not in accom:
+        return [(MIN_ORDINAL, MAX_ORDINAL)]
+    return [(start.toordinal(), end.toordinal())
+            for _cond, availability in accom["availabilities"].values()
+            for start, end, _default, _states in availability.values()]
+
+class DateIndex:
+    def __init__(self, otds: "OTDS") -> None:
+        self._otds = otds
+        accoms: list[tuple[int, int, t.Key]] = []
+        avails: list[tuple[int, int, AvailabilityRef]] = []
+        prices = list(_price_item_periods((), otds.accommodations_price_items))
+        for accom_key, accom in otds.accommodations.items():
+            accoms.extend((start, end, accom_key) for start, end in accommodation_periods(accom))
+            for avails_key, (_cond, availability) in accom.get("availabilities", {}).items():
+                for avail_key, (start, end, _default, _states) in availability.items():
+                    avails.append((start.toordinal(), end.toordinal(), AvailabilityRef(accom_key, avails_key, avail_key)))
+            for sell_key, sell in accom["selling"].items():
+                prices.extend(_price_item_periods((accom_key, sell_key), sell.get("price_items", {})))
+                for board_key, board in sell.get("board", {}).items():
+                    prices.extend(_price_item_periods((accom_key, sell_key, board_key), board.get("price_items", {})))
+        self._accommodations = IntervalIndex(accoms)
+        self._availabilities = IntervalIndex(avails)
+        self._price_items = IntervalIndex(prices)
+
+    def query(self, check_in_from: datetime.date, check_in_until: datetime.date | None = None, nights: int = 0) -> DateQuery:
+        start = check_in_from.toordinal()
+        end = (check_in_until or check_in_from).toordinal() + nights
+        accoms = frozenset(self._accommodations.overlap(start, end))
+        avails = tuple(self._availabilities.overlap(start, end))
+        prices = tuple(p for p in self._price_items.overlap(start, end) if not p.path or p.path[0] in accoms)
+        return DateQuery(accoms, avails, prices)
+
+    def price_item(self, ref: PriceItemRef) -> t.PriceItem:
+        if not ref.path:
+            return self._otds.accommodations_price_items[ref.key][ref.cls][ref.position]
+        sell = self._otds.accommodations[ref.path[0]]["selling"][ref.path[1]]
+        container = sell if len(ref.path) == 2 else sell["board"][ref.path[2]]
+        return container["price_items"][ref.key][ref.cls][ref.position]
+
+def open_days(availability: t.Availability) -> Iterator[datetime.date]:
+    start, end, (default, _extra), states = availability
+    by_offset = {offset: state for offset, state, _in, _out in states.values()}
+    default_open = default[0] is not e.DefaultDayState.Closed
+    for offset in range((end - start).days + 1):
+        state = by_offset.get(t.Offset(offset))
+        if (default_open if state is None else state[0] is not e.DayState.Closed):
+            yield start + datetime.timedelta(days=offset)
+
+def _combinable_when_codes(when: t.CombinableWhen) -> Iterator[tuple[t.Identifier, str]]:
+    if when[0] is e.CombinableWhen.Code:
+        yield (when[1], when[2])
+    elif when[0] is e.CombinableWhen.Or:
+        for w in when[1]:
+            yield from _combinable_when_codes(w)
+
+def combination_codes(price_items: Mapping[t.Key, Mapping[t.Token, tuple[t.PriceItem, ...]]]) -> Iterator[tuple[t.Identifier, str]]:
+    for classes in price_items.values():
+        for items in classes.values():
+            for item in items:
+                for combi in item.get("combinatorics", {}).values():
+                    if "code" in combi:
+                        yield combi["code"]
+                    if "when" in combi:
+                        yield from _combinable_when_codes(combi["when"])
+
+def _arrival_offset(flight: t.Oneway) -> int:
+    for groups in flight.get("properties", {}).values():
+        for group in groups:
+            routes = group.get("flight_routes")
+            if routes:
+                return routes[-1].get("arrival", {}).get("date_offset", 0)
+    return 0
+
+class FlightIndex:
+    def __init__(self, otds: "OTDS") -> None:
+        legs: dict[tuple[str, str], list[tuple[int, t.Key, t.Key]]] = {}
+        self._codes: dict[tuple[t.Key, t.Key], frozenset[tuple[t.Identifier, str]]] = {}
+        self._arrival_offsets: dict[t.Key, int] = {}
+        for key, flight in otds.flights.items():
+            pair = legs.setdefault((flight["departure"], flight["arrival"]), [])
+            self._arrival_offsets[key] = _arrival_offset(flight)
+            flight_codes = frozenset(combination_codes(flight.get("price_items", {})))
+            for class_key, booking_class in flight["booking_class"].items():
+                self._codes[(key, class_key)] = flight_codes.union(combination_codes(booking_class.get("price_items", {})))
+                days: set[int] = set()
+                for _cond, availability in booking_class.get("availabilities", {}).values():
+                    for avail in availability.values():
+                        days.update(d.toordinal() for d in open_days(avail))
+                pair.extend((d, key, class_key) for d in days)
+        self._legs: dict[tuple[str, str], tuple[array[int], tuple[tuple[t.Key, t.Key], ...]]] = {}
+        for route, entries in legs.items():
+            entries.sort()
+            self._legs[route] = (array("l", (d for d, _f, _c in entries)), tuple((f, c) for _d, f, c in entries))
+
+    def departures(self, origins: Iterable[str], destinations: Iterable[str], start: datetime.date, end: datetime.date | None = None) -> list[Departure]:
+        first = start.toordinal()
+        last = (end or start).toordinal()
+        found = []
+        for route in itertools.product(frozenset(origins), frozenset(destinations)):
+            if route not in self._legs:
+                continue
+            dates, flights = self._legs[route]
+            for i in range(bisect_left(dates, first), bisect_right(dates, last)):
+                date = datetime.date.fromordinal(dates[i])
+                flight, booking_class = flights[i]
+                arrival = date + datetime.timedelta(days=self._arrival_offsets[flight])
+                found.append(Departure(flight, booking_class, date, arrival))
+        found.sort(key=lambda d: (d.date, d.flight, d.booking_class))
+        return found
+
+    def to_accommodation(self, origins: Iterable[str], accommodation: t.Accommodation, start: datetime.date, end: datetime.date | None = None) -> list[Departure]:
+        return self.departures(origins, accommodation.get("airports", ()), start, end)
+
+    def from_accommodation(self, accommodation: t.Accommodation, destinations: Iterable[str], start: datetime.date, end: datetime.date | None = None) -> list[Departure]:
+        return self.departures(accommodation.get("airports", ()), destinations, start, end)
+
+    def combinable(self, outbound: Departure, inbound: Departure) -> bool:
+        out_codes = self._codes[(outbound.flight, outbound.booking_class)]
+        in_codes = self._codes[(inbound.flight, inbound.booking_class)]
+        return not out_codes or not in_codes or not out_codes.isdisjoint(in_codes)
+
+    def return_flights(self, origins: Iterable[str], destinations: Iterable[str], outbound: datetime.date, inbound: datetime.date) -> list[tuple[Departure, Departure]]:
+        origins = frozenset(origins)
+        destinations = frozenset(destinations)
+        inbounds = self.departures(destinations, origins, inbound)
+        return [(o, i) for o in self.departures(origins, destinations, outbound) for i in inbounds
+                if i.date >= o.arrival_date and self.combinable(o, i)]
+
+def _names_accommodation(source: str) -> bool:
+    # Scope prefixes and component paths aside, e.g. "global:Product.Accommodation".
+    return source.rsplit(":", 1)[-1].rsplit(".", 1)[-1] == "Accommodation"
+
+# Accommodation Keys a condition can only hold for, None when it does not restrict them.
+def condition_accommodations(cond: t.ConditionGroup) -> frozenset[t.Key] | None:
+    if cond[0] is e.Condition.Keys:
+        source, keys, _day_alloc = cond[1]
+        return frozenset(t.Key(k) for k in keys.split()) if _names_accommodation(source) else None
+    if cond[0] is e.Condition.And:
+        restricting = [k for k in (condition_accommodations(c) for c in cond[1]) if k is not None]
+        return frozenset.intersection(*restricting) if restricting else None
+    if cond[0] is e.Condition.Or:
+        union: set[t.Key] = set()
+        for c in cond[1]:
+            found = condition_accommodations(c)
+            if found is None:
+                return None
+            union.update(found)
+        return frozenset(union) if cond[1] else None
+    return None
+
+def addon_accommodations(addon: t.Addon) -> frozenset[t.Key] | None:
+    # All filters of an addon have to hold.
+    found = [k for k in (condition_accommodations(c) for c in addon.get("filter", {}).values()) if k is not None]
+    return frozenset.intersection(*found) if found else None
+
+# Addons that may apply to an accommodation, so package pricing attaches transfers and other
+# services without scanning every addon. Addons naming accommodations in their filters apply to
+# those, addons with catchment airports to accommodations sharing one, the others to all.
+# The conditions of the addons still have to be evaluated.
+class AddonIndex:
+    def __init__(self, otds: "OTDS") -> None:
+        by_accommodation: dict[t.Key, list[t.Key]] = {}
+        by_airport: dict[str, list[t.Key]] = {}
+        general: list[t.Key] = []
+        for key, addon in otds.addons.items():
+            accoms = addon_accommodations(addon)
+            if accoms is not None:
+                for accom_key in accoms:
+                    by_accommodation.setdefault(accom_key, []).append(key)
+            elif "airports" in addon:
+                for airport in addon["airports"]:
+                    by_airport.setdefault(airport, []).append(key)
+            else:
+                general.append(key)
+        self._by_accommodation = {k: tuple(v) for k, v in by_accommodation.items()}
+        self._by_airport = {k: tuple(v) for k, v in by_airport.items()}
+        self._general = tuple(general)
+
+    def for_airports(self, airports: Iterable[str]) -> tuple[t.Key, ...]:
+        return tuple(dict.fromkeys(key for airport in airports for key in self._by_airport.get(airport, ())))
+
+    def for_accommodation(self, key: t.Key, accommodation: t.Accommodation) -> tuple[t.Key, ...]:
+        return tuple(dict.fromkeys(itertools.chain(
+            self._by_accommodation.get(key, ()), self.for_airports(accommodation.get("airports", ())), self._general)))
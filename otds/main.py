@@ -1,32 +1,213 @@
+from __future__ import annotations
+
 import datetime
-import json
-import logging
-from collections.abc import MutableSequence
+import hashlib
+import mmap
+import weakref
+from collections import deque
+from collections.abc import Callable, Collection, Generator, Iterable, MutableSequence
+from contextlib import closing
+from itertools import islice
 from decimal import Decimal
 from pathlib import Path
 from types import MappingProxyType as MPT
-from typing import Literal, Mapping, overload
-
-from lxml import etree
+from typing import IO, TYPE_CHECKING, Literal, Mapping, NamedTuple, TypeVar, cast, overload
 
+from . import codes
+from . import convert as c
 from . import enums as e
 from . import typedefs as t
+from .source import DEFAULT_BUFFER_SIZE, Buffer, Source, accommodation_spans, is_compressed, is_utf8, iter_chunks, root_tags
+
+if TYPE_CHECKING:
+    from lxml import etree
+
+    from .memory import MemoryReport
+    from .parsecache import ParseCache
 
 ROOT_PATH = Path(__file__).parent
 NS = MPT({None: "http://otds-group.org/otds"})
 PREFIX = "{http://otds-group.org/otds}"
+SCHEMA_PATH = ROOT_PATH / "schema" / "otds.xsd"
+
+_T = TypeVar("_T")
+_K = TypeVar("_K")
+_V = TypeVar("_V")
+_D = TypeVar("_D", bound=Mapping[str, object])
+
+class ValidationError(ValueError):
+    pass
+
+def _thaw(obj: _T) -> _T:
+    # Copies the dicts of a parsed subtree so that a delta can change them. Everything else in
+    # the model (MappingProxyType, tuples, scalars) is immutable and stays shared.
+    if isinstance(obj, dict):
+        return cast(_T, {k: _thaw(v) for k, v in obj.items()})
+    return obj
+
+# The model maps the parser of each Otds child element writes to.
+_WRITTEN_MAPS = MPT({
+    f"{PREFIX}Brands": ("_brands",),
+    f"{PREFIX}DefinedComponents": ("_defined_components",),
+    f"{PREFIX}Flights": ("_flights",),
+    f"{PREFIX}Accommodations": ("_accommodations", "_accommodations_price_items", "_fingerprints"),
+    f"{PREFIX}Products": ("_products",),
+    f"{PREFIX}Addons": ("_addons", "_addons_price_items"),
+})
 
-def validate(xml_path: Path, xsd_path: Path) -> etree._ElementTree:
-    xml_doc = etree.parse(xml_path, etree.XMLParser(remove_comments=True))
+def _mutable(mapping: Mapping[_K, _V]) -> dict[_K, _V]:
+    # The model types its nested maps as read-only Mappings, while a component is parsed they
+    # are still dicts.
+    assert isinstance(mapping, dict)
+    return mapping
+
+def _frozen(details: _D) -> _D:
+    # A parsed component made read-only, it still reads as its TypedDict.
+    return cast(_D, MPT(details))
+
+class Changes(NamedTuple):
+    accommodations: frozenset[t.Key]
+    # Accommodations level price items or a whole new catalogue, every accommodation may be affected.
+    all_accommodations: bool
+    flights: bool
+    addons: bool
+
+def changes(otds: etree._Element) -> Changes:
+    keys: set[t.Key] = set()
+    everything = otds.get("UpdateMode", "New") == "New"
+    flights = addons = False
+    for section in otds.iterchildren():
+        if section.tag == f"{PREFIX}Accommodations":
+            for elem in section.iterchildren():
+                if elem.tag == f"{PREFIX}Accommodation":
+                    keys.add(t.Key(elem.get("Key", "")))
+                else:
+                    everything = True
+        elif section.tag == f"{PREFIX}Flights":
+            flights = True
+        elif section.tag == f"{PREFIX}Addons":
+            addons = True
+    return Changes(frozenset(keys), everything, flights or everything, addons or everything)
+
+class ReparseStats(NamedTuple):
+    reused: int
+    parsed: int
+    removed: int
+
+def fingerprint(elem: etree._Element) -> bytes:
+    # Canonical XML, so attribute order, quoting and namespace prefixes make no difference.
+    from lxml import etree
+
+    return hashlib.blake2b(etree.tostring(elem, method="c14n"), digest_size=16).digest()
+
+def validate(source: Source, xsd_path: Path, buffer_size: int = DEFAULT_BUFFER_SIZE,
+             include: "Projection | None" = None) -> etree._ElementTree:
+    # lxml is only loaded to parse, reading snapshots and querying the model do without it.
+    from lxml import etree
+
+    # Validation needs the whole document. Without it (python -O) the children a projection
+    # excludes are dropped while parsing, so they are never all held at once.
+    if include is not None and not __debug__:
+        return etree.ElementTree(parse_projected(source, include, buffer_size))
+
+    parser = etree.XMLParser(remove_comments=True)
+    if isinstance(source, (Path, str)) and not is_compressed(source):
+        xml_doc = etree.parse(source, parser)
+    elif isinstance(source, bytes) and not is_compressed(source):
+        xml_doc = etree.ElementTree(etree.fromstring(source, parser))
+    else:
+        with closing(iter_chunks(source, buffer_size)) as chunks:
+            for chunk in chunks:
+                parser.feed(chunk)
+        xml_doc = etree.ElementTree(parser.close())
 
     if __debug__:
         xmlschema_doc = etree.parse(xsd_path)
         xmlschema = etree.XMLSchema(xmlschema_doc)
         if not xmlschema.validate(xml_doc):
-            raise ValueError(xmlschema.error_log.last_error)  # type: ignore[attr-defined]
+            raise ValidationError(xmlschema.error_log.last_error)  # type: ignore[attr-defined]
 
+    if include is not None:
+        project(xml_doc.getroot(), include)
     return xml_doc
 
+def parse_fragment(buf: Buffer, span: tuple[int, int], root: tuple[bytes, bytes]) -> etree._Element:
+    # Parsed inside a copy of the root element (see source.root_tags) to keep its namespace declarations.
+    # Without an XML declaration in front the fragment has to be UTF-8.
+    from lxml import etree
+
+    parser = etree.XMLParser(remove_comments=True)
+    parser.feed(root[0])
+    with memoryview(buf) as view:
+        parser.feed(view[span[0]:span[1]].tobytes())
+    parser.feed(root[1])
+    return parser.close()[0]
+
+def _day_bitmap(dates: tuple[datetime.date, ...]) -> tuple[int, int]:
+    # Evaluated with bit operations, see t.DateCondition.
+    ordinals = [d.toordinal() for d in dates]
+    first = min(ordinals, default=0)
+    bits = 0
+    for ordinal in ordinals:
+        bits |= 1 << (ordinal - first)
+    return (first, bits)
+
+# Element name to the names of the children to keep, e.g. {"Accommodation": ["Availabilities", "Properties"]}.
+Projection = Mapping[str, Collection[str]]
+
+def project(root: etree._Element, include: Projection) -> None:
+    # Drops the children that are not included, so nothing is built from them.
+    for tag, names in include.items():
+        kept = frozenset(f"{PREFIX}{name}" for name in names)
+        for elem in list(root.iter(f"{PREFIX}{tag}")):
+            for child in [child for child in elem if child.tag not in kept]:
+                elem.remove(child)
+
+def parse_projected(source: Source, include: Projection, buffer_size: int = DEFAULT_BUFFER_SIZE) -> etree._Element:
+    # project() applied while parsing: each element of an included tag drops its other children
+    # as soon as it ends, before the rest of the document is read. Inner elements end first, so
+    # the result is the same.
+    from lxml import etree
+
+    kept = {f"{PREFIX}{tag}": frozenset(f"{PREFIX}{name}" for name in names) for tag, names in include.items()}
+    parser = etree.XMLPullParser(events=("end",), tag=tuple(kept), remove_comments=True)
+
+    def prune() -> None:
+        for _event, elem in parser.read_events():
+            assert isinstance(elem, etree._Element)
+            for child in [child for child in elem if child.tag not in kept[elem.tag]]:
+                elem.remove(child)
+
+    with closing(iter_chunks(source, buffer_size)) as chunks:
+        for chunk in chunks:
+            parser.feed(chunk)
+            prune()
+    root = parser.close()
+    prune()
+    return root
+
+def parse_fragments(buf: Buffer, spans: Iterable[tuple[int, int]], root: tuple[bytes, bytes], workers: int,
+                    include: Projection | None = None) -> Generator[etree._Element, None, None]:
+    # The elements of the spans in order, parsed ahead on worker threads. At most workers of them
+    # are parsed before they are consumed, so only that many trees are held at once.
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="otds-fragment") as executor:
+        pending = iter(spans)
+        futures = deque(executor.submit(parse_fragment, buf, span, root) for span in islice(pending, workers))
+        try:
+            while futures:
+                future = futures.popleft()
+                for span in islice(pending, 1):
+                    futures.append(executor.submit(parse_fragment, buf, span, root))
+                elem = future.result()
+                if include is not None:
+                    project(elem, include)
+                yield elem
+        finally:
+            for future in futures:
+                future.cancel()
+
 _COMPONENT_NAME_LOOKUP = MPT({
     e.ProductType.AccommodationOnly: "Accommodation",
     e.ProductType.OnewayFlightOnly: "OnewayFlight",
@@ -43,35 +224,145 @@ class OTDS:
         self._defined_components: dict[t.Key, t.DefineComponent] = {}
         self._flights: t.Flights = {}
         self._products: t.Products = {"product": {}}
-        self._accommodations_price_items: dict[t.Key, dict[t.Token, tuple[t.PriceItem, ...]]] = {}
+        self._accommodations_price_items: dict[t.Key, Mapping[t.Token, tuple[t.PriceItem, ...]]] = {}
+        self._addons: dict[t.Key, t.Addon] = {}
+        self._addons_price_items: dict[t.Key, Mapping[t.Token, tuple[t.PriceItem, ...]]] = {}
+        # Fingerprints of the Accommodation elements the accommodations were parsed from, see reparse().
+        self._fingerprints: dict[t.Key, bytes] = {}
 
     @property
     def accommodations(self) -> MPT[t.Key, t.Accommodation]:
         return MPT(self._accommodations)
 
-    def parse(self, path: Path) -> None:
-        xml = validate(path, ROOT_PATH / "schema" / "otds.xsd")
-        otds = xml.getroot()
-        update_mode = self.get_update_mode(otds)
-        if update_mode is e.UpdateMode.New:
-            if self._accommodations or self._products != {"product": {}}:
-                raise ValueError("Would overwrite all content")
-        if update_mode is e.UpdateMode.Delete:
-            raise NotImplementedError()
+    @property
+    def accommodations_price_items(self) -> MPT[t.Key, Mapping[t.Token, tuple[t.PriceItem, ...]]]:
+        return MPT(self._accommodations_price_items)
 
-        for elem in otds.iterchildren():
-            if elem.tag == f"{PREFIX}Brands":
-                self.parse_brands(elem)
-            elif elem.tag == f"{PREFIX}DefinedComponents":
-                self.parse_combi_components(elem)
-            elif elem.tag == f"{PREFIX}Flights":
-                self.parse_flights(elem)
-            elif elem.tag == f"{PREFIX}Accommodations":
-                self.parse_accomodations(elem)
-            elif elem.tag == f"{PREFIX}Products":
-                self.parse_products(elem)
+    @property
+    def addons(self) -> MPT[t.Key, t.Addon]:
+        return MPT(self._addons)
+
+    @property
+    def addons_price_items(self) -> MPT[t.Key, Mapping[t.Token, tuple[t.PriceItem, ...]]]:
+        return MPT(self._addons_price_items)
+
+    @property
+    def brands(self) -> MPT[t.Key, t.Brand]:
+        return MPT(self._brands)
+
+    @property
+    def defined_components(self) -> MPT[t.Key, t.DefineComponent]:
+        return MPT(self._defined_components)
+
+    @property
+    def flights(self) -> MPT[t.Key, t.Oneway]:
+        return MPT(self._flights.get("oneway", {}))
+
+    @property
+    def global_values(self) -> MPT[t.Key, t.GlobalValue]:
+        return MPT(self._products.get("globals", {}))
+
+    @property
+    def products(self) -> MPT[t.Key, tuple[e.ProductType, t.Product]]:
+        return MPT(self._products["product"])
+
+    def parse(self, source: Source, buffer_size: int = DEFAULT_BUFFER_SIZE, include: Projection | None = None,
+              cache_dir: "Path | str | ParseCache | None" = None) -> None:
+        # With a cache_dir, or a ParseCache for other than the default size limit and check, the file
+        # is loaded from its snapshot there if it was parsed before. Only whole models are cached:
+        # the file has to be parsed into an empty model.
+        if cache_dir is not None:
+            from .parsecache import ParseCache
+            if not isinstance(source, (Path, str)):
+                raise TypeError("A parse cache needs the path of the file")
+            if vars(self) != vars(OTDS()):
+                raise ValueError("A parse cache only applies to a file parsed into an empty model")
+            cache = cache_dir if isinstance(cache_dir, ParseCache) else ParseCache(Path(cache_dir))
+            cache.parse(self, Path(source), include)
+            return
+        self.parse_otds(validate(source, SCHEMA_PATH, buffer_size, include).getroot())
+
+    def reparse(self, source: Source, buffer_size: int = DEFAULT_BUFFER_SIZE, include: Projection | None = None) -> ReparseStats:
+        # A full delivery replacing the whole catalogue. Accommodations whose element is unchanged
+        # since the last reparse keep their parsed object, only the others are parsed again.
+        root = validate(source, SCHEMA_PATH, buffer_size, include).getroot()
+        if self.get_update_mode(root) is not e.UpdateMode.New:
+            raise ValueError("Not a full delivery")
+        reused: dict[t.Key, t.Accommodation] = {}
+        fingerprints: dict[t.Key, bytes] = {}
+        order: list[t.Key] = []
+        for accommodations in root.iterchildren(f"{PREFIX}Accommodations"):
+            for elem in list(accommodations.iterchildren(f"{PREFIX}Accommodation")):
+                key = t.Key(c.text(elem.get("Key", "")))
+                found = fingerprint(elem)
+                fingerprints[key] = found
+                order.append(key)
+                if self._fingerprints.get(key) == found and key in self._accommodations:
+                    reused[key] = self._accommodations[key]
+                    accommodations.remove(elem)
+
+        fresh = OTDS()
+        fresh.parse_otds(root)
+        parsed = frozenset(fresh._accommodations)
+        fresh._accommodations = {key: reused[key] if key in reused else fresh._accommodations[key] for key in order}
+        fresh._fingerprints = fingerprints
+        removed = frozenset(self._accommodations).difference(order)
+        self._publish(fresh, Changes(parsed | removed, fresh._accommodations_price_items != self._accommodations_price_items, True, True))
+        return ReparseStats(len(reused), len(parsed), len(removed))
+
+    def replace(self, other: "OTDS") -> None:
+        # Publishes the current version of other, e.g. a loaded snapshot, as the next version of
+        # this model. Listeners are told that everything changed.
+        self._publish(other.pin(), Changes(frozenset(), True, True, True))
+
+    def _publish(self, work: "OTDS", found: Changes) -> None:
+        # Replaces the published version with the one of work as a whole.
+        self.__dict__ = work.__dict__
+        callbacks = _listeners.get(self)
+        if callbacks:
+            for callback in tuple(callbacks):
+                callback(found)
+
+    def pin(self) -> "OTDS":
+        # The current version, unaffected by later parses: they build the next version next to it,
+        # copying only what they change, and publish it by replacing the instance dict at once.
+        pinned = OTDS.__new__(OTDS)
+        pinned.__dict__ = self.__dict__
+        return pinned
+
+    def _next_version(self, tags: Iterable[str]) -> "OTDS":
+        # Only the maps written by the parsers of the given Otds children are copied, the others
+        # stay shared with the published version. Accommodations, flights and addons are copied
+        # by parse_accomodation, parse_oneway and parse_addon when a delta touches them.
+        work = OTDS.__new__(OTDS)
+        work.__dict__ = dict(self.__dict__)
+        for name in {name for tag in tags for name in _WRITTEN_MAPS.get(tag, ())}:
+            if name == "_flights":
+                work._flights = {"oneway": dict(self._flights["oneway"])} if "oneway" in self._flights else {}
+            elif name == "_products":
+                # Products and the global values are replaced as a whole, never changed in place.
+                work._products = {**self._products, "product": dict(self._products["product"])}
             else:
-                raise NotImplementedError(elem.tag)
+                setattr(work, name, dict(getattr(self, name)))
+        return work
+
+    def on_change(self, callback: Callable[[Changes], None]) -> Callable[[], None]:
+        # Called after every parse with what it changed, once the new version is published.
+        # Returns a function that removes the callback again.
+        callbacks = _listeners.setdefault(self, [])
+        callbacks.append(callback)
+        return lambda: callbacks.remove(callback)
+
+    def write(self, target: Path | str | IO[bytes], filter: Callable[[t.Key, t.Accommodation], bool] | None = None,
+              flight_filter: Callable[[t.Key, t.Oneway], bool] | None = None, addon_filter: Callable[[t.Key, t.Addon], bool] | None = None,
+              update_mode: e.UpdateMode = e.UpdateMode.New) -> None:
+        from .writer import write
+        write(self, target, filter, flight_filter, addon_filter, update_mode)
+
+    def memory_report(self, top: int = 10) -> "MemoryReport":
+        # Where the memory of the model goes, per typedef, per Python type and for the largest components.
+        from .memory import memory_report
+        return memory_report(self, top)
 
     def parse_accomodation(self, accommodation: etree._Element) -> None:
         update_mode = self.get_update_mode(accommodation)
@@ -80,8 +371,11 @@ class OTDS:
                 raise ValueError("Would overwrite accommodation")
         elif update_mode is e.UpdateMode.Delete:
             raise NotImplementedError()
-        key = t.Key(accommodation.attrib["Key"])
-        accom = self._accommodations.setdefault(key, {"selling": {}})
+        key = t.Key(c.text(accommodation.attrib["Key"]))
+        # Copy on write, the published version may be read while the delta is applied.
+        accom = _thaw(self._accommodations[key]) if key in self._accommodations else {"selling": {}}
+        self._accommodations[key] = accom
+        self._fingerprints.pop(key, None)
         properties: dict[t.Key, tuple[t.Property, ...]] = {}
         for elem in accommodation.iterchildren():
             if elem.tag == f"{PREFIX}Tags":
@@ -94,7 +388,7 @@ class OTDS:
                 if elem.get("UpdateMode", "New") != "New":
                     raise NotImplementedError()
                 assert elem.text
-                accom["airports"] = tuple(t.SimpleNodeIataAirportCode(c) for c in elem.text.split())
+                accom["airports"] = tuple(t.SimpleNodeIataAirportCode(c.text(code)) for code in elem.text.split())
             elif elem.tag == f"{PREFIX}Availabilities":
                 self.parse_availabilities(elem, accom.setdefault("availabilities", {}))
             else:
@@ -150,6 +444,62 @@ class OTDS:
             else:
                 raise NotImplementedError(elem.tag)
 
+    def parse_addon(self, addon: etree._Element) -> None:
+        update_mode = self.get_update_mode(addon)
+        if update_mode is e.UpdateMode.New:
+            if addon.attrib["Key"] in self._addons:
+                raise ValueError("Would overwrite addon")
+        elif update_mode is e.UpdateMode.Delete:
+            raise NotImplementedError()
+        key = t.Key(c.text(addon.attrib["Key"]))
+        # Copy on write, as for accommodations.
+        details = _thaw(self._addons[key]) if key in self._addons else {"service": {}}
+        self._addons[key] = details
+        for elem in addon.iterchildren():
+            if elem.tag == f"{PREFIX}Tags":
+                self.parse_tags(elem, _mutable(details.setdefault("tags", {})))
+            elif elem.tag == f"{PREFIX}Booking":
+                details["booking"] = self.parse_booking(elem)
+            elif elem.tag == f"{PREFIX}CheckOutDateOffset":
+                if self.get_update_mode(elem) is not e.UpdateMode.New:
+                    raise NotImplementedError()
+                assert elem.text
+                details["check_out_date_offset"] = t.CheckOutDateOffset(int(elem.text))
+            elif elem.tag == f"{PREFIX}Properties":
+                self.parse_properties(elem, _mutable(details.setdefault("properties", {})))
+            elif elem.tag == f"{PREFIX}ServiceFeature":
+                self.parse_service_feature(elem, _mutable(details.setdefault("feature", {})))
+            elif elem.tag == f"{PREFIX}Service":
+                self.parse_service(elem, _mutable(details["service"]))
+            elif elem.tag == f"{PREFIX}Filter":
+                self.parse_filter_simple_node(elem, _mutable(details.setdefault("filter", {})))
+            elif elem.tag == f"{PREFIX}PriceItems":
+                self.parse_price_items(elem, _mutable(details.setdefault("price_items", {})))
+            elif elem.tag == f"{PREFIX}CatchmentAirports":
+                if elem.get("UpdateMode", "New") != "New":
+                    raise NotImplementedError()
+                assert elem.text
+                details["airports"] = tuple(t.SimpleNodeIataAirportCode(c.text(code)) for code in elem.text.split())
+            elif elem.tag == f"{PREFIX}NeighbourComponentCorrection":
+                self.parse_neighbour_component_correction(elem, _mutable(details.setdefault("neighbour_component_correction", {})))
+            else:
+                raise NotImplementedError(elem.tag)
+
+    def parse_addons(self, addons: etree._Element) -> None:
+        update_mode = self.get_update_mode(addons)
+        if update_mode is e.UpdateMode.New:
+            if self._addons:
+                raise ValueError("Would overwrite all addons")
+        elif update_mode is e.UpdateMode.Delete:
+            raise NotImplementedError()
+        for elem in addons.iterchildren():
+            if elem.tag == f"{PREFIX}Addon":
+                self.parse_addon(elem)
+            elif elem.tag == f"{PREFIX}PriceItems":
+                self.parse_price_items(elem, self._addons_price_items)
+            else:
+                raise NotImplementedError(elem.tag)
+
     def parse_age_condition(self, person_age: etree._Element) -> tuple[t.SourceAttribute, t.AgeCondition]:
         if person_age.get("DayAllocation") is not None:
             raise NotImplementedError()
@@ -171,7 +521,7 @@ class OTDS:
 
     def parse_airport_condition(self, airports: etree._Element) -> tuple[t.SourceAttribute, e.AirportType, tuple[str, ...]]:
         src = t.SourceAttribute(airports.attrib["Source"])
-        a_type = e.AirportType(airports.attrib["AirportType"])
+        a_type = c.enum(e.AirportType, airports.attrib["AirportType"])
         assert airports.text
         return (src, a_type, tuple(airports.text.split()))
 
@@ -191,7 +541,7 @@ class OTDS:
                 cond = conds[0]
             else:
                 assert False
-        key = t.Key(availabilities.attrib["Key"])
+        key = t.Key(c.text(availabilities.attrib["Key"]))
         avail_dict[key] = (cond, MPT(avail))
 
     def parse_availability(self, availability: etree._Element, avail_dict: dict[t.Key, t.Availability]) -> None:
@@ -199,8 +549,8 @@ class OTDS:
         if update_mode is not e.UpdateMode.New:
             raise NotImplementedError()
 
-        start = datetime.date.fromisoformat(availability.attrib["StartDate"])
-        end = datetime.date.fromisoformat(availability.attrib["EndDate"])
+        start = c.date(availability.attrib["StartDate"])
+        end = c.date(availability.attrib["EndDate"])
 
         state: dict[t.Key, tuple[t.Offset, t.DayState]] = {}
         default = None
@@ -213,14 +563,14 @@ class OTDS:
                 assert False
 
         assert default is not None
-        key = t.Key(availability.attrib["Key"])
+        key = t.Key(c.text(availability.attrib["Key"]))
         avail_dict[key] = (start, end, default, MPT(state))
 
     def parse_baggage_allowance(self, baggage_allowances: etree._Element) -> MPT[e.BaggageType, t.Baggage]:
         allowance: t.Baggage = {}
         for bag_elem in baggage_allowances.iterchildren():
             assert bag_elem.tag == f"{PREFIX}BaggageAllowance"
-            baggage_type = e.BaggageType(bag_elem.get("BaggageType", "Checked"))
+            baggage_type = c.enum(e.BaggageType, bag_elem.get("BaggageType", "Checked"))
             assert baggage_type not in allowance
             allowance[baggage_type] = {}
             for elem in bag_elem.iterchildren():
@@ -251,7 +601,7 @@ class OTDS:
                 self.parse_price_items(elem, b.setdefault("price_items", {}))
             else:
                 raise NotImplementedError(elem.tag)
-        key = t.Key(board.attrib["Key"])
+        key = t.Key(c.text(board.attrib["Key"]))
         board_dict[key] = MPT(b)
 
     def parse_booking(self, booking: etree._Element) -> tuple[t.BookingGroup, ...]:
@@ -289,7 +639,7 @@ class OTDS:
                 self.parse_properties(elem, booking.setdefault("properties", {}))
             else:
                 raise NotImplementedError(elem.tag)
-        key = t.Key(booking_class.attrib["Key"])
+        key = t.Key(c.text(booking_class.attrib["Key"]))
         booking_dict[key] = MPT(booking)
 
     def parse_booking_date_condition(self, booking_date: etree._Element) -> tuple[t.SourceAttribute, t.BookingDateCondition]:
@@ -298,10 +648,10 @@ class OTDS:
         for elem in booking_date.iterchildren():
             if elem.tag == f"{PREFIX}Min":
                 assert elem.text
-                conds["min"] = datetime.date.fromisoformat(elem.text)
+                conds["min"] = c.date(elem.text)
             elif elem.tag == f"{PREFIX}Max":
                 assert elem.text
-                conds["max"] = datetime.date.fromisoformat(elem.text)
+                conds["max"] = c.date(elem.text)
             else:
                 raise NotImplementedError(elem.tag)
         return (source, conds)
@@ -310,8 +660,8 @@ class OTDS:
         if booking_group.get("Class") is not None:
             raise NotImplementedError()
         _base = booking_group.get("EvaluationBase")
-        eval_base = None if _base is None else e.EvaluationBase(_base)
-        area = e.BookingGroupArea(booking_group.attrib["Area"])
+        eval_base = None if _base is None else c.enum(e.EvaluationBase, _base)
+        area = c.enum(e.BookingGroupArea, booking_group.attrib["Area"])
         source = t.SourceAttribute(booking_group.get("Source", "ThisComponent"))
         priority = int(booking_group.get("Priority", 0))
         conds: list[t.BookingGroupCondition] = []
@@ -357,13 +707,13 @@ class OTDS:
                 assert elem.text
                 params.append((e.BookingParameter.Value, elem.text.ljust(pad_length)))
             elif elem.tag == f"{PREFIX}Date":
-                day_type = e.DayType(elem.attrib["DayType"])
+                day_type = c.enum(e.DayType, elem.attrib["DayType"])
                 source = t.SourceAttribute(elem.get("Source", "ThisComponent"))
-                date_format = e.DateFormat(elem.get("DateFormat", "[D01][M01][Y01]"))
+                date_format = c.enum(e.DateFormat, elem.get("DateFormat", "[D01][M01][Y01]"))
                 params.append((e.BookingParameter.Date, day_type, source, date_format))
             elif elem.tag == f"{PREFIX}PersonAge":
-                age_type = e.AgeType(elem.get("AgeType", "TravelAge"))
-                date_format = e.DateFormat(elem.get("DateFormat", "[D01][M01][Y01]"))
+                age_type = c.enum(e.AgeType, elem.get("AgeType", "TravelAge"))
+                date_format = c.enum(e.DateFormat, elem.get("DateFormat", "[D01][M01][Y01]"))
                 params.append((e.BookingParameter.PersonAge, age_type, date_format))
             elif elem.tag == f"{PREFIX}Tag":
                 if elem.get("DayAllocation") is not None:
@@ -377,11 +727,11 @@ class OTDS:
                 if elem.get("TagValueType") is not None:
                     raise NotImplementedError()
                 src = t.SourceAttribute(elem.attrib["Source"])
-                params.append((e.BookingParameter.Tag, src, t.Token(elem.attrib["Class"])))
+                params.append((e.BookingParameter.Tag, src, t.Token(c.text(elem.attrib["Class"]))))
             else:
                 raise NotImplementedError(elem.tag)
         return MPT({
-            "field": e.Field(booking_parameter.attrib["Field"]),
+            "field": c.enum(e.Field, booking_parameter.attrib["Field"]),
             "index": int(booking_parameter.get("Index", 0)),
             "name": t.Name(booking_parameter.get("Name", "Default")),
             "params": tuple(params),
@@ -401,7 +751,7 @@ class OTDS:
                 self.parse_tags(elem, details.setdefault("tags", {}))
             else:
                 raise NotImplementedError(elem.tag)
-        key = t.Key(brand.attrib["Key"])
+        key = t.Key(c.text(brand.attrib["Key"]))
         self._brands[key] = details
 
     def parse_brands(self, brands: etree._Element) -> None:
@@ -418,6 +768,9 @@ class OTDS:
             else:
                 assert False
 
+    def parse_bytes(self, buf: Buffer, buffer_size: int = DEFAULT_BUFFER_SIZE, include: Projection | None = None) -> None:
+        self.parse_otds(validate(buf, SCHEMA_PATH, buffer_size, include).getroot())
+
     def parse_combi_components(self, defined_components: etree._Element) -> None:
         update_mode = self.get_update_mode(defined_components)
         if update_mode is not e.UpdateMode.New:
@@ -582,7 +935,7 @@ class OTDS:
             raise NotImplementedError()
         src = t.SourceAttribute(tags.attrib["Source"])
         assert tags.text
-        return (src, t.Token(tags.attrib["Class"]), tuple(tags.text.split()))
+        return (src, t.Token(c.text(tags.attrib["Class"])), tuple(tags.text.split()))
 
     def parse_content_info(self, info: etree._Element, info_dict: t.AccommodationInfo) -> None:
         for elem in info.iterchildren():
@@ -596,18 +949,19 @@ class OTDS:
 
     def parse_date_condition(self, date: etree._Element) -> tuple[e.DayType, t.SourceAttribute, t.DateCondition]:
         source = t.SourceAttribute(date.attrib["Source"])
-        dt = e.DayType(date.get("DayType", "Stay"))
+        dt = c.enum(e.DayType, date.get("DayType", "Stay"))
         conds: t.DateCondition = {}
         for elem in date.iterchildren():
             if elem.tag == f"{PREFIX}Min":
                 assert elem.text
-                conds["min"] = datetime.date.fromisoformat(elem.text)
+                conds["min"] = c.date(elem.text)
             elif elem.tag == f"{PREFIX}Max":
                 assert elem.text
-                conds["max"] = datetime.date.fromisoformat(elem.text)
+                conds["max"] = c.date(elem.text)
             elif elem.tag == f"{PREFIX}Dates":
                 assert elem.text
-                conds["dates"] = tuple(datetime.date.fromisoformat(d) for d in elem.text.split())
+                conds["dates"] = tuple(c.date(d) for d in elem.text.split())
+                conds["days"] = _day_bitmap(conds["dates"])
             else:
                 assert False
         return (dt, source, MPT(conds))
@@ -633,9 +987,9 @@ class OTDS:
             raise NotImplementedError()
 
         source = t.SourceAttribute(day_alloc.get("Source", "Product"))
-        day_ref = e.DayReference(day_alloc.get("DayReference", day_ref_default))
+        day_ref = c.enum(e.DayReference, day_alloc.get("DayReference", day_ref_default))
         level = t.DayAllocationLevel(int(day_alloc.get("DayAllocationLevel", 0)))
-        shift = e.Shift(day_alloc.get("Shift", "None"))
+        shift = c.enum(e.Shift, day_alloc.get("Shift", "None"))
         return (level, source, day_ref, shift)
 
     def parse_day_allocation_end(self, day_alloc: etree._Element) -> t.DayAllocationStartEnd:
@@ -696,19 +1050,19 @@ class OTDS:
             elif elem.tag == f"{PREFIX}Request":
                 state = (e.DayState.Request, t.AvailabilityRequest(int(elem.text)) if elem.text else None)
             elif elem.tag == f"{PREFIX}CheckIn":
-                checkin = e.AvailabilityState(elem.get("State", "Open"))
+                checkin = c.enum(e.AvailabilityState, elem.get("State", "Open"))
             elif elem.tag == f"{PREFIX}NoCheckIn":
                 checkin = False
             elif elem.tag == f"{PREFIX}CheckOut":
                 if elem.text:
                     raise NotImplementedError()
-                checkout = e.AvailabilityState(elem.get("State", "Open"))
+                checkout = c.enum(e.AvailabilityState, elem.get("State", "Open"))
             elif elem.tag == f"{PREFIX}NoCheckOut":
                 checkout = False
             else:
                 raise NotImplementedError(elem.tag)
         assert state is not None
-        key = t.Key(day_state.attrib["Key"])
+        key = t.Key(c.text(day_state.attrib["Key"]))
         offset = t.Offset(int(day_state.attrib["Offset"]))
         state_dict[key] = (offset, state, checkin, checkout)
 
@@ -743,7 +1097,7 @@ class OTDS:
 
         if define_component.get("DayAllocationIndex") is not None:
             raise NotImplementedError()
-        role = e.Role(define_component.attrib["Role"])
+        role = c.enum(e.Role, define_component.attrib["Role"])
         product_type = _NAME_COMPONENT_LOOKUP[define_component.attrib["Role"]]
 
         comp: t._DefineComponent = {"components": ()}
@@ -756,14 +1110,14 @@ class OTDS:
                 self.parse_filter_simple_node(elem, comp.setdefault("filter", {}))
             else:
                 assert False
-        key = t.Key(define_component.attrib["Key"])
+        key = t.Key(c.text(define_component.attrib["Key"]))
         if "filter" in comp:
             comp["filter"] = MPT(comp["filter"])
         components_dict[key] = (role, comp)
 
     def parse_duration_condition(self, duration: etree._Element) -> tuple[t.SourceAttribute, t.DurationCondition]:
         source = t.SourceAttribute(duration.attrib["Source"])
-        du = e.DurationUnit(duration.get("DurationUnit", "Nights"))
+        du = c.enum(e.DurationUnit, duration.get("DurationUnit", "Nights"))
 
         def delta(elem: etree._Element) -> datetime.timedelta:
             assert elem.text
@@ -816,14 +1170,14 @@ class OTDS:
             raise NotImplementedError()
 
         src = t.SourceAttribute(tag.attrib["Source"])
-        return (src, t.Token(tag.attrib["Class"]))
+        return (src, t.Token(c.text(tag.attrib["Class"])))
 
     def parse_filter_simple_node(self, filt: etree._Element, filter_dict: dict[t.Key, t.ConditionGroup]) -> None:
         update_mode = self.get_update_mode(filt)
         assert update_mode is not e.UpdateMode.Merge
         if update_mode is not e.UpdateMode.New:
             raise NotImplementedError()
-        key = t.Key(filt.get("Key", "default"))
+        key = t.Key(c.text(filt.get("Key", "default")))
         conds = self.parse_condition_group(filt)
         assert len(conds) == 1
         filter_dict[key] = conds[0]  # TODO(OTDS2+): Key must exist
@@ -850,7 +1204,7 @@ class OTDS:
                 raise NotImplementedError()
             if elem.get("ShortServiceAnnotation") is not None:
                 raise NotImplementedError()
-            services.append(e.GeneralIncludedService(elem.text))
+            services.append(c.enum(e.GeneralIncludedService, elem.text))
         return tuple(services)
 
     def parse_geoinfo(self, geo: etree._Element, geo_dict: t.Geo) -> None:
@@ -882,7 +1236,7 @@ class OTDS:
             else:
                 raise NotImplementedError(elem.tag)
         assert value["params"]
-        key = t.Key(global_value.attrib["Key"])
+        key = t.Key(c.text(global_value.attrib["Key"]))
         globals_dict[key] = value
 
     def parse_global_values(self, global_values: etree._Element, products_dict: t.Products) -> None:
@@ -923,7 +1277,7 @@ class OTDS:
     def parse_key_condition(self, keys: etree._Element) -> tuple[t.SourceAttribute, str, e.DayAllocation | None]:
         src = t.SourceAttribute(keys.attrib["Source"])
         _day_alloc = keys.get("DayAllocation")
-        day_alloc = None if _day_alloc is None else e.DayAllocation(_day_alloc)
+        day_alloc = None if _day_alloc is None else c.enum(e.DayAllocation, _day_alloc)
         if keys.get("EvaluationMode", "Any") != "Any":
             raise NotImplementedError()
         assert keys.text
@@ -950,7 +1304,34 @@ class OTDS:
             raise NotImplementedError()
 
         src = t.SourceAttribute(element.attrib["Source"])
-        return (e.MatchElement(element.text), src)
+        return (c.enum(e.MatchElement, element.text), src)
+
+    def parse_mmap(self, path: Path | str, buffer_size: int = DEFAULT_BUFFER_SIZE, include: Projection | None = None,
+                   workers: int | None = None, validate: bool = True) -> None:
+        # With workers, the Accommodation elements are found by scanning the mapped bytes and parsed
+        # one by one on that many threads while the model is built from them: the document is never
+        # one tree, which about halves the peak memory. Such a parse checks that the XML is
+        # well-formed but skips schema validation, so it has to be asked for with validate=False.
+        # Compressed and non UTF-8 files are parsed whole and validated.
+        if workers is not None and validate:
+            raise ValueError("Parsing with workers skips schema validation, pass validate=False")
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            split = workers is not None and not is_compressed(buf[:8]) and is_utf8(buf)
+            spans = list(accommodation_spans(buf)) if split else []
+            if not spans:
+                self.parse_bytes(buf, buffer_size, include)
+                return
+            assert workers is not None
+            from lxml import etree
+
+            # The rest of the document is parsed as a whole, without the Accommodation elements.
+            starts, ends = zip(*spans)
+            skeleton = b"".join(buf[start:end] for start, end in zip((0, *ends), (*starts, len(buf))))
+            root = etree.fromstring(skeleton, etree.XMLParser(remove_comments=True))
+            if include is not None:
+                project(root, include)
+            with closing(parse_fragments(buf, spans, root_tags(buf), workers, include)) as fragments:
+                self.parse_otds(root, fragments)
 
     def parse_neighbour_component_correction(self, neighbour: etree._Element, corrections: dict[t.Key, t.NeighbourComponentCorrection]) -> None:
         update_mode = self.get_update_mode(neighbour)
@@ -961,16 +1342,16 @@ class OTDS:
         correction: t.NeighbourComponentCorrection = {}
         for elem in neighbour.iterchildren():
             if elem.tag == f"{PREFIX}CheckInDateOffset":
-                comp = e.ComponentAttribute(elem.attrib["Component"]) if "Component" in elem.attrib else None
+                comp = c.enum(e.ComponentAttribute, elem.attrib["Component"]) if "Component" in elem.attrib else None
                 correction["check_in_offset"] = (t.CheckInOutOffset(int(elem.text)), comp)
             elif elem.tag == f"{PREFIX}CheckOutDateOffset":
-                comp = e.ComponentAttribute(elem.attrib["Component"]) if "Component" in elem.attrib else None
+                comp = c.enum(e.ComponentAttribute, elem.attrib["Component"]) if "Component" in elem.attrib else None
                 correction["check_out_offset"] = (t.CheckInOutOffset(int(elem.text)), comp)
             else:
                 raise NotImplementedError(elem.tag)
 
-        key = t.Key(neighbour.get("Key", "Default"))
-        correction[key] = MPT(correction)
+        key = t.Key(c.text(neighbour.get("Key", "Default")))
+        corrections[key] = _frozen(correction)
 
     def parse_occupancy(self, occupancy: etree._Element, occupancies: dict[t.Key, tuple[t.Occupancy, ...]]) -> None:
         update_mode = self.get_update_mode(occupancy)
@@ -986,7 +1367,7 @@ class OTDS:
                 occ.append((e.Occupancy.Exclude, self.parse_occupancy_exclude(elem)))
             else:
                 assert False
-        key = t.Key(occupancy.attrib["Key"])
+        key = t.Key(c.text(occupancy.attrib["Key"]))
         occupancies[key] = tuple(occ)
 
     def parse_occupancy_condition(self, person_group: etree._Element) -> tuple[t.SourceAttribute, tuple[t.OccupancyConditionPerson, ...]]:
@@ -1058,8 +1439,9 @@ class OTDS:
         elif update_mode is e.UpdateMode.Delete:
             raise NotImplementedError()
 
-        key = t.Key(one_way_flight.attrib["Key"])
-        flight = flights_dict.setdefault(key, {"booking_class": {}})
+        key = t.Key(c.text(one_way_flight.attrib["Key"]))
+        flight = _thaw(flights_dict[key]) if key in flights_dict else {"booking_class": {}}
+        flights_dict[key] = flight
         for elem in one_way_flight.iterchildren():
             if elem.tag == f"{PREFIX}Tags":
                 self.parse_tags(elem, flight.setdefault("tags", {}))
@@ -1067,12 +1449,12 @@ class OTDS:
                 if self.get_update_mode(elem) is not e.UpdateMode.New:
                     raise NotImplementedError()
                 assert elem.text
-                flight["arrival"] = t.SimpleNodeIataAirportCode(elem.text)
+                flight["arrival"] = t.SimpleNodeIataAirportCode(c.text(elem.text))
             elif elem.tag == f"{PREFIX}DepartureAirport":
                 if self.get_update_mode(elem) is not e.UpdateMode.New:
                     raise NotImplementedError()
                 assert elem.text
-                flight["departure"] = t.SimpleNodeIataAirportCode(elem.text)
+                flight["departure"] = t.SimpleNodeIataAirportCode(c.text(elem.text))
             elif elem.tag == f"{PREFIX}CheckOutDateOffset":
                 if self.get_update_mode(elem) is not e.UpdateMode.New:
                     raise NotImplementedError()
@@ -1124,9 +1506,45 @@ class OTDS:
             if elem.get("lang", "de") != "de":
                 raise NotImplementedError()
             teaser_text = t.ShortServiceAnnotation(elem.get("ShortTeaserText", ""))
-            addons.append((e.OptionalBookableAddonType(elem.text), teaser_text))
+            addons.append((c.enum(e.OptionalBookableAddonType, elem.text), teaser_text))
         return tuple(addons)
 
+    def parse_otds(self, otds: etree._Element, accommodations: Iterable[etree._Element] = ()) -> None:
+        # accommodations are Accommodation elements parsed apart from the document (see parse_mmap),
+        # they belong to its first Accommodations element.
+        update_mode = self.get_update_mode(otds)
+        if update_mode is e.UpdateMode.New:
+            if self._accommodations or self._addons or self._products != {"product": {}}:
+                raise ValueError("Would overwrite all content")
+        if update_mode is e.UpdateMode.Delete:
+            raise NotImplementedError()
+
+        work = self._next_version(elem.tag for elem in otds.iterchildren())
+        keys: set[t.Key] = set()
+        for elem in otds.iterchildren():
+            if elem.tag == f"{PREFIX}Brands":
+                work.parse_brands(elem)
+            elif elem.tag == f"{PREFIX}DefinedComponents":
+                work.parse_combi_components(elem)
+            elif elem.tag == f"{PREFIX}Flights":
+                work.parse_flights(elem)
+            elif elem.tag == f"{PREFIX}Accommodations":
+                work.parse_accomodations(elem)
+                for accommodation in accommodations:
+                    work.parse_accomodation(accommodation)
+                    keys.add(t.Key(accommodation.get("Key", "")))
+                accommodations = ()
+            elif elem.tag == f"{PREFIX}Products":
+                work.parse_products(elem)
+            elif elem.tag == f"{PREFIX}Addons":
+                work.parse_addons(elem)
+            else:
+                raise NotImplementedError(elem.tag)
+        # Readers see the old or the new version, never a half applied delta. A failing delta
+        # leaves the published version untouched.
+        found = changes(otds)
+        self._publish(work, found._replace(accommodations=found.accommodations | keys) if keys else found)
+
     def parse_parameter_set(self, parameter_set: etree._Element, params_dict: dict[t.Key, t.ParameterSet]) -> None:
         update_mode = self.get_update_mode(parameter_set)
         assert update_mode is not e.UpdateMode.Merge
@@ -1143,11 +1561,11 @@ class OTDS:
                 assert elem.text
                 brand = t.BrandCode(elem.text)
             elif elem.tag == f"{PREFIX}CrsSystem":
-                crs = e.CrsSystem(elem.text)
+                crs = c.enum(e.CrsSystem, elem.text)
             elif elem.tag == f"{PREFIX}DistributionChannel":
-                param = (e.ParameterSet.DistributionChannel, e.DistributionChannel(elem.text))
+                param = (e.ParameterSet.DistributionChannel, c.enum(e.DistributionChannel, elem.text))
             elif elem.tag == f"{PREFIX}SalesChannel":
-                param = (e.ParameterSet.SalesChannel, e.SalesChannel(elem.text))
+                param = (e.ParameterSet.SalesChannel, c.enum(e.SalesChannel, elem.text))
             elif elem.tag == f"{PREFIX}SalesMarket":
                 assert elem.text
                 param = (e.ParameterSet.SalesMarket, t.ISO3166Country(elem.text))
@@ -1157,7 +1575,7 @@ class OTDS:
             assert crs and agency and brand
             param = (e.ParameterSet.DistributorIdentificationGroup, crs, agency, brand)
         assert param is not None
-        key = t.Key(parameter_set.attrib["Key"])
+        key = t.Key(c.text(parameter_set.attrib["Key"]))
         params_dict[key] = param
 
     def parse_person_count_condition(self, person_count: etree._Element) -> tuple[t.SourceAttribute, t.PersonCount]:
@@ -1197,7 +1615,7 @@ class OTDS:
         src = t.SourceAttribute(person_genders.attrib["Source"])
 
         assert person_genders.text
-        values = tuple(e.PersonGender(v) for v in person_genders.text.split())
+        values = tuple(c.enum(e.PersonGender, v) for v in person_genders.text.split())
         return (src, values)
 
     def parse_person_impact(self, person_impact: etree._Element) -> t.PersonImpact:
@@ -1257,7 +1675,7 @@ class OTDS:
         for elem in absolute.iterchildren():
             if elem.tag == f"{PREFIX}Value":
                 assert elem.text
-                value = Decimal(elem.text)
+                value = c.decimal(elem.text)
             elif elem.tag == f"{PREFIX}DayBase":
                 conds.append((e.Absolute.DayBase, self.parse_price_impact_base_value(elem)))
             elif elem.tag == f"{PREFIX}PersonBase":
@@ -1286,7 +1704,7 @@ class OTDS:
         for elem in percent.iterchildren():
             if elem.tag == f"{PREFIX}Value":
                 assert elem.text
-                value = Decimal(elem.text)
+                value = c.decimal(elem.text)
             elif elem.tag == f"{PREFIX}ApplyTo":
                 if elem.get("Component") is not None:
                     raise NotImplementedError()
@@ -1325,9 +1743,9 @@ class OTDS:
                 p["condition"] = conds[0]
             else:
                 raise NotImplementedError(elem.tag)
-        price_dict.setdefault(t.Token(price_item.attrib["Class"]), []).append(p)
+        price_dict.setdefault(t.Token(c.text(price_item.attrib["Class"])), []).append(p)
 
-    def parse_price_items(self, price_items: etree._Element, prices_dict: dict[t.Key, dict[t.Token, tuple[t.PriceItem, ...]]]) -> None:
+    def parse_price_items(self, price_items: etree._Element, prices_dict: dict[t.Key, Mapping[t.Token, tuple[t.PriceItem, ...]]]) -> None:
         update_mode = self.get_update_mode(price_items)
         assert update_mode is not e.UpdateMode.Merge
         if update_mode is not e.UpdateMode.New:
@@ -1339,7 +1757,7 @@ class OTDS:
                 self.parse_price_item(elem, p)
             else:
                 raise NotImplementedError(elem.tag)
-        key = t.Key(price_items.attrib["Key"])
+        key = t.Key(c.text(price_items.attrib["Key"]))
         prices_dict[key] = {k: tuple(v) for k, v in p.items()}
 
     def parse_product(self, product: etree._Element, product_dict: dict[t.Key, tuple[e.ProductType, t.Product]]) -> None:
@@ -1347,7 +1765,7 @@ class OTDS:
         if update_mode is not e.UpdateMode.New:
             raise NotImplementedError()
 
-        product_type = e.ProductType(product.attrib["ProductType"])
+        product_type = c.enum(e.ProductType, product.attrib["ProductType"])
         p: t.Product = {"components": ()}
         for elem in product.iterchildren():
             if elem.tag == f"{PREFIX}Tags":
@@ -1361,7 +1779,7 @@ class OTDS:
             else:
                 raise NotImplementedError(elem.tag)
         assert "components" in p
-        key = t.Key(product.attrib["Key"])
+        key = t.Key(c.text(product.attrib["Key"]))
         product_dict[key] = (product_type, p)
 
     def parse_products(self, products: etree._Element) -> None:
@@ -1386,7 +1804,7 @@ class OTDS:
         for elem in properties.iterchildren():
             assert elem.tag == f"{PREFIX}PropertyGroup"
             p.append(self.parse_property_group(elem))
-        key = t.Key(properties.attrib["Key"])
+        key = t.Key(c.text(properties.attrib["Key"]))
         properties_dict[key] = tuple(p)
 
     def parse_property_group(self, property_group: etree._Element) -> t.Property:
@@ -1403,7 +1821,7 @@ class OTDS:
                 assert elem.text
                 city.append(t.LanguageText(elem.text))
             elif elem.tag == f"{PREFIX}AccommodationType":
-                property["type"] = e.AccommodationType(elem.text)
+                property["type"] = c.enum(e.AccommodationType, elem.text)
             elif elem.tag == f"{PREFIX}AccommodationName":
                 if elem.get("lang", "de") != "de":
                     raise NotImplementedError()
@@ -1428,7 +1846,7 @@ class OTDS:
             elif elem.tag == f"{PREFIX}AccommodationAddress":
                 self.parse_address(elem, property.setdefault("address", {}))
             elif elem.tag == f"{PREFIX}AccomodationTargetgroups":
-                property["target_groups"] = tuple(e.AccommodationTargetgroup(t) for t in elem.text.split())
+                property["target_groups"] = tuple(c.enum(e.AccommodationTargetgroup, t) for t in elem.text.split())
             elif elem.tag == f"{PREFIX}BoardName":
                 if elem.get("lang", "de") != "de":
                     raise NotImplementedError()
@@ -1437,14 +1855,14 @@ class OTDS:
                 assert elem.text
                 property["board_name"] = t.LanguageText(elem.text)
             elif elem.tag == f"{PREFIX}BoardType":
-                property["board_type"] = e.BoardType(elem.text)
+                property["board_type"] = c.enum(e.BoardType, elem.text)
             elif elem.tag == f"{PREFIX}FlightBookingClassBaggageAllowances":
                 property["baggage_allowances"] = self.parse_baggage_allowance(elem)
             elif elem.tag == f"{PREFIX}FlightRoutes":
                 property["flight_routes"] = tuple(self.parse_route(el) for el in elem.iterchildren())
             elif elem.tag == f"{PREFIX}UnitFacilities":
                 assert elem.text
-                property["unit_facilities"] = tuple(e.UnitFacilities(t) for t in elem.text.split())
+                property["unit_facilities"] = tuple(c.enum(e.UnitFacilities, t) for t in elem.text.split())
             elif elem.tag == f"{PREFIX}UnitName":
                 if elem.text:  # Nonsensical to have an empty tag, but have seen them.
                     if elem.get("lang", "de") != "de":
@@ -1454,7 +1872,7 @@ class OTDS:
                     property["unit_name"] = t.LanguageText(elem.text)
             elif elem.tag == f"{PREFIX}UnitType":
                 if elem.text:  # Empty tag is nonsensical, but have seen them used.
-                    property["unit_types"] = tuple(e.UnitType(t) for t in elem.text.split())
+                    property["unit_types"] = tuple(c.enum(e.UnitType, t) for t in elem.text.split())
             elif elem.tag == f"{PREFIX}GeneralIncludedServices":
                 property["included_services"] = self.parse_general_included_services(elem)
             elif elem.tag == f"{PREFIX}Condition":
@@ -1463,6 +1881,25 @@ class OTDS:
                 property["condition"] = conds[0]
             elif elem.tag == f"{PREFIX}OptionalBookableAddonTypes":
                 property["optional_addons"] = self.parse_optional_bookable_addon_types(elem)
+            elif elem.tag == f"{PREFIX}AddonName":
+                assert elem.text
+                property["addon_name"] = elem.text
+            elif elem.tag == f"{PREFIX}AddonInfo":
+                self.parse_content_info(elem, property.setdefault("addon_info", {}))
+            elif elem.tag == f"{PREFIX}AddonServiceType":
+                category = elem[0]
+                assert category.text
+                property["service_type"] = (c.text(category.tag.removeprefix(PREFIX)), c.text(category.text))
+            elif elem.tag == f"{PREFIX}AddonServiceName":
+                assert elem.text
+                property["service_name"] = elem.text
+            elif elem.tag == f"{PREFIX}AddonServiceInfo":
+                self.parse_content_info(elem, property.setdefault("service_info", {}))
+            elif elem.tag == f"{PREFIX}AddonServiceFeatureName":
+                assert elem.text
+                property["service_feature_name"] = elem.text
+            elif elem.tag == f"{PREFIX}AddonServiceFeatureInfo":
+                self.parse_content_info(elem, property.setdefault("service_feature_info", {}))
             else:
                 raise NotImplementedError(elem.tag)
         if city:
@@ -1495,7 +1932,7 @@ class OTDS:
             elif elem.tag == f"{PREFIX}Time":
                 if elem.get("UTCOffsetOfTimeZone") is not None:
                     raise NotImplementedError()
-                route["time"] = datetime.time.fromisoformat(elem.text)
+                route["time"] = c.time(elem.text)
             else:
                 raise NotImplementedError(elem.tag)
         return MPT(route)
@@ -1552,7 +1989,7 @@ class OTDS:
             else:
                 raise NotImplementedError(elem.tag)
 
-        role = e.Role(combi.attrib["Role"])
+        role = c.enum(e.Role, combi.attrib["Role"])
         return (role, name, day_alloc_index, tuple(comps))
 
     def parse_rule_defined_component(self, component: etree._Element, product_type: e.ProductType) -> t.RuleDefinedComponent:
@@ -1565,7 +2002,7 @@ class OTDS:
             raise NotImplementedError()
 
         day_alloc_lvl = t.DayAllocationLevel(int(component.get("DayAllocationLevel", 0)))
-        role = e.Role(component.attrib["UseRole"])
+        role = c.enum(e.Role, component.attrib["UseRole"])
         return (role, name, day_alloc_lvl)
 
     def parse_rule_selling_accom_component(self, selling_accom: etree._Element) -> t.RuleSellingAccomComponent:
@@ -1605,7 +2042,7 @@ class OTDS:
                 self.parse_unit(elem, sell.setdefault("unit", {}))
             else:
                 raise NotImplementedError(elem.tag)
-        key = t.Key(selling_accom.attrib["Key"])
+        key = t.Key(c.text(selling_accom.attrib["Key"]))
         selling[key] = MPT(sell)
 
     def parse_selling_unit(self, selling_unit: etree._Element, selling: dict[t.Key, t.SellingUnit]) -> None:
@@ -1623,11 +2060,59 @@ class OTDS:
                 self.parse_occupancy(elem, sell.setdefault("occupancy", {}))
             else:
                 raise NotImplementedError(elem.tag)
-        key = t.Key(selling_unit.attrib["Key"])
+        key = t.Key(c.text(selling_unit.attrib["Key"]))
         selling[key] = MPT(sell)
 
+    def parse_service(self, service: etree._Element, service_dict: dict[t.Key, t.Service]) -> None:
+        update_mode = self.get_update_mode(service)
+        if update_mode is not e.UpdateMode.New:
+            raise NotImplementedError()
+
+        details: t.Service = {}
+        for elem in service.iterchildren():
+            if elem.tag == f"{PREFIX}Tags":
+                self.parse_tags(elem, _mutable(details.setdefault("tags", {})))
+            elif elem.tag == f"{PREFIX}Booking":
+                details["booking"] = self.parse_booking(elem)
+            elif elem.tag == f"{PREFIX}Properties":
+                self.parse_properties(elem, _mutable(details.setdefault("properties", {})))
+            elif elem.tag == f"{PREFIX}Occupancy":
+                self.parse_occupancy(elem, _mutable(details.setdefault("occupancy", {})))
+            elif elem.tag == f"{PREFIX}Filter":
+                self.parse_filter_simple_node(elem, _mutable(details.setdefault("filter", {})))
+            elif elem.tag == f"{PREFIX}PriceItems":
+                self.parse_price_items(elem, _mutable(details.setdefault("price_items", {})))
+            elif elem.tag == f"{PREFIX}Availabilities":
+                self.parse_availabilities(elem, _mutable(details.setdefault("availabilities", {})))
+            else:
+                raise NotImplementedError(elem.tag)
+        key = t.Key(c.text(service.attrib["Key"]))
+        service_dict[key] = _frozen(details)
+
+    def parse_service_feature(self, feature: etree._Element, feature_dict: dict[t.Key, t.ServiceFeature]) -> None:
+        update_mode = self.get_update_mode(feature)
+        if update_mode is not e.UpdateMode.New:
+            raise NotImplementedError()
+
+        details: t.ServiceFeature = {"booking": ()}
+        for elem in feature.iterchildren():
+            if elem.tag == f"{PREFIX}Tags":
+                self.parse_tags(elem, _mutable(details.setdefault("tags", {})))
+            elif elem.tag == f"{PREFIX}Booking":
+                details["booking"] = self.parse_booking(elem)
+            elif elem.tag == f"{PREFIX}Properties":
+                self.parse_properties(elem, _mutable(details.setdefault("properties", {})))
+            elif elem.tag == f"{PREFIX}Filter":
+                self.parse_filter_simple_node(elem, _mutable(details.setdefault("filter", {})))
+            elif elem.tag == f"{PREFIX}PriceItems":
+                self.parse_price_items(elem, _mutable(details.setdefault("price_items", {})))
+            else:
+                raise NotImplementedError(elem.tag)
+        key = t.Key(c.text(feature.attrib["Key"]))
+        feature_dict[key] = _frozen(details)
+
     def parse_tag_condition(self, tags: etree._Element) -> tuple[t.SourceAttribute, t.Token, tuple[str, ...], t.StringSlice, e.EvaluationMode, e.DayAllocation]:
-        day_alloc = e.DayAllocation(tags.get("DayAllocation", "All"))  # Do not understand: The Default is "All" if the condition is not one of the following:
+        day_alloc = c.enum(e.DayAllocation, tags.get("DayAllocation", "All"))  # Do not understand: The Default is "All" if the condition is not one of the following:
         ev = tags.get("EvaluationMode", "Any")
         src = t.SourceAttribute(tags.attrib["Source"])
         # Convert these to slice indexes, so they can be compared with value[start:end].
@@ -1636,13 +2121,13 @@ class OTDS:
         end = None if length is None else start + int(length)
         slc = t.StringSlice((start, end))
         assert tags.text
-        return (src, t.Token(tags.attrib["Class"]), tuple(tags.text.split()), slc, ev, day_alloc)
+        return (src, t.Token(c.text(tags.attrib["Class"])), tuple(tags.text.split()), slc, ev, day_alloc)
 
     def parse_tag(self, tag: etree._Element) -> tuple[t.Token, str]:
         if tag.get("TagValueType", "String") != "String":
             raise NotImplementedError()
         assert tag.text
-        return (t.Token(tag.attrib["Class"]), tag.text)
+        return (t.Token(c.text(tag.attrib["Class"])), tag.text)
 
     def parse_tags(self, tags: etree._Element, tags_dict: dict[t.Key, Mapping[t.Token, tuple[str, t.ConditionGroup | None]]]) -> None:
         update_mode = self.get_update_mode(tags)
@@ -1655,11 +2140,11 @@ class OTDS:
                 k, v = self.parse_tag(elem)
                 tags_[k] = (v, None)
             elif elem.tag == f"{PREFIX}ConditionalTag":
-                k, v, c = self.parse_conditional_tag(elem)
-                tags_[k] = (v, c)
+                k, v, cond = self.parse_conditional_tag(elem)
+                tags_[k] = (v, cond)
             else:
                 assert False
-        key = t.Key(tags.get("Key", "default"))
+        key = t.Key(c.text(tags.get("Key", "default")))
         tags_dict[key] = MPT(tags_)
 
     def parse_unit(self, unit: etree._Element, unit_dict: dict[t.Key, t.Unit]) -> None:
@@ -1677,15 +2162,20 @@ class OTDS:
                 self.parse_selling_unit(elem, u.setdefault("selling_units", {}))
             else:
                 raise NotImplementedError(elem.tag)
-        key = t.Key(unit.attrib["Key"])
+        key = t.Key(c.text(unit.attrib["Key"]))
         unit_dict[key] = MPT(u)
 
-    def parse_weekday_condition(self, weekdays: etree._Element) -> tuple[t.SourceAttribute, e.DayType, tuple[e.Weekday, ...]]:
+    def parse_weekday_condition(self, weekdays: etree._Element) -> t.WeekdayCondition:
         source = t.SourceAttribute(weekdays.attrib["Source"])
-        day_type = e.DayType(weekdays.get("DayType", "CheckIn"))
+        day_type = c.enum(e.DayType, weekdays.get("DayType", "CheckIn"))
         assert weekdays.text
-        days = tuple(e.Weekday(d) for d in weekdays.text.split())
-        return (source, day_type, days)
+        days = tuple(c.enum(e.Weekday, d) for d in weekdays.text.split())
+        # The codes of Weekday count from Monday, as date.weekday().
+        return (source, day_type, days, codes.mask(days))
 
     def get_update_mode(self, elem: etree._Element) -> e.UpdateMode:
-        return e.UpdateMode(elem.get("UpdateMode", "New"))
+        mode = elem.get("UpdateMode")
+        return e.UpdateMode.New if mode is None else c.enum(e.UpdateMode, mode)
+
+# Kept outside the instances so that vars(OTDS) stays the plain parsed model.
+_listeners: weakref.WeakKeyDictionary[OTDS, list[Callable[[Changes], None]]] = weakref.WeakKeyDictionary()
@@ -0,0 +1,141 @@
+import datetime
+import weakref
+from array import array
+from collections.abc import Iterable
+from decimal import Decimal
+from typing import TYPE_CHECKING, NamedTuple
+
+from . import typedefs as t
+from .evaluate import Travel, check_ins, matches, occupancy_fits, price
+from .search import available, day_states, iter_price_items
+
+if TYPE_CHECKING:
+    from .main import OTDS, Changes
+
+# Cells without an offer.
+MISSING = -(1 << 63)
+
+class Grid(NamedTuple):
+    first: datetime.date
+    days: int = 365
+    nights: tuple[int, ...] = tuple(range(1, 15))
+    # Ages of the parties, two adults by default.
+    occupancies: tuple[tuple[int, ...], ...] = ((30, 30),)
+    booking_date: datetime.date | None = None
+
+# The cheapest price per check-in day, duration, occupancy and board of one accommodation over
+# any of its rooms, as search() would find it for a stay without flights. Prices are kept in cents
+# in one flat array, so a lookup is an index computation.
+class PriceMatrix(NamedTuple):
+    grid: Grid
+    boards: tuple[t.Key, ...]
+    cents: "array[int]"
+
+    def _index(self, check_in: datetime.date, nights: int, ages: tuple[int, ...]) -> int:
+        day = (check_in - self.grid.first).days
+        if not 0 <= day < self.grid.days:
+            raise KeyError(check_in)
+        if nights not in self.grid.nights:
+            raise KeyError(nights)
+        if ages not in self.grid.occupancies:
+            raise KeyError(ages)
+        return ((day * len(self.grid.nights) + self.grid.nights.index(nights)) * len(self.grid.occupancies)
+                + self.grid.occupancies.index(ages)) * len(self.boards)
+
+    def price(self, check_in: datetime.date, nights: int, ages: tuple[int, ...], board: t.Key | None = None) -> Decimal | None:
+        # The cheapest board without one. KeyError outside the grid.
+        start = self._index(check_in, nights, ages)
+        cells: tuple[int, ...]
+        if board is not None:
+            cells = (self.cents[start + self.boards.index(board)],) if board in self.boards else ()
+        else:
+            cells = tuple(self.cents[start:start + len(self.boards)])
+        found = min((c for c in cells if c != MISSING), default=None)
+        return None if found is None else Decimal(found).scaleb(-2)
+
+def price_matrix(otds: "OTDS", key: t.Key, grid: Grid) -> PriceMatrix:
+    accom = otds.accommodations[key]
+    global_items = tuple(iter_price_items(otds.accommodations_price_items))
+    days = day_states(accom)
+    booking_date = grid.booking_date or datetime.date.today()
+    boards = tuple(dict.fromkeys(b for sell in accom["selling"].values() for b in sell.get("board", {})))
+    cents = array("q", [MISSING]) * (grid.days * len(grid.nights) * len(grid.occupancies) * len(boards))
+    first = grid.first.toordinal()
+
+    for o, ages in enumerate(grid.occupancies):
+        # Price items hang off the SellingAccom and its boards, not the rooms: a SellingAccom is
+        # priced once if any of its rooms fits the party.
+        sellings = [
+            (sell.get("filter", {}).values(),
+             # Per duration, the check-in days the filters allow when they only test the dates.
+             tuple(check_ins(sell.get("filter", {}).values(), grid.first, grid.days, nights) for nights in grid.nights),
+             tuple((boards.index(board_key), global_items + tuple(iter_price_items(sell.get("price_items", {}))) + tuple(iter_price_items(board.get("price_items", {}))))
+                   for board_key, board in sell.get("board", {}).items()))
+            for sell in accom["selling"].values()
+            if any(not su["occupancy"] or any(occupancy_fits(occ, ages) for occ in su["occupancy"].values())
+                   for unit in sell.get("unit", {}).values() for su in unit["selling_units"].values())]
+        if not sellings:
+            continue
+        for day in range(grid.days):
+            check_in = datetime.date.fromordinal(first + day)
+            for n, nights in enumerate(grid.nights):
+                if not available(days, first + day, nights):
+                    continue
+                travel = Travel(check_in, nights, ages, booking_date)
+                start = ((day * len(grid.nights) + n) * len(grid.occupancies) + o) * len(boards)
+                for filters, allowed, priced_boards in sellings:
+                    bits = allowed[n]
+                    if not (bits >> day & 1 if bits is not None else all(matches(cond, travel) for cond in filters)):
+                        continue
+                    for b, items in priced_boards:
+                        amount = price(items, travel)
+                        if amount is None:
+                            continue
+                        cell = int(amount.scaleb(2).to_integral_value())
+                        if cents[start + b] == MISSING or cell < cents[start + b]:
+                            cents[start + b] = cell
+    return PriceMatrix(grid, boards, cents)
+
+# Price matrices of the accommodations of a model over one grid, built on demand or ahead by
+# build(). A parsed delta drops the matrices of the accommodations it touched or removed, they are
+# rebuilt on their next read; the others stay. Matrices are only ever added, or replaced as a whole.
+class PriceMatrices:
+    def __init__(self, otds: "OTDS", grid: Grid) -> None:
+        self._otds = otds
+        self.grid = grid
+        self._matrices: dict[t.Key, PriceMatrix] = {}
+        # The listener only holds a weak reference, the model must not keep its matrices alive.
+        ref = weakref.ref(self)
+
+        def changed(changes: "Changes") -> None:
+            matrices = ref()
+            if matrices is not None:
+                matrices.refresh(changes)
+
+        self._unsubscribe = otds.on_change(changed)
+
+    def __len__(self) -> int:
+        return len(self._matrices)
+
+    def close(self) -> None:
+        self._unsubscribe()
+
+    def build(self, keys: Iterable[t.Key] | None = None) -> None:
+        otds = self._otds.pin()
+        for key in otds.accommodations if keys is None else keys:
+            self._matrices[key] = price_matrix(otds, key, self.grid)
+
+    def get(self, key: t.Key) -> PriceMatrix:
+        matrix = self._matrices.get(key)
+        if matrix is None:
+            matrix = price_matrix(self._otds.pin(), key, self.grid)
+            self._matrices[key] = matrix
+        return matrix
+
+    def price(self, key: t.Key, check_in: datetime.date, nights: int, ages: tuple[int, ...], board: t.Key | None = None) -> Decimal | None:
+        return self.get(key).price(check_in, nights, ages, board)
+
+    def refresh(self, changes: "Changes") -> None:
+        # Runs in the listener of the writer, so it only drops matrices, readers rebuild them.
+        self._matrices = {} if changes.all_accommodations else {
+            k: v for k, v in self._matrices.items() if k not in changes.accommodations}
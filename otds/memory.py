@@ -0,0 +1,121 @@
+import gc
+import heapq
+import sys
+from collections.abc import Mapping
+from enum import Enum
+from types import MappingProxyType as MPT
+from typing import TYPE_CHECKING, NamedTuple
+
+from . import typedefs as t
+
+if TYPE_CHECKING:
+    from .main import OTDS
+
+DEFAULT_TOP = 10
+
+# Fields of the typedefs whose values are charged to another typedef, for the nested ones.
+_TYPEDEFS = {
+    "availabilities": "Availabilities",
+    "board": "Board",
+    "booking": "BookingGroup",
+    "condition": "ConditionGroup",
+    "filter": "ConditionGroup",
+    "globals": "GlobalValue",
+    "occupancy": "Occupancy",
+    "price_items": "PriceItem",
+    "properties": "Property",
+    "selling": "SellingAccom",
+    "selling_units": "SellingUnit",
+    "tags": "TagsDict",
+    "unit": "Unit",
+}
+# Model attributes that are not walked key by key.
+_FIELDS = {
+    "_accommodations_price_items": "PriceItem",
+    "_addons_price_items": "PriceItem",
+    "_fingerprints": "Fingerprint",
+}
+
+class Size(NamedTuple):
+    bytes: int
+    objects: int
+
+class KeySize(NamedTuple):
+    typedef: str
+    key: t.Key
+    bytes: int
+    objects: int
+
+class MemoryReport(NamedTuple):
+    bytes: int
+    objects: int
+    # Bytes and objects per typedef, without the typedefs nested in it, so they add up to the total.
+    typedefs: dict[str, Size]
+    # The same per Python type, MappingProxy wrappers included.
+    types: dict[str, Size]
+    # The largest accommodations, flights, addons and other keyed components.
+    largest: tuple[KeySize, ...]
+
+class _Walker:
+    # Charges every object to the first place it is reached from, objects shared between
+    # components, versions or partitions are counted once. Enum members, None and the small
+    # integers are shared by the whole process, they are not counted.
+    def __init__(self) -> None:
+        self.seen: set[int] = set()
+        # Bytes and objects per typedef and Python type.
+        self.sizes: dict[tuple[str, str], list[int]] = {}
+
+    def walk(self, root: object, typedef: str) -> Size:
+        total = count = 0
+        stack = [(root, typedef)]
+        while stack:
+            obj, typedef = stack.pop()
+            if id(obj) in self.seen:
+                continue
+            self.seen.add(id(obj))
+            if obj is None or isinstance(obj, (bool, Enum)) or (type(obj) is int and -5 <= obj <= 256):
+                continue
+            size = sys.getsizeof(obj)
+            total += size
+            count += 1
+            sizes = self.sizes.get((typedef, type(obj).__name__))
+            if sizes is None:
+                sizes = self.sizes[(typedef, type(obj).__name__)] = [0, 0]
+            sizes[0] += size
+            sizes[1] += 1
+            if isinstance(obj, dict):
+                for key, value in obj.items():
+                    stack.append((key, typedef))
+                    stack.append((value, _TYPEDEFS.get(key, typedef) if isinstance(key, str) else typedef))
+            elif isinstance(obj, MPT):
+                # The wrapped mapping.
+                stack.extend((ref, typedef) for ref in gc.get_referents(obj))
+            elif isinstance(obj, (tuple, list, set, frozenset)):
+                stack.extend((item, typedef) for item in obj)
+        return Size(total, count)
+
+def memory_report(otds: "OTDS", top: int = DEFAULT_TOP) -> MemoryReport:
+    walker = _Walker()
+    keyed: tuple[tuple[str, Mapping[t.Key, object]], ...] = (
+        ("Accommodation", otds.accommodations), ("Oneway", otds.flights), ("Addon", otds.addons), ("Brand", otds.brands),
+        ("DefineComponent", otds.defined_components), ("Product", otds.products))
+    largest = []
+    for typedef, components in keyed:
+        for key, component in components.items():
+            size = walker.walk(component, typedef)
+            largest.append(KeySize(typedef, key, size.bytes, size.objects))
+    # The rest: containers, keys, global price items and anything not reached above.
+    for name, value in vars(otds).items():
+        walker.walk(value, _FIELDS.get(name, "OTDS"))
+    typedefs: dict[str, list[int]] = {}
+    types: dict[str, list[int]] = {}
+    for (typedef, name), (nbytes, count) in walker.sizes.items():
+        for found, group in ((typedefs, typedef), (types, name)):
+            sizes = found.setdefault(group, [0, 0])
+            sizes[0] += nbytes
+            sizes[1] += count
+    return MemoryReport(
+        sum(s[0] for s in typedefs.values()), sum(s[1] for s in typedefs.values()),
+        {k: Size(*v) for k, v in sorted(typedefs.items(), key=lambda i: -i[1][0])},
+        {k: Size(*v) for k, v in sorted(types.items(), key=lambda i: -i[1][0])},
+        tuple(heapq.nlargest(top, largest, key=lambda k: k.bytes)))
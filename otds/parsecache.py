@@ -0,0 +1,98 @@
+import functools
+import hashlib
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Literal
+
+from . import __version__, snapshot
+from .main import SCHEMA_PATH
+
+if TYPE_CHECKING:
+    from .main import OTDS, Projection
+
+DEFAULT_MAX_BYTES = 1 << 30
+SUFFIX = ".otdssnap"
+
+@functools.cache
+def schema_digest() -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for path in sorted(SCHEMA_PATH.parent.glob("*.xsd")):
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+# Parsed models of OTDS files stored as snapshots in a directory, so parsing an identical
+# delivery again only loads the snapshot. Entries are named by a hash of the file (its content,
+# or its path, size and modification time with check="stat"), the projection, the package version
+# and the schema: a new release or schema never finds the entries of an old one, they age out.
+# The directory is kept below max_bytes by removing the least recently used entries.
+class ParseCache:
+    def __init__(self, directory: Path, max_bytes: int = DEFAULT_MAX_BYTES, check: Literal["hash", "stat"] = "hash") -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.check = check
+
+    def key(self, path: Path, include: "Projection | None" = None) -> str:
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"{__version__}\0{schema_digest()}\0".encode())
+        if include is not None:
+            digest.update(repr(sorted((tag, sorted(names)) for tag, names in include.items())).encode())
+        if self.check == "stat":
+            stat = path.stat()
+            digest.update(f"{path.resolve()}\0{stat.st_size}\0{stat.st_mtime_ns}".encode())
+        else:
+            with open(path, "rb") as f:
+                digest.update(hashlib.file_digest(f, "blake2b").digest())
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}{SUFFIX}"
+
+    def get(self, key: str) -> "OTDS | None":
+        path = self._path(key)
+        try:
+            otds = snapshot.load(path)
+            # The modification time orders entries by last use.
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            # Written by another version or damaged.
+            path.unlink(missing_ok=True)
+            return None
+        return otds
+
+    def put(self, key: str, otds: "OTDS") -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        snapshot.dump(otds, self._path(key))
+        self.evict()
+
+    def evict(self) -> int:
+        entries = []
+        for path in self.directory.glob(f"*{SUFFIX}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+        entries.sort()
+        total = sum(size for _mtime, size, _path in entries)
+        removed = 0
+        for _mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        return removed
+
+    def parse(self, otds: "OTDS", path: Path, include: "Projection | None" = None) -> bool:
+        # Parses path into the empty model otds, from the cache if it can. True on a cache hit.
+        key = self.key(path, include)
+        cached = self.get(key)
+        if cached is not None:
+            otds.replace(cached)
+            return True
+        otds.parse(path, include=include)
+        self.put(key, otds)
+        return False
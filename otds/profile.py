@@ -0,0 +1,239 @@
+import datetime
+import heapq
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from decimal import Decimal
+from types import TracebackType
+from typing import TYPE_CHECKING, NamedTuple
+
+from . import enums as e
+from . import evaluate
+from . import typedefs as t
+from .evaluate import Travel
+
+if TYPE_CHECKING:
+    from .search import SearchRequest, SearchResult, StageStats
+
+# Upper bounds in seconds, anything slower falls into a last bucket.
+BUCKETS = (1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0)
+DEFAULT_SLOW_QUERY = 0.1  # seconds
+DEFAULT_SAMPLES = 100
+# Conditions and accommodations kept per slow query sample.
+TOP = 5
+
+class Histogram(NamedTuple):
+    # Counts per bucket of BUCKETS, not cumulative.
+    buckets: tuple[int, ...]
+    calls: int
+    seconds: float
+
+class SlowQuery(NamedTuple):
+    request: "SearchRequest"
+    seconds: float
+    stages: tuple["StageStats", ...]
+    # Condition nodes that took the most time of their own during the query, with that time.
+    conditions: tuple[tuple[t.ConditionGroup, float], ...]
+    # Accommodations that took the most time to price.
+    accommodations: tuple[tuple[t.Key, float], ...]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _histogram_lines(name: str, help: str, label: str, histograms: Iterable[tuple[str, Histogram]]) -> Iterator[str]:
+    yield f"# TYPE {name} histogram"
+    yield f"# UNIT {name} seconds"
+    yield f"# HELP {name} {help}"
+    for value, histogram in histograms:
+        labels = f'{label}="{_escape(value)}"'
+        cumulative = 0
+        for bound, count in zip(BUCKETS + (None,), histogram.buckets):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{"+Inf" if bound is None else bound}"}} {cumulative}'
+        yield f"{name}_count{{{labels}}} {histogram.calls}"
+        yield f"{name}_sum{{{labels}}} {histogram.seconds}"
+
+class Stats(NamedTuple):
+    # Time of condition evaluations without the conditions nested in them, so kinds add up.
+    conditions: dict[e.Condition, Histogram]
+    # Time of the Absolute price items per price class, their conditions included.
+    price_classes: dict[t.Token, Histogram]
+    # Time spent pricing the offers of each accommodation.
+    accommodations: dict[t.Key, Histogram]
+    queries: int
+    slow_queries: int
+    samples: tuple[SlowQuery, ...]
+
+    def openmetrics(self) -> str:
+        lines = [
+            *_histogram_lines("otds_condition_seconds", "Condition evaluation time without nested conditions.",
+                              "kind", ((k.name, v) for k, v in self.conditions.items())),
+            *_histogram_lines("otds_price_item_seconds", "Absolute price item evaluation time.", "class", self.price_classes.items()),
+            *_histogram_lines("otds_accommodation_seconds", "Offer pricing time.", "accommodation", self.accommodations.items()),
+            "# TYPE otds_queries counter",
+            "# HELP otds_queries Searches run.",
+            f"otds_queries_total {self.queries}",
+            "# TYPE otds_slow_queries counter",
+            "# HELP otds_slow_queries Searches slower than the slow query threshold.",
+            f"otds_slow_queries_total {self.slow_queries}",
+            "# EOF",
+        ]
+        return "\n".join(lines) + "\n"
+
+class _Histogram:
+    def __init__(self) -> None:
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.calls = 0
+        self.seconds = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.buckets[bisect_left(BUCKETS, seconds)] += 1
+        self.calls += 1
+        self.seconds += seconds
+
+    def freeze(self) -> Histogram:
+        return Histogram(tuple(self.buckets), self.calls, self.seconds)
+
+def _merge(histograms: Sequence[Histogram]) -> Histogram:
+    return Histogram(tuple(map(sum, zip(*(h.buckets for h in histograms)))), sum(h.calls for h in histograms),
+                     sum(h.seconds for h in histograms))
+
+class _Recorder:
+    # What one thread recorded, only ever written by that thread.
+    def __init__(self) -> None:
+        self.conditions: dict[e.Condition, _Histogram] = {}
+        self.price_classes: dict[t.Token, _Histogram] = {}
+        self.accommodations: dict[t.Key, _Histogram] = {}
+        # Time of the nested conditions of each running condition evaluation.
+        self.nested: list[float] = []
+        # Own time per condition node, and pricing time per accommodation, of the running query.
+        self.query_conditions: dict[int, tuple[t.ConditionGroup, float]] | None = None
+        self.query_accommodations: dict[t.Key, float] = {}
+        self.queries = 0
+        self.slow_queries = 0
+
+# Records where evaluation time goes while it is started, process wide: the hooks in
+# otds.evaluate and SearchPipeline cost one lookup while no profiler records. Every thread
+# records on its own, stats() merges them. Searches slower than slow_query are kept as samples,
+# the most recent ones, with the condition nodes and accommodations they spent the most time on.
+class Profiler:
+    def __init__(self, slow_query: float = DEFAULT_SLOW_QUERY, samples: int = DEFAULT_SAMPLES,
+                 clock: Callable[[], float] = time.perf_counter) -> None:
+        self.slow_query = slow_query
+        self._clock = clock
+        self._samples: deque[SlowQuery] = deque(maxlen=samples)
+        self._recorders: list[_Recorder] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def __enter__(self) -> "Profiler":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type: type[BaseException] | None, exc: BaseException | None, tb: TracebackType | None) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        if evaluate.active_profiler() not in (None, self):
+            raise RuntimeError("Another profiler is recording")
+        evaluate.set_profiler(self)
+
+    def stop(self) -> None:
+        if evaluate.active_profiler() is self:
+            evaluate.set_profiler(None)
+
+    def _recorder(self) -> _Recorder:
+        recorder: _Recorder | None = getattr(self._local, "recorder", None)
+        if recorder is None:
+            recorder = _Recorder()
+            self._local.recorder = recorder
+            with self._lock:
+                self._recorders.append(recorder)
+        return recorder
+
+    def condition(self, fn: Callable[[t.ConditionGroup, Travel, datetime.date | None, int | None], bool],
+                  cond: t.ConditionGroup, travel: Travel, day: datetime.date | None, person: int | None) -> bool:
+        recorder = self._recorder()
+        nested = recorder.nested
+        nested.append(0.0)
+        start = self._clock()
+        try:
+            return fn(cond, travel, day, person)
+        finally:
+            elapsed = self._clock() - start
+            own = elapsed - nested.pop()
+            if nested:
+                nested[-1] += elapsed
+            histogram = recorder.conditions.get(cond[0])
+            if histogram is None:
+                histogram = recorder.conditions[cond[0]] = _Histogram()
+            histogram.add(own)
+            if recorder.query_conditions is not None:
+                found = recorder.query_conditions.get(id(cond))
+                recorder.query_conditions[id(cond)] = (cond, own + (found[1] if found else 0.0))
+
+    def price_item(self, fn: Callable[[t.PriceItem, Travel], Decimal | None], cls: t.Token, item: t.PriceItem,
+                   travel: Travel) -> Decimal | None:
+        start = self._clock()
+        try:
+            return fn(item, travel)
+        finally:
+            elapsed = self._clock() - start
+            recorder = self._recorder()
+            histogram = recorder.price_classes.get(cls)
+            if histogram is None:
+                histogram = recorder.price_classes[cls] = _Histogram()
+            histogram.add(elapsed)
+
+    def accommodation(self, key: t.Key, fn: Callable[[Sequence[tuple[t.Token, t.PriceItem]], Travel], Decimal | None],
+                      items: Sequence[tuple[t.Token, t.PriceItem]], travel: Travel) -> Decimal | None:
+        start = self._clock()
+        try:
+            return fn(items, travel)
+        finally:
+            elapsed = self._clock() - start
+            recorder = self._recorder()
+            histogram = recorder.accommodations.get(key)
+            if histogram is None:
+                histogram = recorder.accommodations[key] = _Histogram()
+            histogram.add(elapsed)
+            if recorder.query_conditions is not None:
+                recorder.query_accommodations[key] = recorder.query_accommodations.get(key, 0.0) + elapsed
+
+    def begin_query(self) -> None:
+        recorder = self._recorder()
+        recorder.query_conditions = {}
+        recorder.query_accommodations = {}
+
+    def end_query(self, result: "SearchResult") -> None:
+        recorder = self._recorder()
+        recorder.queries += 1
+        seconds = sum(s.seconds for s in result.stages)
+        if seconds >= self.slow_query:
+            recorder.slow_queries += 1
+            conditions = heapq.nlargest(TOP, (recorder.query_conditions or {}).values(), key=lambda c: c[1])
+            accommodations = heapq.nlargest(TOP, recorder.query_accommodations.items(), key=lambda a: a[1])
+            self._samples.append(SlowQuery(result.request, seconds, result.stages, tuple(conditions), tuple(accommodations)))
+        recorder.query_conditions = None
+        recorder.query_accommodations = {}
+
+    def stats(self) -> Stats:
+        with self._lock:
+            recorders = tuple(self._recorders)
+        conditions: dict[e.Condition, list[Histogram]] = {}
+        price_classes: dict[t.Token, list[Histogram]] = {}
+        accommodations: dict[t.Key, list[Histogram]] = {}
+        for recorder in recorders:
+            for kind, histogram in tuple(recorder.conditions.items()):
+                conditions.setdefault(kind, []).append(histogram.freeze())
+            for cls, histogram in tuple(recorder.price_classes.items()):
+                price_classes.setdefault(cls, []).append(histogram.freeze())
+            for key, histogram in tuple(recorder.accommodations.items()):
+                accommodations.setdefault(key, []).append(histogram.freeze())
+        return Stats(
+            {k: _merge(v) for k, v in conditions.items()},
+            {k: _merge(v) for k, v in price_classes.items()},
+            {k: _merge(v) for k, v in accommodations.items()},
+            sum(r.queries for r in recorders), sum(r.slow_queries for r in recorders), tuple(self._samples))
@@ -0,0 +1,317 @@
+import datetime
+import heapq
+import itertools
+import time
+from collections.abc import Iterable, Iterator, Mapping, Sequence
+from decimal import Decimal
+from typing import TYPE_CHECKING, NamedTuple
+
+from . import enums as e
+from . import evaluate
+from . import typedefs as t
+from .evaluate import Travel, matches, occupancy_fits, price
+from .index import DateIndex, FlightIndex, condition_period
+
+if TYPE_CHECKING:
+    from .main import OTDS, Changes
+
+class SearchRequest(NamedTuple):
+    check_in_from: datetime.date
+    check_in_until: datetime.date | None
+    nights: int
+    ages: tuple[int, ...]
+    # Conditions on the booking date are evaluated against it, so equal requests price alike on any day.
+    booking_date: datetime.date
+    airports: tuple[str, ...] = ()
+
+class Offer(NamedTuple):
+    accommodation: t.Key
+    selling: t.Key
+    board: t.Key
+    unit: t.Key
+    selling_unit: t.Key
+    check_in: datetime.date
+    nights: int
+    price: Decimal
+
+class StageStats(NamedTuple):
+    name: str
+    candidates_in: int
+    candidates_out: int
+    # Candidates actually examined, fewer than candidates_in when the stage stopped early.
+    evaluated: int
+    seconds: float
+
+class SearchResult(NamedTuple):
+    request: SearchRequest
+    offers: tuple[Offer, ...]
+    stages: tuple[StageStats, ...]
+    # Accommodations the date index selected, the result depends on nothing else of the catalogue.
+    accommodations: frozenset[t.Key]
+
+class _Room(NamedTuple):
+    selling: t.Key
+    unit: t.Key
+    selling_unit: t.Key
+
+# Per day of an accommodation: open, check-in allowed, check-out allowed.
+DayStates = dict[int, tuple[bool, bool, bool]]
+
+def _allowed(check: e.AvailabilityState | bool | None) -> bool:
+    return check is None or check is e.AvailabilityState.Open or check is e.AvailabilityState.Request
+
+def day_states(accom: t.Accommodation) -> DayStates | None:
+    # Several availabilities for one day are alternatives, the day is open if any of them is.
+    if "availabilities" not in accom:
+        return None
+    days: DayStates = {}
+    for _cond, availability in accom["availabilities"].values():
+        for start, end, (default, _extra), states in availability.values():
+            by_offset = {offset: (state, check_in, check_out) for offset, state, check_in, check_out in states.values()}
+            default_open = default[0] is not e.DefaultDayState.Closed
+            first = start.toordinal()
+            for offset in range(end.toordinal() - first + 1):
+                state, check_in, check_out = by_offset.get(t.Offset(offset), (None, None, None))
+                is_open = default_open if state is None else state[0] is not e.DayState.Closed
+                old = days.get(first + offset, (False, False, False))
+                days[first + offset] = (old[0] or is_open, old[1] or _allowed(check_in), old[2] or _allowed(check_out))
+    return days
+
+def available(days: DayStates | None, check_in: int, nights: int) -> bool:
+    if days is None:
+        return True
+    first = days.get(check_in)
+    last = days.get(check_in + nights)
+    if first is None or not first[1] or (last is not None and not last[2]):
+        return False
+    return all(days.get(d, (False,))[0] for d in range(check_in, check_in + nights))
+
+def iter_price_items(price_items: Mapping[t.Key, Mapping[t.Token, tuple[t.PriceItem, ...]]]) -> Iterator[tuple[t.Token, t.PriceItem]]:
+    for classes in price_items.values():
+        for cls, items in classes.items():
+            for item in items:
+                yield (cls, item)
+
+def _covers(cond: t.ConditionGroup, first: datetime.date, last: datetime.date) -> bool:
+    # A plain season, the usual condition of a base price: it holds on every day of the stay.
+    if cond[0] is not e.Condition.Date:
+        return False
+    day_type, _source, dates = cond[1]
+    return day_type is e.DayType.Stay and "dates" not in dates and dates.get("min", first) <= first and last <= dates.get("max", last)
+
+def _lower_bound(items: Sequence[tuple[t.Token, t.PriceItem]], travel: Travel) -> Decimal | None:
+    # Cheapest price an offer with these items can have, without pricing it: surcharges count in
+    # full when they certainly apply and not at all otherwise, reductions that may apply always count
+    # in full. None when a percentage reduction makes any bound unsound.
+    first = travel.check_in
+    last = max(first, travel.check_out - datetime.timedelta(days=1))
+    start, end = first.toordinal(), travel.check_out.toordinal()
+    bound = Decimal(0)
+    for _cls, item in items:
+        cond = item.get("condition")
+        if cond is not None:
+            period_start, period_end = condition_period(cond)
+            if period_end < start or period_start > end:
+                continue
+        if "percent" in item:
+            if item["percent"][0] < 0:
+                return None
+            continue
+        value, conds = item["absolute"]
+        if value >= 0 and cond is not None and not _covers(cond, first, last):
+            continue
+        times = 1
+        for c in conds:
+            if c[0] is e.Absolute.DayBase:
+                times *= travel.nights if c[1][1] is e.X.x else c[1][1]
+            elif c[0] is e.Absolute.PersonBase:
+                times *= len(travel.ages) if c[1] is e.X.x else c[1]
+        bound += value * times
+    return bound
+
+class _State:
+    # Everything a search reads: a pinned version of the model, its indexes and the caches
+    # derived from it. Replaced as a whole when the model changes, a running search keeps its own.
+    def __init__(self, otds: "OTDS", dates: DateIndex | None, flights: FlightIndex | None,
+                 day_states: dict[t.Key, DayStates | None], rooms: dict[tuple[t.Key, tuple[int, ...]], tuple[_Room, ...]],
+                 board_items: dict[tuple[t.Key, t.Key], tuple[tuple[t.Key, tuple[tuple[t.Token, t.PriceItem], ...]], ...]],
+                 global_items: tuple[tuple[t.Token, t.PriceItem], ...]) -> None:
+        self.otds = otds
+        self.dates = dates
+        self.flights = flights
+        self.day_states = day_states
+        self.rooms = rooms
+        self.board_items = board_items
+        self.global_items = global_items
+
+class SearchPipeline:
+    # Narrows the whole catalogue stage by stage, cheapest stage first: the date index, flights
+    # from the requested airports, occupancy, availability, SellingAccom filters and finally pricing.
+    # Per accommodation day states and occupancy results are kept for the lifetime of the pipeline,
+    # which is bound to one loaded model until invalidate() is told what changed in it.
+    # Searches may run in any number of threads at once. Cache entries are only ever added, and
+    # computed alike by every thread; invalidate() publishes a new state instead of changing one.
+    def __init__(self, otds: "OTDS", dates: DateIndex | None = None, flights: FlightIndex | None = None) -> None:
+        self._otds = otds
+        self._state = _State(otds.pin(), dates, flights, {}, {}, {}, tuple(iter_price_items(otds.accommodations_price_items)))
+
+    def invalidate(self, changes: "Changes") -> None:
+        old = self._state
+        otds = self._otds.pin()
+        flights = None if changes.flights else old.flights
+        if changes.all_accommodations:
+            self._state = _State(otds, None, flights, {}, {}, {}, tuple(iter_price_items(otds.accommodations_price_items)))
+            return
+        # Copies first, other threads may still be adding to the old caches.
+        day_states, rooms, board_items = dict(old.day_states), dict(old.rooms), dict(old.board_items)
+        self._state = _State(
+            otds, None, flights,
+            {k: v for k, v in day_states.items() if k not in changes.accommodations},
+            {k: v for k, v in rooms.items() if k[0] not in changes.accommodations},
+            {k: v for k, v in board_items.items() if k[0] not in changes.accommodations},
+            old.global_items)
+
+    @staticmethod
+    def _fitting_rooms(state: _State, key: t.Key, ages: tuple[int, ...]) -> tuple[_Room, ...]:
+        rooms = state.rooms.get((key, ages))
+        if rooms is None:
+            rooms = tuple(
+                _Room(sell_key, unit_key, su_key)
+                for sell_key, sell in state.otds.accommodations[key]["selling"].items()
+                for unit_key, unit in sell.get("unit", {}).items()
+                for su_key, su in unit["selling_units"].items()
+                if not su["occupancy"] or any(occupancy_fits(occ, ages) for occ in su["occupancy"].values()))
+            state.rooms[(key, ages)] = rooms
+        return rooms
+
+    @staticmethod
+    def _priced_boards(state: _State, key: t.Key, sell_key: t.Key) -> tuple[tuple[t.Key, tuple[tuple[t.Token, t.PriceItem], ...]], ...]:
+        # Price items of every board: the Accommodations level, the SellingAccom and the board.
+        boards = state.board_items.get((key, sell_key))
+        if boards is None:
+            sell = state.otds.accommodations[key]["selling"][sell_key]
+            sell_items = state.global_items + tuple(iter_price_items(sell.get("price_items", {})))
+            boards = tuple((board_key, sell_items + tuple(iter_price_items(board.get("price_items", {}))))
+                           for board_key, board in sell.get("board", {}).items())
+            state.board_items[(key, sell_key)] = boards
+        return boards
+
+    @staticmethod
+    def _available(state: _State, key: t.Key, check_in: int, nights: int) -> bool:
+        if key not in state.day_states:
+            state.day_states[key] = day_states(state.otds.accommodations[key])
+        return available(state.day_states[key], check_in, nights)
+
+    def search(self, request: SearchRequest, limit: int | None = None, considered: frozenset[t.Key] | None = None) -> SearchResult:
+        # considered replaces the date index stage with accommodations an outer index already found.
+        stages: list[StageStats] = []
+        profiler = evaluate.active_profiler()
+        if profiler is not None:
+            profiler.begin_query()
+        started = time.perf_counter()
+
+        def stage(name: str, given: int, kept: int, evaluated: int | None = None) -> None:
+            nonlocal started
+            now = time.perf_counter()
+            stages.append(StageStats(name, given, kept, given if evaluated is None else evaluated, now - started))
+            started = now
+
+        first = request.check_in_from.toordinal()
+        last = (request.check_in_until or request.check_in_from).toordinal()
+        ages = tuple(request.ages)
+        state = self._state
+        travel_args = (request.nights, ages, request.booking_date, frozenset(request.airports))
+
+        if considered is None:
+            if state.dates is None:
+                state.dates = DateIndex(state.otds)
+            considered = state.dates.query(request.check_in_from, request.check_in_until, request.nights).accommodations
+        candidates = sorted(considered)
+        stage("dates", len(state.otds.accommodations), len(candidates))
+
+        # Check-in dates per accommodation, the arrival dates of flights when airports are requested.
+        check_ins: dict[t.Key, Sequence[int]] = {}
+        if request.airports:
+            flights = state.flights or FlightIndex(state.otds)
+            state.flights = flights
+            for key in candidates:
+                arrivals = {d.arrival_date.toordinal() for d in flights.to_accommodation(request.airports, state.otds.accommodations[key], request.check_in_from, request.check_in_until)}
+                if arrivals:
+                    check_ins[key] = sorted(arrivals)
+            stage("flights", len(candidates), len(check_ins))
+        else:
+            check_ins = dict.fromkeys(candidates, range(first, last + 1))
+
+        rooms = {key: r for key in check_ins if (r := self._fitting_rooms(state, key, ages))}
+        stage("occupancy", len(check_ins), len(rooms))
+
+        stays = [(key, d) for key in rooms for d in check_ins[key] if self._available(state, key, d, request.nights)]
+        stage("availability", sum(len(check_ins[key]) for key in rooms), len(stays))
+
+        selected: list[tuple[t.Key, t.Key, int]] = []
+        # Filters on the dates of the stay only are decided for every check-in day of the request at once.
+        window = last - first + 1
+        check_in_days: dict[tuple[t.Key, t.Key], int | None] = {}
+        for key, day in stays:
+            travel = Travel(datetime.date.fromordinal(day), *travel_args)
+            for sell_key in dict.fromkeys(r.selling for r in rooms[key]):
+                filters = state.otds.accommodations[key]["selling"][sell_key].get("filter", {})
+                if (key, sell_key) not in check_in_days:
+                    check_in_days[(key, sell_key)] = evaluate.check_ins(filters.values(), request.check_in_from, window, request.nights)
+                bits = check_in_days[(key, sell_key)]
+                if bits is not None and 0 <= day - first < window:
+                    holds = bool(bits >> (day - first) & 1)
+                else:
+                    holds = all(matches(cond, travel) for cond in filters.values())
+                if holds:
+                    selected.append((key, sell_key, day))
+        stage("filter", sum(len(dict.fromkeys(r.selling for r in rooms[key])) for key, _day in stays), len(selected))
+
+        offers, priced = self._price(state, selected, rooms, travel_args, limit)
+        stage("price", len(selected), len(offers), priced)
+        result = SearchResult(request, tuple(offers), tuple(stages), considered)
+        if profiler is not None:
+            profiler.end_query(result)
+        return result
+
+    def _price(self, state: _State, selected: list[tuple[t.Key, t.Key, int]], rooms: dict[t.Key, tuple[_Room, ...]],
+               travel_args: tuple[int, tuple[int, ...], datetime.date, frozenset[str]], limit: int | None) -> tuple[list[Offer], int]:
+        jobs: list[tuple[Decimal | None, t.Key, t.Key, t.Key, int, tuple[tuple[t.Token, t.PriceItem], ...]]] = []
+        profiler = evaluate.active_profiler()
+        for key, sell_key, day in selected:
+            for board_key, items in self._priced_boards(state, key, sell_key):
+                bound = _lower_bound(items, Travel(datetime.date.fromordinal(day), *travel_args)) if limit is not None else None
+                jobs.append((bound, key, sell_key, board_key, day, items))
+        if limit is not None:
+            # Cheapest bounds first, so pricing can stop once no bound can beat the N-th best offer.
+            jobs.sort(key=lambda j: (j[0] is not None, j[0] or 0))
+
+        # Max-heap by price of the best offers so far, the counter keeps ties in input order.
+        best: list[tuple[Decimal, int, Offer]] = []
+        counter = itertools.count()
+        priced = 0
+        for bound, key, sell_key, board_key, day, items in jobs:
+            if limit is not None and len(best) >= limit and bound is not None and bound >= -best[0][0]:
+                break
+            priced += 1
+            travel = Travel(datetime.date.fromordinal(day), *travel_args)
+            amount = price(items, travel) if profiler is None else profiler.accommodation(key, price, items, travel)
+            if amount is None:
+                continue
+            for room in rooms[key]:
+                if room.selling != sell_key:
+                    continue
+                offer = Offer(key, sell_key, board_key, room.unit, room.selling_unit, travel.check_in, travel.nights, amount)
+                if limit is None:
+                    best.append((amount, next(counter), offer))
+                elif len(best) < limit:
+                    heapq.heappush(best, (-amount, -next(counter), offer))
+                elif amount < -best[0][0]:
+                    heapq.heapreplace(best, (-amount, -next(counter), offer))
+        if limit is None:
+            return ([o for _a, _n, o in sorted(best, key=lambda b: (b[0], b[1]))], priced)
+        return ([o for _a, _n, o in sorted(best, key=lambda b: (-b[0], -b[1]))], priced)
+
+    def search_batch(self, requests: Iterable[SearchRequest], limit: int | None = None) -> list[SearchResult]:
+        # Requests of a batch share the indexes and the per accommodation caches.
+        return [self.search(request, limit) for request in requests]
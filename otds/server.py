@@ -0,0 +1,240 @@
+import datetime
+import logging
+import queue
+import selectors
+import signal
+import socket
+import struct
+import threading
+from collections.abc import Callable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from . import codec, snapshot
+from . import typedefs as t
+from .index import DateIndex, FlightIndex
+from .cache import CachedSearch
+from .main import OTDS
+from .search import SearchPipeline, SearchRequest
+
+log = logging.getLogger(__name__)
+
+_HEADER = struct.Struct(">I")
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+_RECV_SIZE = 64 * 1024
+
+class Catalogue(NamedTuple):
+    otds: OTDS
+    dates: DateIndex
+    flights: FlightIndex
+    generation: int
+    search: CachedSearch
+
+def load_catalogue(paths: Sequence[Path], generation: int = 0) -> Catalogue:
+    otds = snapshot.load_paths(paths)
+    dates = DateIndex(otds)
+    flights = FlightIndex(otds)
+    return Catalogue(otds, dates, flights, generation, CachedSearch(otds, SearchPipeline(otds, dates, flights)))
+
+def _recv_exactly(sock: socket.socket, size: int) -> bytes | None:
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            return None
+        buf += chunk
+    return bytes(buf)
+
+def read_frame(sock: socket.socket) -> bytes | None:
+    header = _recv_exactly(sock, _HEADER.size)
+    if header is None:
+        return None
+    (size,) = _HEADER.unpack(header)
+    if size > MAX_FRAME_SIZE:
+        raise ValueError("Frame too large")
+    return _recv_exactly(sock, size)
+
+def _take_frame(buf: bytearray) -> bytes | None:
+    # Removes the first frame from buf once it has fully arrived.
+    if len(buf) < _HEADER.size:
+        return None
+    (size,) = _HEADER.unpack_from(buf)
+    if size > MAX_FRAME_SIZE:
+        raise ValueError("Frame too large")
+    end = _HEADER.size + size
+    if len(buf) < end:
+        return None
+    payload = bytes(buf[_HEADER.size:end])
+    del buf[:end]
+    return payload
+
+def write_frame(sock: socket.socket, payload: bytes) -> None:
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+class QueryServer:
+    def __init__(self, path: Path, paths: Sequence[Path], workers: int = 4) -> None:
+        self._path = path
+        self._paths = tuple(paths)
+        self._catalogue = load_catalogue(self._paths)
+        self._reload_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="otds-worker")
+        self._selector = selectors.DefaultSelector()
+        self._ready: queue.SimpleQueue[socket.socket] = queue.SimpleQueue()
+        # Bytes received per connection that do not make a whole frame yet.
+        self._buffers: dict[socket.socket, bytearray] = {}
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._closed = False
+        self._ops: dict[str, Callable[..., Any]] = {
+            "ping": self.op_ping,
+            "stats": self.op_stats,
+            "accommodation": self.op_accommodation,
+            "accommodation_keys": self.op_accommodation_keys,
+            "availabilities": self.op_availabilities,
+            "dates": self.op_dates,
+            "price_items": self.op_price_items,
+            "flight": self.op_flight,
+            "departures": self.op_departures,
+            "search": self.op_search,
+            "reload": self.op_reload,
+        }
+
+    @property
+    def catalogue(self) -> Catalogue:
+        return self._catalogue
+
+    def reload(self) -> int:
+        # Loads the files the server was started with again, clients cannot name other paths.
+        # Requests already running keep the catalogue they started with, the swap is a single assignment.
+        with self._reload_lock:
+            catalogue = load_catalogue(self._paths, self._catalogue.generation + 1)
+            self._catalogue = catalogue
+        log.info("Loaded catalogue generation %d", catalogue.generation)
+        return catalogue.generation
+
+    def handle(self, payload: bytes) -> bytes:
+        try:
+            op, args = codec.loads(payload)
+            if op not in self._ops:
+                raise ValueError(f"Unknown operation {op!r}")
+            result = self._ops[op](self._catalogue, *args)
+        except Exception as exc:
+            return codec.dumps((False, f"{type(exc).__name__}: {exc}"))
+        return codec.dumps((True, result))
+
+    def op_ping(self, cat: Catalogue) -> str:
+        return "pong"
+
+    def op_stats(self, cat: Catalogue) -> dict[str, int]:
+        cache = cat.search.cache.stats()
+        return {"generation": cat.generation, "accommodations": len(cat.otds.accommodations), "flights": len(cat.otds.flights),
+                "search_cache_hits": cache.hits, "search_cache_misses": cache.misses, "search_cache_size": cache.size}
+
+    def op_accommodation(self, cat: Catalogue, key: t.Key) -> t.Accommodation | None:
+        return cat.otds.accommodations.get(key)
+
+    def op_accommodation_keys(self, cat: Catalogue) -> tuple[t.Key, ...]:
+        return tuple(cat.otds.accommodations)
+
+    def op_availabilities(self, cat: Catalogue, key: t.Key) -> object:
+        return cat.otds.accommodations[key].get("availabilities")
+
+    def op_dates(self, cat: Catalogue, check_in_from: datetime.date, check_in_until: datetime.date | None = None, nights: int = 0) -> object:
+        return cat.dates.query(check_in_from, check_in_until, int(nights))
+
+    def op_price_items(self, cat: Catalogue, check_in_from: datetime.date, check_in_until: datetime.date | None = None, nights: int = 0) -> object:
+        found = cat.dates.query(check_in_from, check_in_until, int(nights))
+        return tuple((ref, cat.dates.price_item(ref)) for ref in found.price_items)
+
+    def op_flight(self, cat: Catalogue, key: t.Key) -> t.Oneway | None:
+        return cat.otds.flights.get(key)
+
+    def op_departures(self, cat: Catalogue, origins: Sequence[str], destinations: Sequence[str], start: datetime.date, end: datetime.date | None = None) -> object:
+        return cat.flights.departures(origins, destinations, start, end)
+
+    def op_search(self, cat: Catalogue, requests: Sequence[Sequence[Any]], limit: int | None = None) -> object:
+        return cat.search.search_batch([SearchRequest(*r) for r in requests], limit)
+
+    def op_reload(self, cat: Catalogue) -> int:
+        return self.reload()
+
+    def _respond(self, conn: socket.socket, payload: bytes) -> None:
+        try:
+            write_frame(conn, self.handle(payload))
+        except OSError:
+            conn.close()
+        # Closed connections are forgotten by the selector thread.
+        self._ready.put(conn)
+        self._wakeup_w.send(b"\0")
+
+    def _read_request(self, conn: socket.socket) -> None:
+        # The selector reported conn readable, so one recv() does not block. A client that sends
+        # part of a frame only holds its own connection, not the selector thread.
+        try:
+            chunk = conn.recv(_RECV_SIZE)
+        except OSError:
+            chunk = b""
+        if not chunk:
+            self._close(conn)
+            return
+        self._buffers[conn] += chunk
+        self._dispatch(conn)
+
+    def _dispatch(self, conn: socket.socket) -> None:
+        # Hands a whole frame to the pool; conn is watched again once it is answered.
+        try:
+            payload = _take_frame(self._buffers[conn])
+        except ValueError:
+            self._close(conn)
+            return
+        if payload is not None:
+            self._selector.unregister(conn)
+            self._executor.submit(self._respond, conn, payload)
+
+    def _close(self, conn: socket.socket) -> None:
+        self._selector.unregister(conn)
+        del self._buffers[conn]
+        conn.close()
+
+    def serve_forever(self) -> None:
+        self._path.unlink(missing_ok=True)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(str(self._path))
+        listener.listen()
+        self._selector.register(listener, selectors.EVENT_READ)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ)
+        try:
+            while not self._closed:
+                for key, _events in self._selector.select():
+                    if key.fileobj is listener:
+                        conn, _addr = listener.accept()
+                        self._buffers[conn] = bytearray()
+                        self._selector.register(conn, selectors.EVENT_READ)
+                    elif key.fileobj is self._wakeup_r:
+                        self._wakeup_r.recv(4096)
+                        while not self._ready.empty():
+                            conn = self._ready.get()
+                            if conn.fileno() < 0:
+                                del self._buffers[conn]
+                                continue
+                            self._selector.register(conn, selectors.EVENT_READ)
+                            # A frame sent right behind the last one may already be buffered.
+                            self._dispatch(conn)
+                    else:
+                        assert isinstance(key.fileobj, socket.socket)
+                        self._read_request(key.fileobj)
+        finally:
+            self._executor.shutdown(wait=True)
+            for key in list(self._selector.get_map().values()):
+                assert isinstance(key.fileobj, socket.socket)
+                key.fileobj.close()
+            self._selector.close()
+            self._path.unlink(missing_ok=True)
+
+    def shutdown(self) -> None:
+        self._closed = True
+        self._wakeup_w.send(b"\0")
+
+    def install_signal_handlers(self) -> None:
+        signal.signal(signal.SIGHUP, lambda signum, frame: threading.Thread(target=self.reload, daemon=True).start())
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.shutdown())
@@ -0,0 +1,111 @@
+import copyreg
+import datetime
+import gc
+import io
+import os
+import pickle
+import struct
+from collections.abc import Sequence
+from decimal import Decimal
+from enum import Enum
+from pathlib import Path
+from types import MappingProxyType as MPT
+from typing import Any
+
+from . import __version__, codes
+from .main import OTDS
+
+# A snapshot is the parsed model of an OTDS instance behind a small header, so stale or foreign
+# files are rejected before decoding. The body is a pickle: it is read in C, an order of magnitude
+# faster than the codec, and keeps objects shared within the model shared. Enum members are
+# stored as their code in otds.codes, and loading only finds the functions and classes a model is
+# built from (see _Unpickler), so a snapshot cannot run other code.
+MAGIC = b"OTDSSNAP"
+FORMAT_VERSION = 4
+
+_HEADER = struct.Struct(">8sH")
+
+def _mapping(items: dict[Any, Any]) -> MPT[Any, Any]:
+    return MPT(items)
+
+def _reduce_mapping(obj: MPT[Any, Any]) -> tuple[Any, ...]:
+    return (_mapping, (dict(obj),))
+
+def _reduce_enum(obj: Enum) -> tuple[Any, ...]:
+    return (codes.member, (type(obj), codes.code(obj)))
+
+class _Pickler(pickle.Pickler):
+    dispatch_table = {**copyreg.dispatch_table, MPT: _reduce_mapping, **{cls: _reduce_enum for cls in codes.ENUMS}}
+
+_GLOBALS: dict[tuple[str, str], object] = {
+    (__name__, "_mapping"): _mapping,
+    (codes.__name__, "member"): codes.member,
+    **{(cls.__module__, cls.__qualname__): cls for cls in (Decimal, datetime.date, datetime.time, datetime.timedelta, *codes.ENUMS)},
+}
+
+class _Unpickler(pickle.Unpickler):
+    def find_class(self, module: str, name: str) -> object:  # type: ignore[explicit-override]
+        found = _GLOBALS.get((module, name))
+        if found is None:
+            raise pickle.UnpicklingError(f"{module}.{name} is not part of a model")
+        return found
+
+def is_snapshot(path: Path) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def dumps(otds: OTDS) -> bytes:
+    buf = io.BytesIO()
+    buf.write(_HEADER.pack(MAGIC, FORMAT_VERSION))
+    _Pickler(buf, protocol=5).dump((__version__, vars(otds)))
+    return buf.getvalue()
+
+def loads(data: bytes | memoryview) -> OTDS:
+    if len(data) < _HEADER.size:
+        raise ValueError("Not an OTDS snapshot")
+    magic, version = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not an OTDS snapshot")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format version {version}")
+    # Nothing built here is garbage, collections triggered by the allocations would take several
+    # times as long as the load itself.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        found = _Unpickler(io.BytesIO(memoryview(data)[_HEADER.size:])).load()
+    except (pickle.UnpicklingError, EOFError, IndexError, KeyError, TypeError, AttributeError, ArithmeticError, struct.error) as exc:
+        raise ValueError(f"Damaged snapshot: {exc!r}") from exc
+    finally:
+        if enabled:
+            gc.enable()
+    if not (isinstance(found, tuple) and len(found) == 2 and isinstance(found[1], dict)):
+        raise ValueError("Damaged snapshot")
+    package_version, state = found
+    if package_version != __version__:
+        raise ValueError(f"Snapshot was written by otds {package_version}, this is {__version__}")
+    otds = OTDS()
+    vars(otds).update(state)
+    return otds
+
+def dump(otds: OTDS, path: Path) -> None:
+    # Write next to the target and rename, so readers never see a partial snapshot.
+    tmp = path.with_name(f".{path.name}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(dumps(otds))
+    os.replace(tmp, path)
+
+def load(path: Path) -> OTDS:
+    return loads(path.read_bytes())
+
+def load_paths(paths: Sequence[Path]) -> OTDS:
+    # A snapshot followed by OTDS files to apply on top of it, or only OTDS files.
+    otds = OTDS()
+    for i, path in enumerate(paths):
+        if is_snapshot(path):
+            if i:
+                raise ValueError(f"{path} is a snapshot, only the first file may be one")
+            otds = load(path)
+        else:
+            otds.parse(path)
+    return otds
@@ -0,0 +1,253 @@
+import io
+import mmap
+import re
+import zlib
+from collections.abc import Callable, Generator, Iterator
+from contextlib import ExitStack
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, Any, Protocol
+
+if TYPE_CHECKING:
+    import zipfile
+
+Buffer = bytes | bytearray | memoryview | mmap.mmap
+Source = Path | str | IO[bytes] | Buffer
+
+DEFAULT_BUFFER_SIZE = 1 << 20
+
+# A compressed input or archive that is damaged or cut short.
+class DecompressionError(ValueError):
+    pass
+
+class _Decompressor(Protocol):
+    @property
+    def eof(self) -> bool: ...
+    @property
+    def unused_data(self) -> bytes: ...
+    def decompress(self, data: bytes, /) -> bytes: ...
+
+# The decompressors, archives and the read-ahead thread are loaded when an input needs them.
+def _bz2() -> _Decompressor:
+    import bz2
+    return bz2.BZ2Decompressor()
+
+def _xz() -> _Decompressor:
+    import lzma
+    return lzma.LZMADecompressor()
+
+def _zstd() -> _Decompressor:
+    try:
+        import zstandard
+    except ImportError:
+        raise NotImplementedError("Reading zstd compressed input requires the zstandard package") from None
+    decompressor: _Decompressor = zstandard.ZstdDecompressor().decompressobj()
+    return decompressor
+
+_MAGIC: tuple[tuple[bytes, Callable[[], _Decompressor]], ...] = (
+    (b"\x1f\x8b", lambda: zlib.decompressobj(16 + zlib.MAX_WBITS)),
+    (b"BZh", _bz2),
+    (b"\xfd7zXZ\x00", _xz),
+    (b"\x28\xb5\x2f\xfd", _zstd),
+)
+_ZIP_MAGIC = b"PK\x03\x04"
+_SNIFF_SIZE = 6
+
+def compression(head: bytes) -> Callable[[], _Decompressor] | None:
+    for magic, factory in _MAGIC:
+        if head.startswith(magic):
+            return factory
+    return None
+
+def is_compressed(source: Path | str | bytes) -> bool:
+    if isinstance(source, bytes):
+        head = source[:_SNIFF_SIZE]
+    else:
+        with open(source, "rb") as f:
+            head = f.read(_SNIFF_SIZE)
+    return head.startswith(_ZIP_MAGIC) or compression(head) is not None
+
+def _decompress(chunks: Iterator[bytes], factory: Callable[[], _Decompressor]) -> Iterator[bytes]:
+    # Concatenated streams (multi-member gzip, pbzip2 output) continue with a fresh decompressor.
+    decompressor = factory()
+    pending = False
+    for chunk in chunks:
+        while chunk:
+            try:
+                data = decompressor.decompress(chunk)
+            except Exception as exc:
+                # zlib.error, OSError from bz2, LZMAError, ZstdError: the data is damaged.
+                raise DecompressionError(f"Damaged compressed input: {exc}") from exc
+            pending = True
+            if data:
+                yield data
+            if getattr(decompressor, "eof", False):
+                chunk = decompressor.unused_data
+                decompressor = factory()
+                pending = False
+            else:
+                chunk = b""
+    if pending and hasattr(decompressor, "eof"):
+        raise DecompressionError("Truncated compressed input")
+
+def _read_ahead(chunks: Iterator[bytes], depth: int = 4) -> Iterator[bytes]:
+    # Reading and decompressing run on their own thread, so they overlap with parsing.
+    import queue
+    import threading
+
+    buf: queue.Queue[bytes | BaseException | None] = queue.Queue(depth)
+    stop = threading.Event()
+
+    def put(item: bytes | BaseException | None) -> bool:
+        while not stop.is_set():
+            try:
+                buf.put(item, timeout=0.1)
+            except queue.Full:
+                continue
+            return True
+        return False
+
+    def produce() -> None:
+        try:
+            for chunk in chunks:
+                if not put(chunk):
+                    return
+        except BaseException as exc:
+            put(exc)
+        else:
+            put(None)
+
+    thread = threading.Thread(target=produce, name="otds-read-ahead", daemon=True)
+    thread.start()
+    try:
+        while (item := buf.get()) is not None:
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+def _zip_member(archive: "zipfile.ZipFile") -> str:
+    names = [i.filename for i in archive.infolist() if not i.is_dir()]
+    xml = [n for n in names if n.lower().endswith(".xml")]
+    if len(names) == 1:
+        return names[0]
+    if len(xml) == 1:
+        return xml[0]
+    raise ValueError(f"Expected a single OTDS file in the archive, found {names}")
+
+class BufferReader:
+    # Seekable reader over a buffer; reads copy only the requested slice, never the whole buffer.
+    def __init__(self, buf: Buffer) -> None:
+        self._view = memoryview(buf).cast("B")
+        self._pos = 0
+
+    def __enter__(self) -> "BufferReader":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self._view.release()
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size < 0 else self._pos + size
+        data = self._view[self._pos:end].tobytes()
+        self._pos += len(data)
+        return data
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = (0, self._pos, len(self._view))[whence]
+        self._pos = max(base + offset, 0)
+        return self._pos
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+def iter_chunks(source: Source, buffer_size: int = DEFAULT_BUFFER_SIZE) -> Generator[bytes, None, None]:
+    with ExitStack() as stack:
+        f: Any = source
+        if isinstance(source, (Path, str)):
+            f = stack.enter_context(open(source, "rb", buffering=0))
+        elif isinstance(source, (bytes, bytearray, memoryview, mmap.mmap)):
+            f = stack.enter_context(BufferReader(source))
+        head = f.read(_SNIFF_SIZE)
+        if head.startswith(_ZIP_MAGIC):
+            # The central directory is at the end of the archive, so this needs a seekable source.
+            import zipfile
+
+            try:
+                archive = stack.enter_context(zipfile.ZipFile(f))
+                yield from iter_chunks(stack.enter_context(archive.open(_zip_member(archive))), buffer_size)
+            except (zipfile.BadZipFile, zlib.error, EOFError) as exc:
+                # A bad archive, or a member failing its CRC check or ending early.
+                raise DecompressionError(f"Damaged zip archive: {exc}") from exc
+            return
+
+        def raw() -> Iterator[bytes]:
+            yield head
+            while chunk := f.read(buffer_size):
+                yield chunk
+
+        factory = compression(head)
+        if factory is None:
+            yield from raw()
+        else:
+            yield from _read_ahead(_decompress(raw(), factory))
+
+# Byte-level scanning of an uncompressed document, so boundaries can be found in a mapped
+# file without decoding it.
+_PROLOG = re.compile(rb"(?:\xef\xbb\xbf)?(?:\s+|<\?.*?\?>|<!--.*?-->|<!DOCTYPE[^>]*>)*", re.S)
+_ROOT = re.compile(rb"<([\w.:-]+)[^>]*>")
+_START_TAG = rb"(?:\s+[^\s=/>]+\s*=\s*(?:\"[^\"]*\"|'[^']*'))*\s*(/?)>"
+# The Accommodations and Accommodation tags, and the markup that can hide text looking like one.
+_MARKUP = re.compile(
+    rb"<!--.*?-->|<!\[CDATA\[.*?\]\]>|<\?.*?\?>"
+    rb"|<((?:[\w.-]+:)?)(Accommodations?)" + _START_TAG + rb"|</((?:[\w.-]+:)?)(Accommodations?)\s*>", re.S)
+
+_ENCODING = re.compile(rb"(?:\xef\xbb\xbf)?<\?xml[^>]*?encoding\s*=\s*[\"']([\w.-]+)[\"']")
+
+def is_utf8(buf: Buffer) -> bool:
+    # As declared, a document without a declaration is UTF-8.
+    declaration = _ENCODING.match(buf)
+    return declaration is None or declaration.group(1).lower() in (b"utf-8", b"utf8")
+
+def root_tags(buf: Buffer) -> tuple[bytes, bytes]:
+    # Start and end tag of the root element, the start tag carries the namespace declarations.
+    prolog = _PROLOG.match(buf)
+    root = _ROOT.match(buf, prolog.end() if prolog else 0)
+    if root is None:
+        raise ValueError("No root element")
+    return (root.group(0), b"</" + root.group(1) + b">")
+
+def accommodation_spans(buf: Buffer) -> Iterator[tuple[int, int]]:
+    # The Accommodation elements of the Accommodations element, skipping comments, CDATA sections
+    # and processing instructions. The schema allows one Accommodations element, more are an error.
+    container: bytes | None = None
+    start: int | None = None
+    done = False
+    for match in _MARKUP.finditer(buf):
+        if match.group(2) is not None:
+            prefix, name, empty = match.group(1, 2, 3)
+            if name == b"Accommodations":
+                if done or container is not None:
+                    raise ValueError(f"Second Accommodations element at byte {match.start()}")
+                done = bool(empty)
+                container = None if empty else prefix
+            elif container == prefix and start is None:
+                if empty:
+                    yield (match.start(), match.end())
+                else:
+                    start = match.start()
+        elif match.group(5) is not None and match.group(4) == container:
+            if match.group(5) == b"Accommodations":
+                if start is not None:
+                    raise ValueError(f"Unterminated Accommodation at byte {start}")
+                container = None
+                done = True
+            elif start is not None:
+                yield (start, match.end())
+                start = None
+    if container is not None or start is not None:
+        raise ValueError("Unterminated Accommodations element")
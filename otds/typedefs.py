@@ -1,8 +1,7 @@
 import datetime
 from collections.abc import Mapping
 from decimal import Decimal
-from typing import Literal, NewType, TypeAlias, TypedDict
-from typing_extensions import Required
+from typing import Literal, NewType, Required, TypeAlias, TypedDict
 
 from . import enums as e
 
@@ -62,10 +61,15 @@ class DateCondition(TypedDict, total=False):
     min: datetime.date
     max: datetime.date
     dates: tuple[datetime.date, ...]
+    # The dates as a bitmap, set with them: the ordinal of the first and bit i for the date first + i.
+    days: tuple[int, int]
+
+# The weekdays follow as a mask, bit 0 for Monday as in date.weekday().
+WeekdayCondition = tuple[SourceAttribute, e.DayType, tuple[e.Weekday, ...], int]
 
 _DayImpactDate = tuple[Literal[e.DayImpact.Date], tuple[e.DayType, SourceAttribute, DateCondition]]
 _DayImpactDayIndex = tuple[Literal[e.DayImpact.DayIndex], tuple[SourceAttribute, tuple[tuple[e.DayIndex, int], ...]], int | None]
-_DayImpactWeekdays = tuple[Literal[e.DayImpact.Weekdays], tuple[SourceAttribute, e.DayType, tuple[e.Weekday, ...]]]
+_DayImpactWeekdays = tuple[Literal[e.DayImpact.Weekdays], WeekdayCondition]
 DayImpact = _DayImpactDate | _DayImpactDayIndex | _DayImpactWeekdays
 
 class DurationCondition(TypedDict, total=False):
@@ -122,7 +126,7 @@ _ConditionPersonCount = tuple[Literal[e.Condition.PersonCount], tuple[SourceAttr
 _ConditionPersonGroup = tuple[Literal[e.Condition.PersonGroup], tuple[SourceAttribute, tuple[OccupancyConditionPerson, ...]]]
 _ConditionPersonImpact = tuple[Literal[e.Condition.PersonImpact], PersonImpact]
 _ConditionTags = tuple[Literal[e.Condition.Tags], tuple[SourceAttribute, Token, tuple[str, ...], StringSlice, e.EvaluationMode, e.DayAllocation]]
-_ConditionWeekdays = tuple[Literal[e.Condition.Weekdays], tuple[SourceAttribute, e.DayType, tuple[e.Weekday, ...]]]
+_ConditionWeekdays = tuple[Literal[e.Condition.Weekdays], WeekdayCondition]
 ConditionGroup: TypeAlias = _ConditionAndOr | _ConditionNot | _ConditionAirports | _ConditionBookingDate | _ConditionBookingDateOffset | _ConditionConditionalTags | _ConditionDayImpact | _ConditionDate | _ConditionDuration | _ConditionImpact | _ConditionImply | _ConditionKeys | _ConditionMatchEqual | _ConditionPersonCount | _ConditionPersonGroup | _ConditionPersonImpact | _ConditionTags | _ConditionWeekdays
 
 _DayStateClosed = tuple[Literal[e.DayState.Closed]]
@@ -251,6 +255,8 @@ class Route(TypedDict, total=False):
     stop_overs: int
 
 class Property(TypedDict, total=False):
+    addon_info: AccommodationInfo
+    addon_name: str
     address: Address
     baggage_allowances: Mapping[e.BaggageType, Baggage]
     board_name: LanguageText
@@ -264,6 +270,12 @@ class Property(TypedDict, total=False):
     official_category: AccommodationCategory
     operator_category: AccommodationCategory
     optional_addons: tuple[OptionalBookableAddonType, ...]
+    service_feature_info: AccommodationInfo
+    service_feature_name: str
+    service_info: AccommodationInfo
+    service_name: str
+    # (category, value), the category is the element below AddonServiceType, e.g. TransferArrangement.
+    service_type: tuple[str, str]
     target_groups: tuple[e.AccommodationTargetgroup, ...]
     type: e.AccommodationType
     unit_facilities: tuple[e.UnitFacilities, ...]
@@ -331,6 +343,34 @@ class Oneway(TypedDict, total=False):
     properties: Mapping[Key, tuple[Property, ...]]
     tags: TagsDict
 
+class ServiceFeature(TypedDict, total=False):
+    booking: Required[tuple[BookingGroup, ...]]
+    filter: Mapping[Key, ConditionGroup]
+    price_items: Mapping[Key, Mapping[Token, tuple[PriceItem, ...]]]
+    properties: Mapping[Key, tuple[Property, ...]]
+    tags: TagsDict
+
+class Service(TypedDict, total=False):
+    availabilities: Mapping[Key, Availabilities]
+    booking: tuple[BookingGroup, ...]
+    filter: Mapping[Key, ConditionGroup]
+    occupancy: Mapping[Key, tuple[Occupancy, ...]]
+    price_items: Mapping[Key, Mapping[Token, tuple[PriceItem, ...]]]
+    properties: Mapping[Key, tuple[Property, ...]]
+    tags: TagsDict
+
+class Addon(TypedDict, total=False):
+    airports: tuple[SimpleNodeIataAirportCode, ...]
+    booking: tuple[BookingGroup, ...]
+    check_out_date_offset: CheckOutDateOffset
+    feature: Mapping[Key, ServiceFeature]
+    filter: Mapping[Key, ConditionGroup]
+    neighbour_component_correction: Mapping[Key, NeighbourComponentCorrection]
+    price_items: Mapping[Key, Mapping[Token, tuple[PriceItem, ...]]]
+    properties: Mapping[Key, tuple[Property, ...]]
+    service: Required[Mapping[Key, Service]]
+    tags: TagsDict
+
 class Flights(TypedDict, total=False):
     oneway: Mapping[Key, Oneway]
 
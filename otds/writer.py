@@ -0,0 +1,744 @@
+import datetime
+import itertools
+from collections.abc import Callable, Iterable, Iterator, Mapping
+from pathlib import Path
+from types import MappingProxyType as MPT
+from typing import IO, TypeVar, cast
+
+from lxml import etree
+
+from . import enums as e
+from . import typedefs as t
+from .main import NS, OTDS, PREFIX
+
+_T = TypeVar("_T")
+
+VERSION = "1.9.5"
+
+Filter = Callable[[t.Key, _T], bool]
+
+# Element names of the model tags that differ from the enum values.
+_PERSON_IMPACT_NAME = MPT({
+    e.PersonImpact.Age: "PersonAge",
+    e.PersonImpact.Genders: "PersonGenders",
+    e.PersonImpact.Index: "PersonIndex",
+})
+_COMBINABLE_WHEN_NAME = MPT({
+    e.CombinableWhen.Code: "CombinationCode",
+    e.CombinableWhen.IndexMin: "CombinationIndexMin",
+    e.CombinableWhen.Not: "Not",
+    e.CombinableWhen.Or: "Or",
+})
+_DAY_ALLOCATION_NAME = MPT({
+    e.DayAllocationPart.Start: ("DayAllocationStart", e.DayReference.CheckIn),
+    e.DayAllocationPart.End: ("DayAllocationEnd", e.DayReference.CheckOut),
+})
+# Largest unit first, so a duration is written with the smallest number that is exact.
+_DURATION_UNITS = (
+    (e.DurationUnit.Nights, datetime.timedelta(days=1)),
+    (e.DurationUnit.Hours, datetime.timedelta(hours=1)),
+    (e.DurationUnit.Minutes, datetime.timedelta(minutes=1)),
+)
+
+def _sub(parent: etree._Element, tag: str, text: str | None = None, **attrib: str | None) -> etree._Element:
+    elem = etree.SubElement(parent, PREFIX + tag, {k: v for k, v in attrib.items() if v is not None})
+    if text is not None:
+        elem.text = text
+    return elem
+
+def _root(tag: str, update_mode: e.UpdateMode | None = None, **attrib: str | None) -> etree._Element:
+    if update_mode is not None and update_mode is not e.UpdateMode.New:
+        attrib["UpdateMode"] = update_mode.value
+    return etree.Element(PREFIX + tag, {k: v for k, v in attrib.items() if v is not None}, nsmap=NS)  # type: ignore[arg-type]
+
+def _default(value: str, default: str) -> str | None:
+    # Attributes are left out when they hold the schema default, as the supplier files do.
+    return None if value == default else value
+
+def _x(value: int | e.X) -> str:
+    return value.value if isinstance(value, e.X) else str(value)
+
+def _category(category: t.AccommodationCategory) -> str:
+    return f"{category[0]}.{category[1]}" if category[1] else str(category[0])
+
+def _age_condition(parent: etree._Element, tag: str, cond: tuple[t.SourceAttribute, t.AgeCondition]) -> None:
+    src, ages = cond
+    elem = _sub(parent, tag, Source=src)
+    if "min" in ages:
+        _sub(elem, "Min", str(ages["min"]))
+    if "max" in ages:
+        _sub(elem, "Max", str(ages["max"]))
+
+def _conditional_tags(parent: etree._Element, cond: tuple[t.SourceAttribute, t.Token, tuple[str, ...]]) -> None:
+    src, cls, values = cond
+    _sub(parent, "ConditionalTags", " ".join(values), Source=src, Class=cls)
+
+def _date_condition(parent: etree._Element, tag: str, cond: t.DateCondition, **attrib: str | None) -> None:
+    elem = _sub(parent, tag, **attrib)
+    if "min" in cond:
+        _sub(elem, "Min", cond["min"].isoformat())
+    if "max" in cond:
+        _sub(elem, "Max", cond["max"].isoformat())
+    if "dates" in cond:
+        _sub(elem, "Dates", " ".join(d.isoformat() for d in cond["dates"]))
+
+def _duration_unit(cond: t.DurationCondition) -> tuple[e.DurationUnit, datetime.timedelta]:
+    # The model keeps Min and Max as timedeltas, pick the largest unit that represents both.
+    deltas = [d for d in (cond.get("min"), cond.get("max")) if d is not None]
+    for unit, size in _DURATION_UNITS:
+        if all(d % size == datetime.timedelta(0) for d in deltas):
+            return unit, size
+    raise NotImplementedError("Duration below a minute")
+
+def _duration_condition(parent: etree._Element, cond: tuple[t.SourceAttribute, t.DurationCondition]) -> None:
+    src, durations = cond
+    unit, size = _duration_unit(durations)
+    elem = _sub(parent, "Duration", Source=src, DurationUnit=_default(unit.value, "Nights"))
+    if "min" in durations:
+        _sub(elem, "Min", str(durations["min"] // size))
+    if "max" in durations:
+        _sub(elem, "Max", str(durations["max"] // size))
+    if "durations" in durations:
+        _sub(elem, "Durations", " ".join(str(d) for d in durations["durations"]))
+    if "multiples" in durations:
+        _sub(elem, "MultiplesOf", str(durations["multiples"]))
+
+def _weekdays(parent: etree._Element, cond: t.WeekdayCondition) -> None:
+    src, day_type, days, _mask = cond
+    _sub(parent, "Weekdays", " ".join(d.value for d in days), Source=src, DayType=_default(day_type.value, "CheckIn"))
+
+def _day_impact(parent: etree._Element, impact: t.DayImpact) -> None:
+    elem = _sub(parent, "DayImpact")
+    if impact[0] is e.DayImpact.Date:
+        day_type, src, dates = impact[1]
+        _date_condition(elem, "Date", dates, Source=src, DayType=_default(day_type.value, "Stay"))
+    elif impact[0] is e.DayImpact.DayIndex:
+        # Stored as (Source, ((DayIndex, value), ...), Repeat) by OTDS.parse_day_index_condition.
+        src, indices, repeat = impact[1]  # type: ignore[misc]
+        index = _sub(elem, "DayIndex", Source=src, Repeat=None if repeat is None else str(repeat))
+        for part, value in indices:
+            _sub(index, part.value, str(value))
+    elif impact[0] is e.DayImpact.Weekdays:
+        _weekdays(elem, impact[1])
+    else:
+        raise NotImplementedError(impact[0])
+
+def _person_impact(parent: etree._Element, impact: t.PersonImpact) -> None:
+    elem = _sub(parent, "PersonImpact")
+    name = _PERSON_IMPACT_NAME[impact[0]]
+    if impact[0] is e.PersonImpact.Age:
+        _age_condition(elem, name, impact[1])
+    elif impact[0] is e.PersonImpact.Genders:
+        src, genders = impact[1]
+        _sub(elem, name, " ".join(g.value for g in genders), Source=src)
+    elif impact[0] is e.PersonImpact.Index:
+        src, index = impact[1]
+        person_index = _sub(elem, name, Source=src)
+        if "indices" in index:
+            _sub(person_index, "Indices", " ".join(str(i) for i in index["indices"]))
+        if "until" in index:
+            _sub(person_index, "Until", str(index["until"]))
+        if "from_" in index:
+            _sub(person_index, "From", str(index["from_"]))
+        if "filter" in index:
+            person_filter = _sub(person_index, "PersonFilter")
+            for _kind, tags in index["filter"]:
+                _conditional_tags(person_filter, tags)
+
+def _impact(parent: etree._Element, cond: tuple[t.SourceAttribute, t.Token, tuple[str, ...]]) -> None:
+    _conditional_tags(_sub(parent, "Impact"), cond)
+
+def _condition(parent: etree._Element, cond: t.ConditionGroup) -> None:
+    if cond[0] is e.Condition.And or cond[0] is e.Condition.Or:
+        elem = _sub(parent, cond[0].value)
+        for sub in cond[1]:
+            _condition(elem, sub)
+    elif cond[0] is e.Condition.Not:
+        _condition(_sub(parent, "Not"), cond[1])
+    elif cond[0] is e.Condition.Imply:
+        elem = _sub(parent, "Imply")
+        _condition(_sub(elem, "If"), cond[1][0])
+        _condition(_sub(elem, "Then"), cond[1][1])
+    elif cond[0] is e.Condition.Airports:
+        src, airport_type, airports = cond[1]
+        _sub(parent, "Airports", " ".join(airports), Source=src, AirportType=airport_type.value)
+    elif cond[0] is e.Condition.BookingDate:
+        src, booking_dates = cond[1]
+        elem = _sub(parent, "BookingDate", Source=src)
+        if "min" in booking_dates:
+            _sub(elem, "Min", booking_dates["min"].isoformat())
+        if "max" in booking_dates:
+            _sub(elem, "Max", booking_dates["max"].isoformat())
+    elif cond[0] is e.Condition.BookingDateOffset:
+        src, offsets = cond[1]
+        elem = _sub(parent, "BookingDateOffset", Source=src)
+        if "min" in offsets:
+            _sub(elem, "Min", str(offsets["min"]))
+        if "max" in offsets:
+            _sub(elem, "Max", str(offsets["max"]))
+    elif cond[0] is e.Condition.ConditionalTags:
+        _conditional_tags(parent, cond[1])
+    elif cond[0] is e.Condition.Date:
+        day_type, src, dates = cond[1]
+        _date_condition(parent, "Date", dates, Source=src, DayType=_default(day_type.value, "Stay"))
+    elif cond[0] is e.Condition.DayImpact:
+        _day_impact(parent, cond[1])
+    elif cond[0] is e.Condition.Duration:
+        _duration_condition(parent, cond[1])
+    elif cond[0] is e.Condition.Impact:
+        _impact(parent, cond[1])
+    elif cond[0] is e.Condition.Keys:
+        src, keys, day_alloc = cond[1]
+        _sub(parent, "Keys", keys, Source=src, DayAllocation=None if day_alloc is None else day_alloc.value)
+    elif cond[0] is e.Condition.MatchEqual:
+        elem = _sub(parent, "MatchEqual")
+        for match in cond[1]:
+            _match(elem, match)
+    elif cond[0] is e.Condition.PersonCount:
+        src, count = cond[1]
+        elem = _sub(parent, "PersonCount", Source=src)
+        if "min" in count:
+            _sub(elem, "Min", str(count["min"]))
+        if "filter" in count:
+            _impact(_sub(elem, "PersonFilter"), count["filter"][1])
+    elif cond[0] is e.Condition.PersonGroup:
+        src, persons = cond[1]
+        elem = _sub(parent, "PersonGroup", Source=src)
+        for person in persons:
+            person_elem = _sub(elem, "Person")
+            if "min_age" in person:
+                _sub(person_elem, "MinAge", str(person["min_age"]))
+            if "min_count" in person:
+                _sub(person_elem, "MinCount", str(person["min_count"]))
+    elif cond[0] is e.Condition.PersonImpact:
+        _person_impact(parent, cond[1])
+    elif cond[0] is e.Condition.Tags:
+        src, cls, values, (start, end), ev, day_alloc = cond[1]
+        # The parser keeps EvaluationMode as the attribute string.
+        _sub(parent, "Tags", " ".join(values), Source=src, Class=cls,
+             Offset=str(start) if start else None, Length=None if end is None else str(end - start),
+             EvaluationMode=_default(e.EvaluationMode(ev).value, "Any"), DayAllocation=_default(day_alloc.value, "All"))
+    elif cond[0] is e.Condition.Weekdays:
+        _weekdays(parent, cond[1])
+    else:
+        raise NotImplementedError(cond[0])
+
+def _match(parent: etree._Element, match: t.Match) -> None:
+    if match[0] is e.Match.Element:
+        element, src = match[1]
+        _sub(parent, "Element", element.value, Source=src)
+    elif match[0] is e.Match.Key:
+        _sub(parent, "Key", Source=match[1][0])
+    elif match[0] is e.Match.Tag:
+        src, cls = match[1]
+        _sub(parent, "Tag", Source=src, Class=cls)
+
+def _condition_node(parent: etree._Element, tag: str, cond: t.ConditionGroup, **attrib: str | None) -> None:
+    _condition(_sub(parent, tag, **attrib), cond)
+
+def _filters(parent: etree._Element, filters: Mapping[t.Key, t.ConditionGroup]) -> None:
+    for key, cond in filters.items():
+        _condition_node(parent, "Filter", cond, Key=key)
+
+def _tags(parent: etree._Element, tags: t.TagsDict) -> None:
+    for key, values in tags.items():
+        elem = _sub(parent, "Tags", Key=_default(key, "default"))
+        # Plain tags come before conditional ones in the schema.
+        for cls, (value, cond) in values.items():
+            if cond is None:
+                _sub(elem, "Tag", value, Class=cls)
+        for cls, (value, cond) in values.items():
+            if cond is not None:
+                conditional = _sub(elem, "ConditionalTag")
+                _sub(conditional, "Tag", value, Class=cls)
+                _condition_node(conditional, "Condition", cond)
+
+def _booking_parameter(parent: etree._Element, param: t.BookingParameter) -> None:
+    left, right = param["sep"]
+    elem = _sub(parent, "BookingParameter", Field=param["field"].value, Index=_default(str(param["index"]), "0"),
+                Name=_default(param["name"], "Default"), LeftSeparator=left or None, RightSeparator=right or None)
+    # The parser keeps the parameters as a tuple, although the schema allows only one.
+    for value in cast(tuple[t.BookingParameterParam, ...], param["params"]):
+        if value[0] is e.BookingParameter.Value:
+            # PadLength was applied when parsing, the padded value is written instead.
+            _sub(elem, "Value", value[1])
+        elif value[0] is e.BookingParameter.Date:
+            _sub(elem, "Date", DayType=value[1].value, Source=_default(value[2], "ThisComponent"),
+                 DateFormat=_default(value[3].value, "[D01][M01][Y01]"))
+        elif value[0] is e.BookingParameter.PersonAge:
+            _sub(elem, "PersonAge", AgeType=_default(value[1].value, "TravelAge"),
+                 DateFormat=_default(value[2].value, "[D01][M01][Y01]"))
+        elif value[0] is e.BookingParameter.Tag:
+            _sub(elem, "Tag", Source=value[1], Class=value[2])
+
+def _booking(parent: etree._Element, booking: tuple[t.BookingGroup, ...]) -> None:
+    elem = _sub(parent, "Booking")
+    for area, src, conds, eval_base, priority in booking:
+        group = _sub(elem, "BookingGroup", Area=area.value, Source=_default(src, "ThisComponent"),
+                     Priority=_default(str(priority), "0"), EvaluationBase=None if eval_base is None else eval_base.value)
+        for cond in conds:
+            if cond[0] is e.BookingGroup.Parameter:
+                _booking_parameter(group, cond[1])
+            else:
+                _condition_node(group, "Condition", cond[1])
+
+def _content_info(parent: etree._Element, tag: str, info: t.AccommodationInfo) -> None:
+    # The parser lower cases ReferenceSystem, it is written back capitalised.
+    elem = _sub(parent, tag)
+    for system, reference in cast(Mapping[str, tuple[str, str]], info).items():
+        _sub(elem, "Reference", reference[1], ReferenceSystem=system.capitalize(), ReferenceType=reference[0])
+
+def _address(parent: etree._Element, address: t.Address) -> None:
+    elem = _sub(parent, "AccommodationAddress")
+    for field, tag in (("street", "Street"), ("zip", "ZipCode"), ("city", "City"), ("country", "Country"),
+                       ("phone", "Phone"), ("fax", "Fax")):
+        if field in address:
+            _sub(elem, tag, address[field])  # type: ignore[literal-required]
+    geocode = address.get("geo", {}).get("geocode")
+    if geocode is not None:
+        code = _sub(_sub(elem, "GeoInfo"), "GeoCode")
+        _sub(code, "Latitude", str(geocode["latitude"]))
+        _sub(code, "Longitude", str(geocode["longitude"]))
+        _sub(code, "Accuracy", str(geocode["accuracy_km"]))
+
+def _route_node(parent: etree._Element, tag: str, node: t.RouteNode) -> None:
+    elem = _sub(parent, tag)
+    if "airport" in node:
+        _sub(elem, "Airport", node["airport"])
+    if "date_offset" in node:
+        _sub(elem, "DateOffset", str(node["date_offset"]))
+    if "time" in node:
+        _sub(elem, "Time", node["time"].isoformat())
+
+def _routes(parent: etree._Element, routes: tuple[t.Route, ...]) -> None:
+    elem = _sub(parent, "FlightRoutes")
+    for route in routes:
+        route_elem = _sub(elem, "FlightRoute")
+        if "departure" in route:
+            _route_node(route_elem, "Departure", route["departure"])
+        if "arrival" in route:
+            _route_node(route_elem, "Arrival", route["arrival"])
+        if route.get("operating"):
+            operating = _sub(route_elem, "Operating")
+            if "carrier" in route["operating"]:
+                _sub(_sub(operating, "Carrier"), "Identifier", route["operating"]["carrier"])
+            if "flight_number" in route["operating"]:
+                _sub(operating, "FlightNumber", route["operating"]["flight_number"])
+        if "stop_overs" in route:
+            _sub(route_elem, "StopOvers", str(route["stop_overs"]))
+
+def _property_group(parent: etree._Element, p: t.Property) -> None:
+    # In the order of PropertyGroupType.
+    elem = _sub(parent, "PropertyGroup")
+    for city in p.get("city", ()):
+        _sub(elem, "AccommodationCity", city)
+    if "type" in p:
+        _sub(elem, "AccommodationType", p["type"].value)
+    if "name" in p:
+        _sub(elem, "AccommodationName", p["name"])
+    if "info" in p:
+        _content_info(elem, "AccommodationInfo", p["info"])
+    if "official_category" in p:
+        _sub(elem, "AccommodationOfficialCategory", _category(p["official_category"]))
+    if "operator_category" in p:
+        _sub(elem, "AccommodationOperatorCategory", _category(p["operator_category"]))
+    if "target_groups" in p:
+        _sub(elem, "AccomodationTargetgroups", " ".join(g.value for g in p["target_groups"]))
+    if "address" in p:
+        _address(elem, p["address"])
+    if "unit_name" in p:
+        _sub(elem, "UnitName", p["unit_name"])
+    if "unit_types" in p:
+        _sub(elem, "UnitType", " ".join(u.value for u in p["unit_types"]))
+    if "unit_facilities" in p:
+        _sub(elem, "UnitFacilities", " ".join(f.value for f in p["unit_facilities"]))
+    if "board_name" in p:
+        _sub(elem, "BoardName", p["board_name"])
+    if "board_type" in p:
+        _sub(elem, "BoardType", p["board_type"].value)
+    if "addon_name" in p:
+        _sub(elem, "AddonName", p["addon_name"])
+    if "addon_info" in p:
+        _content_info(elem, "AddonInfo", p["addon_info"])
+    if "service_type" in p:
+        _sub(_sub(elem, "AddonServiceType"), *p["service_type"])
+    if "service_name" in p:
+        _sub(elem, "AddonServiceName", p["service_name"])
+    if "service_info" in p:
+        _content_info(elem, "AddonServiceInfo", p["service_info"])
+    if "service_feature_name" in p:
+        _sub(elem, "AddonServiceFeatureName", p["service_feature_name"])
+    if "service_feature_info" in p:
+        _content_info(elem, "AddonServiceFeatureInfo", p["service_feature_info"])
+    if "included_services" in p:
+        services = _sub(elem, "GeneralIncludedServices")
+        for service in p["included_services"]:
+            _sub(services, "GeneralIncludedService", service.value)
+    if "optional_addons" in p:
+        addons = _sub(elem, "OptionalBookableAddonTypes")
+        for addon, teaser in p["optional_addons"]:
+            _sub(addons, "OptionalBookableAddonType", addon.value, ShortTeaserText=teaser or None)
+    if "baggage_allowances" in p:
+        allowances = _sub(elem, "FlightBookingClassBaggageAllowances")
+        for baggage_type, baggage in p["baggage_allowances"].items():
+            allowance = _sub(allowances, "BaggageAllowance", BaggageType=_default(baggage_type.value, "Checked"))
+            if "pieces" in baggage:
+                _sub(allowance, "Pieces", str(baggage["pieces"]))
+            if "weight" in baggage:
+                weight, unit = baggage["weight"]
+                _sub(allowance, "Weight", repr(weight), Unit=unit)
+    if "flight_routes" in p:
+        _routes(elem, p["flight_routes"])
+    if "condition" in p:
+        _condition_node(elem, "Condition", p["condition"])
+
+def _properties(parent: etree._Element, properties: Mapping[t.Key, tuple[t.Property, ...]]) -> None:
+    for key, groups in properties.items():
+        elem = _sub(parent, "Properties", Key=key)
+        for p in groups:
+            _property_group(elem, p)
+
+def _combinable_when(parent: etree._Element, when: t.CombinableWhen) -> None:
+    name = _COMBINABLE_WHEN_NAME[when[0]]
+    if when[0] is e.CombinableWhen.Or or when[0] is e.CombinableWhen.Not:
+        elem = _sub(parent, name)
+        for sub in when[1]:
+            _combinable_when(elem, sub)
+    else:
+        _sub(parent, name, str(when[2]), Group=_default(when[1], "Default"))
+
+def _price_item(parent: etree._Element, cls: t.Token, item: t.PriceItem) -> None:
+    elem = _sub(parent, "PriceItem", Class=cls)
+    if "absolute" in item:
+        value, conds = item["absolute"]
+        absolute = _sub(elem, "Absolute")
+        _sub(absolute, "Value", str(value))
+        for cond in conds:
+            if cond[0] is e.Absolute.DayBase:
+                src, base = cond[1]
+                _sub(absolute, "DayBase", _x(base), Source=_default(src, "ThisComponent"))
+            elif cond[0] is e.Absolute.PersonBase:
+                _sub(absolute, "PersonBase", _x(cond[1]))
+            else:
+                _sub(absolute, "AppliedBy", cond[1])
+    elif "percent" in item:
+        value, percent_conds = item["percent"]
+        percent = _sub(elem, "Percent")
+        _sub(percent, "Value", str(value))
+        for _kind, classes in percent_conds:
+            _sub(percent, "ApplyTo", " ".join(classes))
+    if "condition" in item:
+        _condition_node(elem, "Condition", item["condition"])
+    for (layer_name, layer_level), combi in item.get("combinatorics", {}).items():
+        combinatorics = _sub(elem, "Combinatorics", LayerName=_default(layer_name, "Default"),
+                             LayerLevel=_default(str(layer_level), "0"))
+        if "level" in combi:
+            _sub(combinatorics, "CombinationLevel", str(combi["level"]))
+        if "code" in combi:
+            _sub(combinatorics, "CombinationCode", combi["code"][1], Group=_default(combi["code"][0], "Default"))
+        if "index" in combi:
+            _sub(combinatorics, "CombinationIndex", str(combi["index"][1]), Group=_default(combi["index"][0], "Default"))
+        if "when" in combi:
+            _combinable_when(_sub(combinatorics, "CombinableWhen"), combi["when"])
+
+def price_items_element(key: t.Key, classes: Mapping[t.Token, tuple[t.PriceItem, ...]], parent: etree._Element | None = None) -> etree._Element:
+    elem = _root("PriceItems", Key=key) if parent is None else _sub(parent, "PriceItems", Key=key)
+    for cls, items in classes.items():
+        for item in items:
+            _price_item(elem, cls, item)
+    return elem
+
+def _price_items(parent: etree._Element, price_items: Mapping[t.Key, Mapping[t.Token, tuple[t.PriceItem, ...]]]) -> None:
+    for key, classes in price_items.items():
+        price_items_element(key, classes, parent)
+
+def _day_state(parent: etree._Element, tag: str, state: t.DayState | t.DefaultDayState, **attrib: str | None) -> etree._Element:
+    elem = _sub(parent, tag, **attrib)
+    count = state[1] if len(state) > 1 else None
+    _sub(elem, state[0].value, None if count is None else str(count))
+    return elem
+
+def _check(parent: etree._Element, tag: str, state: e.AvailabilityState | bool | None) -> None:
+    if state is False:
+        _sub(parent, f"No{tag}")
+    elif isinstance(state, e.AvailabilityState):
+        _sub(parent, tag, State=_default(state.value, "Open"))
+
+def _availabilities(parent: etree._Element, availabilities: Mapping[t.Key, t.Availabilities]) -> None:
+    for key, (cond, availability) in availabilities.items():
+        elem = _sub(parent, "Availabilities", Key=key)
+        for avail_key, (start, end, (default, extra), states) in availability.items():
+            avail = _sub(elem, "Availability", Key=avail_key, StartDate=start.isoformat(), EndDate=end.isoformat())
+            default_elem = _day_state(avail, "DefaultDayState", default)
+            if "check_out" in extra:
+                check_out = extra["check_out"]
+                _sub(default_elem, "CheckOut", None if check_out is None else str(check_out))
+            for state_key, (offset, state, check_in, check_out_state) in states.items():
+                day = _day_state(avail, "DayState", state, Key=state_key, Offset=str(offset))
+                _check(day, "CheckIn", check_in)
+                _check(day, "CheckOut", check_out_state)
+        if cond is not None:
+            _condition_node(elem, "Condition", cond)
+
+def _occupancy_person(parent: etree._Element, person: t.OccupancyPerson) -> None:
+    elem = _sub(parent, "Person")
+    for field, tag in (("min_age", "MinAge"), ("max_age", "MaxAge"), ("min_count", "MinCount"),
+                       ("max_count", "MaxCount"), ("count", "Count")):
+        if field in person:
+            _sub(elem, tag, str(person[field]))  # type: ignore[literal-required]
+
+def _occupancy(parent: etree._Element, occupancy: Mapping[t.Key, tuple[t.Occupancy, ...]]) -> None:
+    for key, occ in occupancy.items():
+        elem = _sub(parent, "Occupancy", Key=key)
+        for item in occ:
+            if item[0] is e.Occupancy.Person:
+                _occupancy_person(elem, item[1])
+            else:
+                exclude = _sub(elem, "Exclude")
+                for person in item[1]:
+                    _occupancy_person(exclude, person)
+
+def _selling_unit(parent: etree._Element, key: t.Key, selling: t.SellingUnit) -> None:
+    elem = _sub(parent, "SellingUnit", Key=key)
+    _tags(elem, selling.get("tags", {}))
+    _booking(elem, selling["booking"])
+    _occupancy(elem, selling["occupancy"])
+
+def _unit(parent: etree._Element, key: t.Key, unit: t.Unit) -> None:
+    elem = _sub(parent, "Unit", Key=key)
+    _tags(elem, unit.get("tags", {}))
+    _properties(elem, unit.get("properties", {}))
+    for selling_key, selling in unit["selling_units"].items():
+        _selling_unit(elem, selling_key, selling)
+
+def _board(parent: etree._Element, key: t.Key, board: t.Board) -> None:
+    elem = _sub(parent, "Board", Key=key)
+    _tags(elem, board.get("tags", {}))
+    if "booking" in board:
+        _booking(elem, board["booking"])
+    _properties(elem, board.get("properties", {}))
+    _price_items(elem, board.get("price_items", {}))
+
+def _selling_accom(parent: etree._Element, key: t.Key, sell: t.SellingAccom) -> None:
+    elem = _sub(parent, "SellingAccom", Key=key)
+    _tags(elem, sell.get("tags", {}))
+    if "booking" in sell:
+        _booking(elem, sell["booking"])
+    _filters(elem, sell.get("filter", {}))
+    for board_key, board in sell.get("board", {}).items():
+        _board(elem, board_key, board)
+    for unit_key, unit in sell.get("unit", {}).items():
+        _unit(elem, unit_key, unit)
+    _price_items(elem, sell.get("price_items", {}))
+
+def accommodation_element(key: t.Key, accom: t.Accommodation, update_mode: e.UpdateMode = e.UpdateMode.New) -> etree._Element:
+    elem = _root("Accommodation", update_mode, Key=key)
+    _tags(elem, accom.get("tags", {}))
+    _properties(elem, accom.get("properties", {}))
+    for sell_key, sell in accom["selling"].items():
+        _selling_accom(elem, sell_key, sell)
+    if "airports" in accom:
+        _sub(elem, "CatchmentAirports", " ".join(accom["airports"]))
+    _availabilities(elem, accom.get("availabilities", {}))
+    return elem
+
+def _neighbour_component_correction(parent: etree._Element, corrections: Mapping[t.Key, t.NeighbourComponentCorrection]) -> None:
+    for correction_key, correction in corrections.items():
+        neighbour = _sub(parent, "NeighbourComponentCorrection", Key=_default(correction_key, "Default"))
+        for field, tag in (("check_in_offset", "CheckInDateOffset"), ("check_out_offset", "CheckOutDateOffset")):
+            if field in correction:
+                offset, component = correction[field]  # type: ignore[literal-required]
+                _sub(neighbour, tag, str(offset), Component=None if component is None else component.value)
+
+def _booking_class(parent: etree._Element, key: t.Key, booking_class: t.BookingClass) -> None:
+    elem = _sub(parent, "BookingClass", Key=key)
+    _tags(elem, booking_class.get("tags", {}))
+    if "booking" in booking_class:
+        _booking(elem, booking_class["booking"])
+    _properties(elem, booking_class.get("properties", {}))
+    _occupancy(elem, booking_class.get("occupancy", {}))
+    _availabilities(elem, booking_class.get("availabilities", {}))
+    _price_items(elem, booking_class.get("price_items", {}))
+
+def flight_element(key: t.Key, flight: t.Oneway, update_mode: e.UpdateMode = e.UpdateMode.New) -> etree._Element:
+    elem = _root("OnewayFlight", update_mode, Key=key)
+    _tags(elem, flight.get("tags", {}))
+    _filters(elem, flight.get("filter", {}))
+    _properties(elem, flight.get("properties", {}))
+    _sub(elem, "DepartureAirport", flight["departure"])
+    _sub(elem, "ArrivalAirport", flight["arrival"])
+    if "check_out_date_offset" in flight:
+        _sub(elem, "CheckOutDateOffset", str(flight["check_out_date_offset"]))
+    _price_items(elem, flight.get("price_items", {}))
+    _neighbour_component_correction(elem, flight.get("neighbour_component_correction", {}))
+    for class_key, booking_class in flight["booking_class"].items():
+        _booking_class(elem, class_key, booking_class)
+    return elem
+
+def _service_feature(parent: etree._Element, key: t.Key, feature: t.ServiceFeature) -> None:
+    elem = _sub(parent, "ServiceFeature", Key=key)
+    _tags(elem, feature.get("tags", {}))
+    _booking(elem, feature["booking"])
+    _properties(elem, feature.get("properties", {}))
+    _filters(elem, feature.get("filter", {}))
+    _price_items(elem, feature.get("price_items", {}))
+
+def _service(parent: etree._Element, key: t.Key, service: t.Service) -> None:
+    elem = _sub(parent, "Service", Key=key)
+    _tags(elem, service.get("tags", {}))
+    if "booking" in service:
+        _booking(elem, service["booking"])
+    _properties(elem, service.get("properties", {}))
+    _occupancy(elem, service.get("occupancy", {}))
+    _filters(elem, service.get("filter", {}))
+    _price_items(elem, service.get("price_items", {}))
+    _availabilities(elem, service.get("availabilities", {}))
+
+def addon_element(key: t.Key, addon: t.Addon, update_mode: e.UpdateMode = e.UpdateMode.New) -> etree._Element:
+    elem = _root("Addon", update_mode, Key=key)
+    _tags(elem, addon.get("tags", {}))
+    if "booking" in addon:
+        _booking(elem, addon["booking"])
+    if "check_out_date_offset" in addon:
+        _sub(elem, "CheckOutDateOffset", str(addon["check_out_date_offset"]))
+    _properties(elem, addon.get("properties", {}))
+    for feature_key, feature in addon.get("feature", {}).items():
+        _service_feature(elem, feature_key, feature)
+    for service_key, service in addon["service"].items():
+        _service(elem, service_key, service)
+    _filters(elem, addon.get("filter", {}))
+    _price_items(elem, addon.get("price_items", {}))
+    if "airports" in addon:
+        _sub(elem, "CatchmentAirports", " ".join(addon["airports"]))
+    _neighbour_component_correction(elem, addon.get("neighbour_component_correction", {}))
+    return elem
+
+def _components(parent: etree._Element, components: tuple[t.Component, ...]) -> None:
+    elem = _sub(parent, "Components")
+    for comp in components:
+        if comp[0] is e.Component.Accommodation:
+            accom = _sub(elem, "Accommodation")
+            for name, index in comp[1]:
+                _sub(accom, "SellingAccom", Name=name, DayAllocationIndex=str(index))
+        elif comp[0] is e.Component.CombiComponent:
+            role, name, index, defined = comp[1]
+            combi = _sub(elem, "CombiComponent", Role=role.value, Name=name, DayAllocationIndex=str(index))
+            for use_role, defined_name, level in defined:
+                _sub(combi, "DefinedComponent", UseRole=use_role.value, Name=defined_name, DayAllocationLevel=_default(str(level), "0"))
+        elif comp[0] is e.Component.DefinedComponent:
+            use_role, name, level = comp[1]
+            _sub(elem, "DefinedComponent", UseRole=use_role.value, Name=name, DayAllocationLevel=_default(str(level), "0"))
+        elif comp[0] is e.Component.OnewayFlight:
+            name, index, level = comp[1]
+            _sub(elem, "OnewayFlight", Name=name, DayAllocationIndex=str(index), DayAllocationLevel=_default(str(level), "0"))
+
+def _day_allocation(parent: etree._Element, allocation: tuple[t.DayAllocation, ...]) -> None:
+    elem = _sub(parent, "DayAllocation")
+    for part, (level, src, day_ref, shift) in allocation:
+        tag, default_ref = _DAY_ALLOCATION_NAME[part]
+        _sub(elem, tag, Source=_default(src, "Product"), DayReference=_default(day_ref.value, default_ref.value),
+             DayAllocationLevel=_default(str(level), "0"), Shift=_default(shift.value, "None"))
+
+def _parameter_set(parent: etree._Element, key: t.Key, param: t.ParameterSet) -> None:
+    elem = _sub(parent, "ParameterSet", Key=key)
+    if param[0] is e.ParameterSet.DistributorIdentificationGroup:
+        _, crs, agency, brand = param
+        _sub(elem, "CrsSystem", crs.value)
+        _sub(elem, "AgencyCode", agency)
+        _sub(elem, "BrandCode", brand)
+    else:
+        value = param[1]
+        _sub(elem, param[0].value, value if isinstance(value, str) else value.value)
+
+def products_element(otds: OTDS) -> etree._Element:
+    elem = _root("Products")
+    global_values = otds.global_values
+    if global_values:
+        values = _sub(elem, "GlobalValues")
+        for key, value in global_values.items():
+            global_value = _sub(values, "GlobalValue", Key=key)
+            for param_key, param in value["params"].items():
+                _parameter_set(global_value, param_key, param)
+    for key, (product_type, product) in otds.products.items():
+        product_elem = _sub(elem, "Product", Key=key, ProductType=product_type.value)
+        _tags(product_elem, product.get("tags", {}))
+        _components(product_elem, product["components"])
+        _filters(product_elem, product.get("filters", {}))
+        if "day_allocation" in product:
+            _day_allocation(product_elem, product["day_allocation"])
+    return elem
+
+def brands_element(otds: OTDS, update_mode: e.UpdateMode = e.UpdateMode.New) -> etree._Element:
+    elem = _root("Brands", update_mode)
+    for key, brand in otds.brands.items():
+        brand_elem = _sub(elem, "Brand", Key=key)
+        _tags(brand_elem, brand.get("tags", {}))
+        if "booking" in brand:
+            _booking(brand_elem, brand["booking"])
+    return elem
+
+def defined_components_element(otds: OTDS) -> etree._Element:
+    elem = _root("DefinedComponents")
+    for key, (role, comp) in otds.defined_components.items():
+        define = _sub(elem, "DefineComponent", Key=key, Role=role.value)
+        if "booking" in comp:
+            _booking(define, comp["booking"])
+        _components(define, comp["components"])
+        _filters(define, comp.get("filter", {}))
+    return elem
+
+def _selected(items: Mapping[t.Key, _T], filter: Filter[_T] | None) -> Iterator[tuple[t.Key, _T]]:
+    return iter(items.items()) if filter is None else ((k, v) for k, v in items.items() if filter(k, v))
+
+def _peek(items: Iterator[_T]) -> Iterable[_T] | None:
+    # Containers need at least one child, find out before opening the element.
+    first = next(items, None)
+    return None if first is None else itertools.chain((first,), items)
+
+def write(otds: OTDS, target: Path | str | IO[bytes], filter: Filter[t.Accommodation] | None = None,
+          flight_filter: Filter[t.Oneway] | None = None, addon_filter: Filter[t.Addon] | None = None, update_mode: e.UpdateMode = e.UpdateMode.New) -> None:
+    # Merge writes a delta: every container and each Accommodation/OnewayFlight is merged into
+    # what the reader already has, the leaf nodes below replace theirs by Key. A filtered delta
+    # leaves out the global price items, which would count as a change to every accommodation
+    # or addon.
+    if update_mode is e.UpdateMode.Delete:
+        raise NotImplementedError()
+    node_mode = None if update_mode is e.UpdateMode.New else update_mode
+    root_attrib = {"Version": VERSION}
+    if node_mode is not None:
+        root_attrib["UpdateMode"] = node_mode.value
+
+    with etree.xmlfile(str(target) if isinstance(target, Path) else target, encoding="UTF-8") as xf:
+        xf.write_declaration()
+        with xf.element(f"{PREFIX}Otds", root_attrib, nsmap=dict(NS)):
+            if otds.products:
+                xf.write(products_element(otds))
+            xf.write(brands_element(otds, update_mode))
+
+            accommodations = _peek(_selected(otds.accommodations, filter))
+            if accommodations is not None:
+                with xf.element(f"{PREFIX}Accommodations", {} if node_mode is None else {"UpdateMode": node_mode.value}):
+                    for key, accom in accommodations:
+                        xf.write(accommodation_element(key, accom, update_mode))
+                    if node_mode is None or filter is None:
+                        for key, classes in otds.accommodations_price_items.items():
+                            xf.write(price_items_element(key, classes))
+
+            flights = _peek(_selected(otds.flights, flight_filter))
+            if flights is not None:
+                container = {} if node_mode is None else {"UpdateMode": node_mode.value}
+                with xf.element(f"{PREFIX}Flights", container), xf.element(f"{PREFIX}OnewayFlights", container):
+                    for key, flight in flights:
+                        xf.write(flight_element(key, flight, update_mode))
+
+            addons = _peek(_selected(otds.addons, addon_filter))
+            if addons is not None:
+                with xf.element(f"{PREFIX}Addons", {} if node_mode is None else {"UpdateMode": node_mode.value}):
+                    for key, addon in addons:
+                        xf.write(addon_element(key, addon, update_mode))
+                    if node_mode is None or addon_filter is None:
+                        for key, classes in otds.addons_price_items.items():
+                            xf.write(price_items_element(key, classes))
+
+            if otds.defined_components:
+                xf.write(defined_components_element(otds))
@@ -0,0 +1,33 @@
+from pathlib import Path
+
+import pytest
+
+from otds.allocation import DayProgram, compile_day_program
+from otds.main import OTDS
+
+DATA = Path(__file__).parent / "data"
+END = '<DayAllocationEnd Shift="Auto"/>'
+HOTEL = '<SellingAccom Name="Hotel" DayAllocationIndex="0"/>'
+
+def _product(end: str, accommodation: str = HOTEL) -> OTDS:
+    otds = OTDS()
+    source = (DATA / "rich.xml").read_bytes()
+    assert END.encode() in source and HOTEL.encode() in source
+    otds.parse_bytes(source.replace(END.encode(), end.encode()).replace(HOTEL.encode(), accommodation.encode()))
+    return otds
+
+def test_level_0_spans_the_product() -> None:
+    # The DayAllocationStart of level 1 has no effect on the program.
+    _product_type, product = _product("<DayAllocationEnd/>").products["PK1"]
+    assert compile_day_program(product) == DayProgram(("Hotel",), None, None)
+
+def test_accommodations_in_allocation_order() -> None:
+    two = '<SellingAccom Name="Beach" DayAllocationIndex="1"/><SellingAccom Name="Hotel" DayAllocationIndex="0"/>'
+    _product_type, product = _product("<DayAllocationEnd/>", two).products["PK1"]
+    assert compile_day_program(product) == DayProgram(("Hotel", "Beach"), None, None)
+
+@pytest.mark.parametrize("end", [END, '<DayAllocationEnd Shift="External"/>', '<DayAllocationEnd DayReference="CheckIn"/>'])
+def test_moved_bounds_are_rejected(end: str) -> None:
+    _product_type, product = _product(end).products["PK1"]
+    with pytest.raises(NotImplementedError):
+        compile_day_program(product)
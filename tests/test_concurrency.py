@@ -0,0 +1,60 @@
+import datetime
+import io
+from pathlib import Path
+
+import pytest
+from lxml import etree
+
+from otds import enums as e
+from otds.cache import CachedSearch
+from otds.executor import QueryExecutor
+from otds.main import OTDS, PREFIX
+from otds.search import Offer, SearchPipeline, SearchRequest
+
+DATA = Path(__file__).parent / "data"
+FIRST = datetime.date(2026, 8, 1)
+REQUESTS = tuple(
+    SearchRequest(FIRST + datetime.timedelta(days=day), FIRST + datetime.timedelta(days=day + 6), nights, (30, 30),
+                  booking_date=datetime.date(2026, 6, 1))
+    for day in range(24) for nights in (3, 7))
+ROUNDS = 20
+
+def _delta(otds: OTDS) -> bytes:
+    # H1 with a dearer base price, so every one of its offers changes.
+    buf = io.BytesIO()
+    otds.write(buf, filter=lambda key, _: key == "H1", update_mode=e.UpdateMode.Merge)
+    delta = etree.fromstring(buf.getvalue())
+    for value in delta.iterfind(f".//{PREFIX}PriceItem[@Class='Base']/{PREFIX}Absolute/{PREFIX}Value"):
+        value.text = "60.00"
+    return etree.tostring(delta)
+
+def _offers(otds: OTDS) -> dict[SearchRequest, tuple[Offer, ...]]:
+    pipeline = SearchPipeline(otds.pin())
+    return {request: pipeline.search(request).offers for request in REQUESTS}
+
+@pytest.mark.parametrize("cached", [False, True])
+def test_searches_while_a_delta_is_applied(cached: bool) -> None:
+    otds = OTDS()
+    otds.parse(DATA / "conditions.xml")
+    delta = _delta(otds)
+    before = _offers(otds)
+    updated = OTDS()
+    updated.parse(DATA / "conditions.xml")
+    updated.parse_bytes(delta)
+    after = _offers(updated)
+    assert before != after
+
+    search = CachedSearch(otds) if cached else None
+    with QueryExecutor(otds, 8, search) as executor:
+        running = [executor.search(request) for _ in range(ROUNDS) for request in REQUESTS]
+        otds.parse_bytes(delta)
+        applied = [executor.search(request) for _ in range(ROUNDS) for request in REQUESTS]
+        # Each search sees one version of the model, the one before the delta or the one after it.
+        for future in running:
+            result = future.result()
+            assert result.offers in (before[result.request], after[result.request])
+        for future in applied:
+            result = future.result()
+            assert result.offers == after[result.request]
+    if search is not None:
+        search.close()
@@ -0,0 +1,32 @@
+import datetime
+from collections import Counter
+from pathlib import Path
+
+from otds.federation import Federation, SupplierKey
+from otds.index import DateIndex
+from otds.main import OTDS
+from otds.search import SearchPipeline, SearchRequest
+
+DATA = Path(__file__).parent / "data"
+SUPPLIERS = {"a": DATA / "base.xml", "b": DATA / "conditions.xml"}
+CHECK_IN = datetime.date(2026, 8, 1)
+REQUEST = SearchRequest(CHECK_IN, CHECK_IN + datetime.timedelta(days=9), 7, (30, 30), booking_date=datetime.date(2026, 6, 1))
+
+def test_shared_index() -> None:
+    federation = Federation(2)
+    federation.load({name: [path] for name, path in SUPPLIERS.items()})
+    dates: set[SupplierKey] = set()
+    offers: Counter[tuple[str, object]] = Counter()
+    for name, path in SUPPLIERS.items():
+        otds = OTDS()
+        otds.parse(path)
+        dates.update(SupplierKey(name, key) for key in DateIndex(otds).query(CHECK_IN, None, 7).accommodations)
+        offers.update((name, offer) for offer in SearchPipeline(otds).search(REQUEST).offers)
+    assert federation.dates(CHECK_IN, None, 7) == dates
+    found = federation.search(REQUEST)
+    assert Counter(found) == offers
+    assert [o.offer.price for o in found] == sorted(o.offer.price for o in found)
+
+    federation.remove("b")
+    assert {key.supplier for key in federation.dates(CHECK_IN, None, 7)} <= {"a"}
+    assert federation.accommodation(SupplierKey("a", "H1")) is federation.partitions["a"].otds.accommodations["H1"]
@@ -0,0 +1,33 @@
+from pathlib import Path
+
+import pytest
+
+from otds.main import OTDS
+from otds.source import accommodation_spans
+
+DATA = Path(__file__).parent / "data"
+HIDDEN = b'<!-- <Accommodation Key="H3"></Accommodation> -->\n  </Accommodations>'
+
+def test_markup_is_skipped(tmp_path: Path) -> None:
+    path = tmp_path / "hidden.xml"
+    path.write_bytes((DATA / "base.xml").read_bytes().replace(b"</Accommodations>", HIDDEN))
+    validated = OTDS()
+    validated.parse_mmap(path)
+    split = OTDS()
+    split.parse_mmap(path, workers=2, validate=False)
+    assert vars(split) == vars(validated)
+    assert sorted(split.accommodations) == ["H1", "H2"]
+
+def test_cdata_and_instructions_are_skipped() -> None:
+    buf = (b'<Otds><Accommodations><Accommodation Key="H1"><![CDATA[</Accommodation>]]></Accommodation>'
+           b'<?note <Accommodation/>?></Accommodations></Otds>')
+    assert list(accommodation_spans(buf)) == [(22, 90)]
+
+def test_second_container() -> None:
+    buf = b'<Otds><Accommodations><Accommodation/></Accommodations><Accommodations/></Otds>'
+    with pytest.raises(ValueError):
+        list(accommodation_spans(buf))
+
+def test_workers_skip_validation_explicitly() -> None:
+    with pytest.raises(ValueError):
+        OTDS().parse_mmap(DATA / "base.xml", workers=2)
@@ -0,0 +1,41 @@
+import datetime
+import io
+from pathlib import Path
+
+import pytest
+
+from otds import enums as e
+from otds.main import OTDS
+from otds.matrix import Grid, PriceMatrices, price_matrix
+
+DATA = Path(__file__).parent / "data"
+GRID = Grid(datetime.date(2026, 7, 20), 60, (7,), ((30, 30),), datetime.date(2026, 6, 1))
+
+def test_delta_rebuilds_on_read() -> None:
+    otds = OTDS()
+    otds.parse(DATA / "base.xml")
+    matrices = PriceMatrices(otds, GRID)
+    matrices.build()
+    kept = matrices.get("H2")
+
+    buf = io.BytesIO()
+    otds.write(buf, filter=lambda key, _: key == "H1", update_mode=e.UpdateMode.Merge)
+    otds.parse_bytes(buf.getvalue())
+    assert len(matrices) == 1
+    assert matrices.get("H2") is kept
+    assert matrices.get("H1") == price_matrix(otds.pin(), "H1", GRID)
+
+    # A full delivery without H1 removes it.
+    buf = io.BytesIO()
+    otds.write(buf, filter=lambda key, _: key == "H2")
+    otds.reparse(buf.getvalue())
+    assert "H1" not in otds.accommodations
+    with pytest.raises(KeyError):
+        matrices.get("H1")
+
+@pytest.mark.parametrize("nights, ages", [(8, (30, 30)), (7, (30,))])
+def test_outside_the_grid(nights: int, ages: tuple[int, ...]) -> None:
+    otds = OTDS()
+    otds.parse(DATA / "base.xml")
+    with pytest.raises(KeyError):
+        PriceMatrices(otds, GRID).price("H1", GRID.first, nights, ages)
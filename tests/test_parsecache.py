@@ -0,0 +1,48 @@
+from pathlib import Path
+
+import pytest
+
+from otds.main import OTDS, Changes
+from otds.parsecache import SUFFIX, ParseCache
+
+DATA = Path(__file__).parent / "data"
+
+@pytest.mark.parametrize("size", [0, 4, 12, 100, -1])
+def test_damaged_entry_is_a_miss(tmp_path: Path, size: int) -> None:
+    source = DATA / "base.xml"
+    expected = OTDS()
+    expected.parse(source, cache_dir=tmp_path)
+    (entry,) = tmp_path.glob(f"*{SUFFIX}")
+    entry.write_bytes(entry.read_bytes()[:size])
+
+    cache = ParseCache(tmp_path)
+    assert cache.get(cache.key(source)) is None
+    assert not entry.exists()
+
+    otds = OTDS()
+    otds.parse(source, cache_dir=tmp_path)
+    assert vars(otds) == vars(expected)
+    # The full parse stored a new entry.
+    assert cache.get(cache.key(source)) is not None
+
+def test_hit_with_a_configured_cache(tmp_path: Path) -> None:
+    source = DATA / "base.xml"
+    cache = ParseCache(tmp_path, check="stat")
+    expected = OTDS()
+    expected.parse(source, cache_dir=cache)
+    assert len(list(tmp_path.glob(f"*{SUFFIX}"))) == 1
+
+    changes: list[Changes] = []
+    otds = OTDS()
+    otds.on_change(changes.append)
+    otds.parse(source, cache_dir=cache)
+    assert vars(otds) == vars(expected)
+    assert [c.all_accommodations for c in changes] == [True]
+
+def test_only_an_empty_model_is_cached(tmp_path: Path) -> None:
+    otds = OTDS()
+    otds.parse(DATA / "base.xml")
+    with pytest.raises(ValueError):
+        otds.parse(DATA / "base.xml", cache_dir=tmp_path)
+    with pytest.raises(TypeError):
+        OTDS().parse((DATA / "base.xml").read_bytes(), cache_dir=tmp_path)
@@ -0,0 +1,19 @@
+from pathlib import Path
+
+import pytest
+from lxml import etree
+
+from otds.main import Projection, parse_projected, project
+
+DATA = Path(__file__).parent / "data"
+
+@pytest.mark.parametrize("include", [
+    {"Accommodation": ["Availabilities"]},
+    {"Accommodation": ["Properties", "SellingAccom"], "SellingAccom": ["Unit", "Board"], "Otds": ["Accommodations", "Brands"]},
+    {"Otds": []},
+])
+def test_parse_projected(include: Projection) -> None:
+    source = DATA / "base.xml"
+    expected = etree.parse(source, etree.XMLParser(remove_comments=True)).getroot()
+    project(expected, include)
+    assert etree.tostring(parse_projected(source, include, 256)) == etree.tostring(expected)